@@ -0,0 +1,363 @@
+"""批量下载多本小说
+
+    python batch_download.py https://book.qidian.com/info/1010868264 https://www.jjwxc.net/onebook.php?novelid=123
+    python batch_download.py -f urls.txt -o novels --workers 32 --per-host 8 --incremental
+
+书单文件每行一个小说地址，可在地址后用空白隔开指定保存目录；空行和 # 开头的行忽略。
+未指定保存目录的书保存在 <输出目录>/<站点>_<小说编号>。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+from collections import deque
+
+from requests.adapters import HTTPAdapter
+
+from catalog_cache import CatalogCache
+from chapter_list import ChapterProgress
+from metrics import Metrics
+from nihao import (NovelDownloader, BookDownload, CancelToken, novel_id, select_chapters, open_store, load_manifest,
+                   pending_chapters)
+from page_parser import site_of
+from rate_limit import host_key
+
+
+class BookJob(BookDownload):
+    """批量下载中的一本书
+
+    进度、下载清单、章节仓库和目录缓存都保存在各自的 BookJob 上，多本书同时下载互不干扰；
+    章节交给下载器的 fetch_and_save 时它就是那一章所属的 BookDownload。
+    status 依次为 '等待中'、'准备中'、'下载中'，结束时为 '完成'、'失败' 或 '已停止'。
+    """
+
+    def __init__(self, url, save_path, start_chapter=None, end_chapter=None, cancel_token=None):
+        super().__init__(save_path, cancel_token=cancel_token)
+        self.url = url
+        self.start_chapter = start_chapter
+        self.end_chapter = end_chapter
+        self.status = '等待中'
+        self.title = None
+        self.error = None
+        self.total = 0
+        self.completed = 0
+        self.failed = 0
+        # 尚未派发的章节和正在下载的章节数，由 BatchDownloader 的调度协程维护
+        self.pending = deque()
+        self.running = 0
+        self.cache = None
+
+    @property
+    def percent(self):
+        return (self.completed / self.total) * 100 if self.total else 0.0
+
+    def record(self, failed):
+        self.completed += 1
+        if failed:
+            self.failed += 1
+
+    def snapshot(self):
+        return {
+            'url': self.url,
+            'title': self.title,
+            'save_path': self.save_path,
+            'status': self.status,
+            'total': self.total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'error': self.error
+        }
+
+
+class BatchDownloader:
+    """多本书共用一个调度器的批量下载
+
+    所有书共用一个 NovelDownloader（连接池、站点限速和重试策略），调度协程和各章的下载
+    都在它的事件循环中执行：max_workers 限制同时在途的请求总数，per_host 限制同一站点
+    同时在途的请求数。调度协程在各书之间轮转，每轮每本书只派发一章，超长的书不会挤占其他书；
+    某个站点达到上限时跳过该站点的书，先派发其他站点的章节。
+    同时在下载的书最多 max_active_books 本，其余的书等前面的书完成后才获取目录。
+
+    各书共用一个 CancelToken，停止请求同时中断所有书正在退避等待的重试。
+    """
+
+    def __init__(self, downloader=None, output_dir='novels', max_workers=16, per_host=4, max_active_books=None,
+                 storage='files', incremental=False, progress_callback=None):
+        self.downloader = downloader or NovelDownloader(max_workers=max_workers)
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.max_active_books = max_active_books or max_workers * 2
+        self.storage = storage
+        self.incremental = incremental
+        # progress_callback(job, chapter_title) 在每章结束后调用；书完成时 chapter_title 为 None
+        self.progress_callback = progress_callback
+        self.jobs = []
+        self.cancel_token = CancelToken()
+        self._running = 0
+        self._host_running = {}
+        self._active = deque()
+        # 调度协程所在的事件循环和唤醒它的事件，只在 run() 期间存在
+        self._loop = None
+        self._wakeup = None
+
+        # 连接池容量与并发数一致，避免线程多于池中连接时反复新建连接
+        adapter = HTTPAdapter(pool_maxsize=max_workers)
+        self.downloader.session.mount('https://', adapter)
+        self.downloader.session.mount('http://', adapter)
+
+    @property
+    def cancelled(self):
+        return self.cancel_token.cancelled
+
+    def cancel(self):
+        """停止批量下载：不再派发新的章节，已在下载的章节完成后退出（可在任何线程中调用）"""
+        self.cancel_token.cancel()
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._notify)
+
+    def add(self, url, save_path=None, start_chapter=None, end_chapter=None):
+        """加入一本书，返回对应的 BookJob"""
+        if save_path is None:
+            site = site_of(url)
+            if site is None:
+                raise ValueError(f'不支持的网站: {url}')
+            save_path = os.path.join(self.output_dir, f'{site}_{novel_id(url)}')
+        job = BookJob(url, save_path, start_chapter, end_chapter, self.cancel_token)
+        self.jobs.append(job)
+        return job
+
+    def progress_snapshot(self):
+        """各书的进度以及各站点的限速和重试计数"""
+        return {
+            'books': [job.snapshot() for job in self.jobs],
+            'hosts': self.downloader.rate_limiter.snapshot()
+        }
+
+    def run(self):
+        """下载全部书籍，返回 BookJob 列表"""
+        return self.downloader.run_coroutine(self._run())
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        """调度协程：派发任务直到全部书籍结束或被停止"""
+        engine = self.downloader.async_downloader
+        # 同时在途的请求最多 max_workers 个，requests 传输层的线程池至少要有这么多线程
+        engine.transport.ensure_workers(self.max_workers)
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        waiting = deque(job for job in self.jobs if job.status == '等待中')
+        tasks = set()
+        try:
+            while not self.cancelled:
+                task = self._next_task(waiting)
+                if task is None:
+                    if not waiting and not self._active and self._running == 0:
+                        break
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                job, chapter, host = task
+                self._running += 1
+                self._host_running[host] = self._host_running.get(host, 0) + 1
+                if chapter is not None:
+                    job.running += 1
+                future = asyncio.ensure_future(self._run_task(engine, job, chapter, host))
+                tasks.add(future)
+                future.add_done_callback(tasks.discard)
+            # 被停止时等已在下载的章节完成
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            self._loop = None
+            self._wakeup = None
+        # 被停止时收尾仍在进行中的书
+        for job in list(self._active):
+            self._finish(job)
+        self._active.clear()
+        return self.jobs
+
+    def _host_free(self, host):
+        return self._running < self.max_workers and self._host_running.get(host, 0) < self.per_host
+
+    def _next_task(self, waiting):
+        """选出下一个任务 (书, 章节, 站点)；章节为 None 表示获取该书的目录"""
+        if waiting and len(self._active) < self.max_active_books:
+            # 排在前面的书所在站点已满时，先准备其他站点的书
+            for job in waiting:
+                host = host_key(job.url)
+                if self._host_free(host):
+                    waiting.remove(job)
+                    job.status = '准备中'
+                    self._active.append(job)
+                    return job, None, host
+        # 轮转：每本书派发一章后排到队尾
+        for _ in range(len(self._active)):
+            job = self._active[0]
+            self._active.rotate(-1)
+            if not job.pending:
+                continue
+            host = host_key(job.pending[0]['url'])
+            if self._host_free(host):
+                return job, job.pending.popleft(), host
+        return None
+
+    async def _run_task(self, engine, job, chapter, host):
+        try:
+            if chapter is None:
+                await self._prepare(engine, job)
+            elif not self.cancelled:
+                await self._download_chapter(engine, job, chapter)
+        except Exception as e:
+            print(f"下载《{job.title or job.url}》失败: {str(e)}")
+            job.status = '失败'
+            job.error = str(e)
+        finally:
+            self._running -= 1
+            self._host_running[host] -= 1
+            if chapter is not None:
+                job.running -= 1
+            if job in self._active and (job.status == '失败' or (
+                    job.status == '下载中' and not job.pending and job.running == 0)):
+                self._active.remove(job)
+                self._finish(job)
+            self._notify()
+
+    async def _prepare(self, engine, job):
+        """获取书名和目录，打开存储和下载清单，算出需要下载的章节"""
+        job.cache = CatalogCache(job.save_path) if self.incremental else None
+        if job.cache is not None and job.cache.title:
+            job.title = job.cache.title
+        else:
+            novel_info = await engine.get_novel_info(job.url)
+            if not novel_info:
+                raise ValueError('获取小说信息失败')
+            job.title = novel_info['title']
+        os.makedirs(job.save_path, exist_ok=True)
+
+        chapter_list = await engine.get_chapter_list(job.url, job.cache)
+        if not chapter_list:
+            raise ValueError('获取章节列表失败')
+        chapter_list = select_chapters(chapter_list, job.start_chapter, job.end_chapter)
+        job.store = open_store(job.save_path, self.storage)
+        job.manifest, chapter_list = load_manifest(chapter_list, job.save_path, job.store)
+        positions = pending_chapters(chapter_list, job.manifest,
+                                     job.cache.changed_indices() if job.cache else ())
+
+        job.chapter_progress = ChapterProgress.for_chapters(chapter_list, '已完成')
+        for position in positions:
+            job.chapter_progress[chapter_list[position]['index']] = '等待中'
+        job.total = len(chapter_list)
+        job.completed = job.total - len(positions)
+        job.pending.extend(chapter_list[position] for position in positions)
+        job.status = '下载中'
+
+    async def _download_chapter(self, engine, job, chapter):
+        """用下载器的逐章例程下载一章，重试状态、清单和埋点都记在 job 上"""
+        job.chapter_progress[chapter['index']] = '下载中'
+        result = await engine.fetch_and_save(chapter, job)
+        job.record(failed=not result)
+        if self.progress_callback:
+            self.progress_callback(job, chapter['title'])
+
+    def _finish(self, job):
+        """关闭一本书的清单和存储；正常完成时保存目录缓存"""
+        if job.manifest is not None:
+            job.manifest.close()
+            job.manifest = None
+        if job.store is not None:
+            job.store.close()
+            job.store = None
+        if job.status != '失败':
+            if self.cancelled:
+                job.status = '已停止'
+            else:
+                job.status = '完成'
+                if job.cache is not None:
+                    job.cache.title = job.title
+                    job.cache.save()
+        if self.progress_callback:
+            self.progress_callback(job, None)
+
+
+def read_url_file(path):
+    """读取书单文件，返回 (地址, 保存目录或 None) 列表"""
+    books = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split(None, 1)
+            books.append((parts[0], parts[1] if len(parts) > 1 else None))
+    return books
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量下载小说（无界面）')
+    parser.add_argument('urls', nargs='*', help='小说页地址')
+    parser.add_argument('-f', '--file', help='书单文件，每行一个地址，可跟保存目录')
+    parser.add_argument('-o', '--output', default='novels', help='保存目录，默认 novels')
+    parser.add_argument('--workers', type=int, default=16, help='同时在途的请求总数')
+    parser.add_argument('--per-host', type=int, default=4, help='同一站点同时在途的请求数')
+    parser.add_argument('--max-books', type=int, help='同时下载的书籍数，默认为请求总数的两倍')
+    parser.add_argument('--storage', choices=('files', 'packed', 'dedup'), default='files', help='章节存储方式')
+    parser.add_argument('--incremental', action='store_true', help='增量更新，只下载新增或改动的章节')
+    parser.add_argument('--json', action='store_true', help='结束时每本书输出一行 JSON')
+    parser.add_argument('--metrics', help='结束时导出埋点：.prom 结尾为 Prometheus 文本，否则为 JSON lines')
+    args = parser.parse_args(argv)
+
+    books = [(url, None) for url in args.urls]
+    if args.file:
+        books.extend(read_url_file(args.file))
+    if not books:
+        parser.error('请指定小说地址或书单文件')
+
+    def report(job, chapter_title):
+        if chapter_title is None:
+            print(f"《{job.title or job.url}》{job.status}: {job.completed}/{job.total} 章，失败 {job.failed} 章",
+                  file=sys.stderr)
+
+    metrics = Metrics() if args.metrics else None
+    batch = BatchDownloader(NovelDownloader(max_workers=args.workers, metrics=metrics), output_dir=args.output,
+                            max_workers=args.workers, per_host=args.per_host, max_active_books=args.max_books,
+                            storage=args.storage, incremental=args.incremental, progress_callback=report)
+    for url, save_path in books:
+        try:
+            batch.add(url, save_path)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+
+    # 在后台线程中下载，主线程等待 Ctrl+C 以便停止
+    runner = threading.Thread(target=batch.run, name='batch-download')
+    runner.start()
+    try:
+        while runner.is_alive():
+            runner.join(0.5)
+    except KeyboardInterrupt:
+        print('正在停止下载...', file=sys.stderr)
+        batch.cancel()
+        runner.join()
+    finally:
+        batch.downloader.close()
+
+    if metrics is not None:
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            if args.metrics.endswith('.prom'):
+                f.write(metrics.prometheus_text())
+            else:
+                metrics.write_json_lines(f)
+    if args.json:
+        for job in batch.jobs:
+            print(json.dumps(job.snapshot(), ensure_ascii=False))
+    return 0 if all(job.status == '完成' and not job.failed for job in batch.jobs) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
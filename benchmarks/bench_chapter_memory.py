@@ -0,0 +1,152 @@
+"""章节目录内存基准：对比字典列表与 ChapterList / ChapterProgress
+
+    python benchmarks/bench_chapter_memory.py                          # 200 本书，每本 2000 章
+    python benchmarks/bench_chapter_memory.py --novels 200 --chapters 5000 --json
+
+用 tracemalloc 统计同时载入多本书的目录（get_chapter_list 的结果）、以及编号、分配文件名并
+建立下载状态表（download_novel 中的 chapter_list 和 chapter_progress）后占用的内存，
+并测量（不开 tracemalloc 时）建立目录和逐章读取一遍标题、地址的耗时。
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chapter_list import ChapterList, ChapterProgress  # noqa: E402
+from download_manifest import unique_file_names  # noqa: E402
+
+WORDS = ['风起', '云涌', '少年', '归来', '剑出', '鞘鸣', '夜雨', '长街', '故人', '重逢', '天下', '大势',
+         '山门', '试炼', '破境', '一战', '惊变', '尘埃', '落定', '远行']
+
+
+def synthetic_catalogs(novels, chapters, seed=0):
+    """逐本产出解析结果形式的目录 [(标题, 地址), ...]，起点和晋江的地址各一半
+
+    字符串在产出时才创建（与解析目录页一样），两种表示各自保留多少都计入统计。
+    """
+    rng = random.Random(seed)
+    for novel in range(novels):
+        book_id = 1000000 + novel
+        catalog = []
+        for number in range(1, chapters + 1):
+            title = f'第{number}章 ' + ''.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4)))
+            if novel % 2:
+                url = f'https://www.jjwxc.net/onebook.php?novelid={book_id}&chapterid={number}'
+            else:
+                url = f'https://vipreader.qidian.com/chapter/{book_id}/{book_id * 1000 + number}'
+            catalog.append((title, url))
+        yield catalog
+
+
+def file_title(chapter):
+    return chapter['title'].replace('?', '').replace(':', '：')
+
+
+def build_dicts(catalogs):
+    """原来的表示：每章一个字典，章节状态为按标题索引的字典"""
+    return [[{'title': title, 'url': url} for title, url in catalog] for catalog in catalogs]
+
+
+def download_state_dicts(chapter_lists):
+    states = []
+    for chapter_list in chapter_lists:
+        numbered = [dict(chapter, index=number) for number, chapter in enumerate(chapter_list, 1)]
+        named = unique_file_names(numbered, file_title)
+        states.append((named, {chapter['title']: '已完成' for chapter in named}))
+    return states
+
+
+def build_compact(catalogs):
+    return [ChapterList(catalog) for catalog in catalogs]
+
+
+def download_state_compact(chapter_lists):
+    states = []
+    for chapter_list in chapter_lists:
+        named = unique_file_names(chapter_list.numbered(1), file_title)
+        states.append((named, ChapterProgress.for_chapters(named, '已完成')))
+    return states
+
+
+def traced(build, *args):
+    """(结果, 新增的内存字节数)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def timed_build(build, novels, chapters):
+    """建立目录的耗时，不含生成字符串的时间"""
+    catalogs = list(synthetic_catalogs(novels, chapters))
+    started = time.perf_counter()
+    build(catalogs)
+    return time.perf_counter() - started
+
+
+def scan(chapter_lists):
+    """逐章读取一遍标题和地址的耗时"""
+    started = time.perf_counter()
+    total = 0
+    for chapter_list in chapter_lists:
+        for chapter in chapter_list:
+            total += len(chapter['title']) + len(chapter['url'])
+    return time.perf_counter() - started
+
+
+def measure(name, build, download_state, novels, chapters):
+    chapter_lists, catalog_bytes = traced(build, synthetic_catalogs(novels, chapters))
+    states, state_bytes = traced(download_state, chapter_lists)
+    scan_seconds = scan(chapter_lists)
+    del states, chapter_lists
+    build_seconds = timed_build(build, novels, chapters)
+    return {
+        'representation': name,
+        'chapters': novels * chapters,
+        'catalog_mb': round(catalog_bytes / 1024 / 1024, 1),
+        'catalog_bytes_per_chapter': round(catalog_bytes / (novels * chapters), 1),
+        'download_state_mb': round(state_bytes / 1024 / 1024, 1),
+        'download_state_bytes_per_chapter': round(state_bytes / (novels * chapters), 1),
+        'build_s': round(build_seconds, 3),
+        'scan_s': round(scan_seconds, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='章节目录内存基准')
+    parser.add_argument('--novels', type=int, default=200, help='同时载入的书数')
+    parser.add_argument('--chapters', type=int, default=2000, help='每本书的章节数')
+    parser.add_argument('--json', action='store_true', help='每行输出一个 JSON 结果')
+    args = parser.parse_args()
+
+    results = [
+        measure('dicts', build_dicts, download_state_dicts, args.novels, args.chapters),
+        measure('compact', build_compact, download_state_compact, args.novels, args.chapters)
+    ]
+
+    if args.json:
+        for row in results:
+            print(json.dumps(row, ensure_ascii=False))
+        return
+    print(f'{args.novels} 本书 × {args.chapters} 章')
+    print(f'{"表示":<10}{"目录MB":>10}{"B/章":>8}{"下载状态MB":>12}{"B/章":>8}{"构建s":>8}{"遍历s":>8}')
+    for row in results:
+        print(f'{row["representation"]:<10}{row["catalog_mb"]:>10}{row["catalog_bytes_per_chapter"]:>8}'
+              f'{row["download_state_mb"]:>12}{row["download_state_bytes_per_chapter"]:>8}'
+              f'{row["build_s"]:>8}{row["scan_s"]:>8}')
+    before, after = results
+    print(f'目录内存降为原来的 {after["catalog_mb"] / before["catalog_mb"]:.1%}，'
+          f'下载状态降为原来的 {after["download_state_mb"] / before["download_state_mb"]:.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""章节压缩存储基准：对比每章一个 .txt 与 PackedChapterStore（不压缩 / zlib / zstd）
+
+    python benchmarks/bench_compression.py --source novels/某书     # 使用已下载的章节 .txt
+    python benchmarks/bench_compression.py --chapters 2000 --json   # 使用合成章节
+
+报告每种方式的占用字节、相对原始 .txt 的压缩比、写入和随机读取的 MB/s。
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chapter_store import PackedChapterStore, zstandard  # noqa: E402
+
+PHRASES = ['萧炎', '斗气', '少年', '突破', '大陆', '眼中闪过一丝', '冷笑一声', '缓缓说道', '修炼',
+           '丹药', '长老', '宗门', '灵魂力量', '不由得', '此时', '只见', '顿时', '一股', '磅礴的',
+           '气息', '从', '体内', '涌出', '，', '。', '“', '”', '！', '？']
+BOILERPLATE = '本章完，求月票！新书期间每天两更，大家的支持就是我最大的动力。'
+
+
+def synthetic_chapters(count, seed=0):
+    rng = random.Random(seed)
+    chapters = []
+    for number in range(1, count + 1):
+        lines = [''.join(rng.choice(PHRASES) for _ in range(rng.randint(10, 40))) for _ in range(rng.randint(40, 80))]
+        lines.append(BOILERPLATE)
+        chapters.append((number, f'第{number}章', '\n'.join(lines)))
+    return chapters
+
+
+def load_chapters(source):
+    names = sorted(name for name in os.listdir(source) if name.endswith('.txt'))
+    chapters = []
+    for number, name in enumerate(names, 1):
+        with open(os.path.join(source, name), encoding='utf-8') as f:
+            chapters.append((number, name[:-4], f.read()))
+    return chapters
+
+
+def dir_size(path):
+    """返回 (文件字节数, 实际占用的磁盘字节数)；小文件按块分配，后者更接近存储成本"""
+    stats = [os.stat(os.path.join(path, name)) for name in os.listdir(path)]
+    return sum(st.st_size for st in stats), sum(getattr(st, 'st_blocks', 0) * 512 for st in stats)
+
+
+def bench_files(chapters, workdir, raw_bytes, reads):
+    path = os.path.join(workdir, 'files')
+    os.makedirs(path)
+    start = time.perf_counter()
+    for number, title, content in chapters:
+        with open(os.path.join(path, f'{number:06d}.txt'), 'w', encoding='utf-8') as f:
+            f.write(content)
+    write_time = time.perf_counter() - start
+    start = time.perf_counter()
+    read_bytes = 0
+    for number in reads:
+        with open(os.path.join(path, f'{number:06d}.txt'), encoding='utf-8') as f:
+            read_bytes += len(f.read().encode('utf-8'))
+    read_time = time.perf_counter() - start
+    return result('txt', dir_size(path), raw_bytes, write_time, read_bytes, read_time)
+
+
+def bench_packed(chapters, workdir, raw_bytes, reads, compression):
+    name = f'packed-{compression or "raw"}'
+    path = os.path.join(workdir, name)
+    start = time.perf_counter()
+    with PackedChapterStore(path, compression=compression) as store:
+        for number, title, content in chapters:
+            store.append(number, title, content)
+    write_time = time.perf_counter() - start
+    with PackedChapterStore(path) as store:
+        start = time.perf_counter()
+        read_bytes = 0
+        for number in reads:
+            read_bytes += len(store.get(number).encode('utf-8'))
+        read_time = time.perf_counter() - start
+    return result(name, dir_size(path), raw_bytes, write_time, read_bytes, read_time)
+
+
+def result(name, sizes, raw_bytes, write_time, read_bytes, read_time):
+    mb = 1024 * 1024
+    stored_bytes, disk_bytes = sizes
+    return {
+        'storage': name,
+        'stored_bytes': stored_bytes,
+        'disk_bytes': disk_bytes,
+        'ratio': round(raw_bytes / stored_bytes, 3),
+        'write_mb_s': round(raw_bytes / mb / write_time, 2),
+        'read_mb_s': round(read_bytes / mb / read_time, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='章节压缩存储基准')
+    parser.add_argument('--source', help='已下载章节 .txt 所在目录，不指定时使用合成章节')
+    parser.add_argument('--chapters', type=int, default=1000, help='合成章节数')
+    parser.add_argument('--reads', type=int, default=2000, help='随机读取次数')
+    parser.add_argument('--json', action='store_true', help='每行输出一个 JSON 结果')
+    args = parser.parse_args()
+
+    chapters = load_chapters(args.source) if args.source else synthetic_chapters(args.chapters)
+    raw_bytes = sum(len(content.encode('utf-8')) for _, _, content in chapters)
+    rng = random.Random(1)
+    reads = [rng.randint(1, len(chapters)) for _ in range(args.reads)]
+
+    workdir = tempfile.mkdtemp(prefix='bench_compression_')
+    try:
+        results = [bench_files(chapters, workdir, raw_bytes, reads)]
+        for compression in (None, 'zlib', 'zstd'):
+            if compression == 'zstd' and zstandard is None:
+                continue
+            results.append(bench_packed(chapters, workdir, raw_bytes, reads, compression))
+    finally:
+        shutil.rmtree(workdir)
+
+    if args.json:
+        for row in results:
+            print(json.dumps(dict(row, chapters=len(chapters), raw_bytes=raw_bytes), ensure_ascii=False))
+        return
+    print(f'{len(chapters)} 章，原始正文 {raw_bytes / 1024 / 1024:.1f} MB')
+    print(f'{"存储方式":<14}{"文件字节":>14}{"磁盘占用":>14}{"压缩比":>8}{"写入MB/s":>10}{"读取MB/s":>10}')
+    for row in results:
+        print(f'{row["storage"]:<14}{row["stored_bytes"]:>14}{row["disk_bytes"]:>14}{row["ratio"]:>8}'
+              f'{row["write_mb_s"]:>10}{row["read_mb_s"]:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""下载吞吐基准：用本地替身站点（mock_site.py）测量 NovelDownloader.download_novel
+
+    python benchmarks/bench_download.py --chapters 500 --workers 1,4,16 --latency 50 --jitter 20
+    python benchmarks/bench_download.py --site jjwxc --modes threads,pipeline --error-rate 0.02 --json
+
+每种 站点 × 模式 × 线程数 的组合在单独的子进程中运行一次完整下载（峰值内存互不影响），
+报告每秒章节数、单章耗时（从请求章节页到写入完成）的 p50/p99、解析与 I/O 各自消耗的
+CPU 时间以及峰值 RSS。--json 时每个组合输出一行 JSON，便于保存后对比不同版本。
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from mock_site import MockSite, NOVEL_URLS, LocalSiteAdapter, start_server  # noqa: E402
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run_once(site, mode, workers, port, retry_delay):
+    """在当前进程中下载一遍替身站点上的书，返回测量结果"""
+    import nihao
+    from metrics import Metrics
+    from rate_limit import HostRateLimiter, RetryPolicy
+    from response_cache import ResponseCache
+
+    # 令牌桶放宽到不构成瓶颈，测量的是下载器本身
+    limiter = HostRateLimiter(rate=100000, capacity=100000, max_rate=100000)
+    # 流水线模式的解析进程由 forkserver 创建，不是本进程的子进程，解析耗时改由埋点随结果传回
+    metrics = Metrics() if mode == 'pipeline' else None
+    downloader = nihao.NovelDownloader(max_workers=workers, rate_limiter=limiter,
+                                       retry_policy=RetryPolicy(base_delay=retry_delay, max_delay=retry_delay * 8),
+                                       page_cache=ResponseCache(cache_dir=None), metrics=metrics)
+    adapter = LocalSiteAdapter(port, pool_maxsize=max(workers, 10))
+    downloader.session.mount('https://', adapter)
+    downloader.session.mount('http://', adapter)
+
+    started = {}
+    latencies = []
+    engine = downloader._async_engine
+    fetch_chapter = engine._fetch_chapter
+    save_chapter = engine._save_chapter
+
+    async def timed_fetch(chapter, book):
+        started[chapter['index']] = time.perf_counter()
+        return await fetch_chapter(chapter, book)
+
+    async def timed_save(chapter, content, book):
+        result = await save_chapter(chapter, content, book)
+        latencies.append(time.perf_counter() - started[chapter['index']])
+        return result
+
+    engine._fetch_chapter = timed_fetch
+    engine._save_chapter = timed_save
+
+    # 线程模式下在各工作线程内统计解析消耗的 CPU；流水线模式的解析在子进程中，按埋点记录的建树和清理耗时计
+    parse_cpu = []
+    if mode == 'threads':
+        parse_chapter_content = nihao.parse_chapter_content
+
+        def timed_parse(*args):
+            start = time.thread_time()
+            try:
+                return parse_chapter_content(*args)
+            finally:
+                parse_cpu.append(time.thread_time() - start)
+
+        nihao.parse_chapter_content = timed_parse
+
+    save_path = tempfile.mkdtemp(prefix='bench_download_')
+    cpu_before = time.process_time()
+    start = time.perf_counter()
+    try:
+        results = downloader.download_novel(NOVEL_URLS[site], save_path, pipeline=(mode == 'pipeline'))
+    finally:
+        wall = time.perf_counter() - start
+        downloader.close()
+        shutil.rmtree(save_path)
+    cpu_main = time.process_time() - cpu_before
+
+    if mode == 'threads':
+        cpu_parse = sum(parse_cpu)
+        cpu_io = cpu_main - cpu_parse
+    else:
+        phases = metrics.snapshot()['phases']
+        cpu_parse = sum(phases[phase]['sum'] for phase in ('parse', 'clean') if phase in phases)
+        cpu_io = cpu_main
+    ok = sum(1 for result in results if result)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'site': site,
+        'mode': mode,
+        'workers': workers,
+        'chapters': len(results),
+        'ok': ok,
+        'failed': len(results) - ok,
+        'wall_s': round(wall, 3),
+        'chapters_per_s': round(len(results) / wall, 2) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'cpu_parse_s': round(cpu_parse, 3),
+        'cpu_io_s': round(cpu_io, 3),
+        # Linux 上 ru_maxrss 的单位为 KB
+        'peak_rss_kb': peak_rss
+    }
+
+
+def run_in_subprocess(site, mode, workers, port, retry_delay, verbose):
+    command = [sys.executable, os.path.abspath(__file__), '--single', site, mode, str(workers),
+               '--port', str(port), '--retry-delay', str(retry_delay)]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE,
+                            stderr=None if verbose else subprocess.DEVNULL, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='下载吞吐基准（本地替身站点）')
+    parser.add_argument('--site', default='qidian,jjwxc', help='站点，逗号分隔：qidian,jjwxc')
+    parser.add_argument('--modes', default='threads,pipeline', help='下载模式，逗号分隔：threads,pipeline')
+    parser.add_argument('--workers', default='1,4,16', help='线程数，逗号分隔')
+    parser.add_argument('--chapters', type=int, default=300, help='每本书的章节数')
+    parser.add_argument('--paragraphs', type=int, default=40, help='每章段落数')
+    parser.add_argument('--latency', type=float, default=20.0, help='每个响应的延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=5.0, help='延迟的随机抖动幅度（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='替身站点返回 503 的概率')
+    parser.add_argument('--retry-delay', type=float, default=0.05, help='重试退避的基准秒数')
+    parser.add_argument('--json', action='store_true', help='每个组合输出一行 JSON')
+    parser.add_argument('--verbose', action='store_true', help='显示子进程的进度条和日志')
+    # 内部使用：在子进程中只跑一个组合
+    parser.add_argument('--single', nargs=3, metavar=('SITE', 'MODE', 'WORKERS'), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        site, mode, workers = args.single
+        print(json.dumps(run_once(site, mode, int(workers), args.port, args.retry_delay)))
+        return
+
+    server = start_server(MockSite(args.chapters, args.paragraphs), args.latency / 1000, args.jitter / 1000,
+                          args.error_rate)
+    settings = {'latency_ms': args.latency, 'jitter_ms': args.jitter, 'error_rate': args.error_rate}
+    rows = []
+    try:
+        for site in args.site.split(','):
+            for mode in args.modes.split(','):
+                for workers in (int(value) for value in args.workers.split(',')):
+                    row = dict(run_in_subprocess(site, mode, workers, server.server_port, args.retry_delay,
+                                                 args.verbose), **settings)
+                    rows.append(row)
+                    if args.json:
+                        print(json.dumps(row, ensure_ascii=False), flush=True)
+    finally:
+        server.shutdown()
+
+    if args.json:
+        return
+    print(f'{args.chapters} 章/书，延迟 {args.latency}±{args.jitter} ms，错误率 {args.error_rate}')
+    print(f'{"站点":<8}{"模式":<10}{"线程":>5}{"章/秒":>9}{"p50ms":>9}{"p99ms":>9}'
+          f'{"解析CPU":>9}{"I/O CPU":>9}{"峰值RSS(MB)":>13}{"失败":>6}')
+    for row in rows:
+        print(f'{row["site"]:<8}{row["mode"]:<10}{row["workers"]:>5}{row["chapters_per_s"]:>9}'
+              f'{row["p50_ms"]:>9}{row["p99_ms"]:>9}{row["cpu_parse_s"]:>9}{row["cpu_io_s"]:>9}'
+              f'{row["peak_rss_kb"] / 1024:>13.1f}{row["failed"]:>6}')
+
+
+if __name__ == '__main__':
+    main()
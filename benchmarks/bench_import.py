@@ -0,0 +1,81 @@
+"""导入耗时基准：在新进程中用 python -X importtime 导入下载核心
+
+    python benchmarks/bench_import.py                  # 报告总耗时和最慢的模块
+    python benchmarks/bench_import.py --budget-ms 150  # 超过预算时返回非零退出码，可放进 CI
+    python benchmarks/bench_import.py --module batch_download --json
+
+同时检查无界面导入后界面库和网络、解析等较重的依赖都没有被加载。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只导入下载核心时不应出现的模块（界面、网络、HTML 解析、事件循环和进程池在用到时才导入）
+LAZY_MODULES = ('tkinter', 'PyQt5', 'bs4', 'lxml', 'tqdm', 'fake_useragent', 'requests', 'aiohttp', 'asyncio',
+                'multiprocessing')
+
+CHECK_SCRIPT = '''
+import json, sys
+import {module}
+print(json.dumps(sorted(name for name in {lazy!r} if name in sys.modules)))
+'''
+
+
+def measure(module, python=sys.executable):
+    """在新进程中导入 module，返回 (各模块累计耗时微秒 {模块: 微秒}, 已被加载的延迟模块)"""
+    script = CHECK_SCRIPT.format(module=module, lazy=LAZY_MODULES)
+    proc = subprocess.run([python, '-X', 'importtime', '-c', script], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导入耗时基准')
+    parser.add_argument('--module', default='nihao', help='要导入的模块，默认 nihao')
+    parser.add_argument('--runs', type=int, default=5, help='重复次数，取中位数')
+    parser.add_argument('--top', type=int, default=10, help='列出最慢的模块数')
+    parser.add_argument('--budget-ms', type=float, help='导入耗时预算（毫秒），超过时退出码为 1')
+    parser.add_argument('--json', action='store_true', help='输出一行 JSON 结果')
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    runs.sort(key=lambda run: run[0].get(args.module, 0))
+    cumulative, loaded = runs[len(runs) // 2]
+    total_ms = cumulative.get(args.module, 0) / 1000
+    # 只列出顶层模块，子模块的耗时已计入其包
+    top = sorted(((name, us) for name, us in cumulative.items() if '.' not in name and name != args.module),
+                 key=lambda item: item[1], reverse=True)[:args.top]
+    over_budget = args.budget_ms is not None and total_ms > args.budget_ms
+
+    if args.json:
+        print(json.dumps({
+            'module': args.module,
+            'import_ms': round(total_ms, 2),
+            'budget_ms': args.budget_ms,
+            'top': [{'module': name, 'ms': round(us / 1000, 2)} for name, us in top],
+            'unexpected_modules': loaded
+        }, ensure_ascii=False))
+    else:
+        print(f'import {args.module}: {total_ms:.1f} ms（{args.runs} 次取中位数）')
+        for name, us in top:
+            print(f'  {name:<24}{us / 1000:>8.1f} ms')
+        if loaded:
+            print(f'不应在导入时加载的模块: {", ".join(loaded)}')
+        if over_budget:
+            print(f'超出预算 {args.budget_ms} ms')
+    return 1 if loaded or over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""本地替身站点：在 127.0.0.1 上按起点中文网和晋江文学城的页面结构生成小说页、目录页和章节页
+
+    python benchmarks/mock_site.py --chapters 500 --latency 50 --jitter 20 --error-rate 0.02
+
+请求路径的第一段是原站点的主机名，例如 /book.qidian.com/info/1001、
+/www.jjwxc.net/onebook.php?novelid=2002&chapterid=3。给 requests.Session 挂上
+LocalSiteAdapter 后，下载器照常请求 https://book.qidian.com/...，实际由本服务器应答，
+页面解析和站点判断走的都是正式代码路径。
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_compression import PHRASES  # noqa: E402
+
+QIDIAN_BOOK_ID = '1001'
+JJWXC_BOOK_ID = '2002'
+NOVEL_URLS = {
+    'qidian': f'https://book.qidian.com/info/{QIDIAN_BOOK_ID}',
+    'jjwxc': f'https://www.jjwxc.net/book/{JJWXC_BOOK_ID}.html'
+}
+
+# 真实页面中与正文无关的导航、推荐和脚本，解析时需要跳过
+_NOISE = ''.join(
+    f'<div class="nav-item"><a href="/rank/{n}">排行榜{n}</a><span class="tag">推荐</span></div>' for n in range(80)
+) + '<script>' + 'var x = 1;' * 200 + '</script>'
+
+
+def chapter_text(chapter_no, paragraphs=40):
+    rng = random.Random(chapter_no)
+    return [''.join(rng.choice(PHRASES) for _ in range(rng.randint(15, 40))) for _ in range(paragraphs)]
+
+
+def page(body, title='小说', charset='utf-8'):
+    return (f'<!DOCTYPE html><html><head><meta charset="{charset}"><title>{title}</title></head>'
+            f'<body><div class="header">{_NOISE}</div>{body}<div class="footer">{_NOISE}</div></body></html>')
+
+
+class MockSite:
+    """生成并缓存各页面，页面内容只取决于章节数和段落数，每次运行结果一致"""
+
+    def __init__(self, chapters=500, paragraphs=40, volume_size=100):
+        self.chapters = chapters
+        self.paragraphs = paragraphs
+        self.volume_size = volume_size
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def render(self, host, path, query):
+        key = (host, path, query)
+        with self._lock:
+            cached = self._pages.get(key)
+        if cached is None:
+            cached = self._render(host, path, parse_qs(query))
+            with self._lock:
+                self._pages[key] = cached
+        return cached
+
+    def _render(self, host, path, query):
+        """返回 (内容类型, 字节)，不存在的页面返回 None"""
+        html = None
+        if host == 'book.qidian.com' and path == f'/info/{QIDIAN_BOOK_ID}':
+            html, charset = self.qidian_book(), 'utf-8'
+        elif host == 'vipreader.qidian.com' and path.startswith(f'/chapter/{QIDIAN_BOOK_ID}/'):
+            html, charset = self.qidian_chapter(int(path.rsplit('/', 1)[1])), 'utf-8'
+        elif host == 'www.jjwxc.net' and path == f'/book/{JJWXC_BOOK_ID}.html':
+            html, charset = self.jjwxc_info(), 'gbk'
+        elif host == 'www.jjwxc.net' and path == '/onebook.php':
+            if 'chapterid' in query:
+                html, charset = self.jjwxc_chapter(int(query['chapterid'][0])), 'gbk'
+            else:
+                html, charset = self.jjwxc_catalog(), 'gbk'
+        if html is None:
+            return None
+        return f'text/html; charset={charset}', html.encode(charset)
+
+    def _valid(self, chapter_no):
+        return 1 <= chapter_no <= self.chapters
+
+    def qidian_book(self):
+        volumes = []
+        for start in range(1, self.chapters + 1, self.volume_size):
+            items = ''.join(
+                f'<li><a class="chapter-name" href="//vipreader.qidian.com/chapter/{QIDIAN_BOOK_ID}/{n}">第{n}章 测试</a></li>'
+                for n in range(start, min(start + self.volume_size, self.chapters + 1))
+            )
+            volumes.append(f'<div class="volume"><h3>第{start // self.volume_size + 1}卷</h3><ul class="cf">{items}</ul></div>')
+        body = (f'<div class="book-info"><h1 class="book-title">基准测试之书</h1>'
+                f'<a class="writer" href="/author/1">基准作者</a></div>'
+                f'<div class="catalog-content-wrap">{"".join(volumes)}</div>')
+        return page(body, '基准测试之书')
+
+    def qidian_chapter(self, chapter_no):
+        if not self._valid(chapter_no):
+            return None
+        paragraphs = ''.join(f'<p>　　{line}</p>' for line in chapter_text(chapter_no, self.paragraphs))
+        return page(f'<h3 class="j_chapterName">第{chapter_no}章</h3>'
+                    f'<div class="read-content j_readContent">{paragraphs}</div>')
+
+    def jjwxc_info(self):
+        return page('<span property="v:itemreviewed">基准测试之书</span><span class="authorname">基准作者</span>',
+                    charset='gbk')
+
+    def jjwxc_catalog(self):
+        rows = ''.join(
+            f'<tr><td>{n}</td><td><a href="onebook.php?novelid={JJWXC_BOOK_ID}&chapterid={n}">第{n}章 测试</a></td></tr>'
+            for n in range(1, self.chapters + 1)
+        )
+        return page(f'<table class="cytable"><tr><th>章节</th><th>标题</th></tr>{rows}</table>', charset='gbk')
+
+    def jjwxc_chapter(self, chapter_no):
+        if not self._valid(chapter_no):
+            return None
+        lines = '<br>'.join(chapter_text(chapter_no, self.paragraphs))
+        return page(f'<div id="content">{lines}<br>晋江文学城 www.jjwxc.net</div>', charset='gbk')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if random.random() < server.error_rate:
+            self._send(503, 'text/plain', b'busy', {'Retry-After': '0'})
+            return
+        parts = urlsplit(self.path)
+        host, _, path = parts.path.lstrip('/').partition('/')
+        rendered = server.site.render(host, '/' + path, parts.query)
+        if rendered is None:
+            self._send(404, 'text/plain', b'not found')
+            return
+        self._send(200, *rendered)
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(site, latency=0.0, jitter=0.0, error_rate=0.0, port=0):
+    """在后台线程启动替身站点，latency 和 jitter 以秒为单位，返回 server（server.server_port 为端口）"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+    server.daemon_threads = True
+    server.site = site
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    threading.Thread(target=server.serve_forever, name='mock-site', daemon=True).start()
+    return server
+
+
+class LocalSiteAdapter(HTTPAdapter):
+    """把 https://<主机>/<路径> 的请求改写为 http://127.0.0.1:<端口>/<主机>/<路径>"""
+
+    def __init__(self, port, **kwargs):
+        super().__init__(**kwargs)
+        self.port = port
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        query = f'?{parts.query}' if parts.query else ''
+        request.url = f'http://127.0.0.1:{self.port}/{parts.netloc}{parts.path}{query}'
+        return super().send(request, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地替身站点')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--chapters', type=int, default=500, help='每本书的章节数')
+    parser.add_argument('--paragraphs', type=int, default=40, help='每章段落数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个响应的延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延迟的随机抖动幅度（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的概率')
+    args = parser.parse_args()
+    server = start_server(MockSite(args.chapters, args.paragraphs), args.latency / 1000, args.jitter / 1000,
+                          args.error_rate, args.port)
+    print(f'替身站点已启动: http://127.0.0.1:{server.server_port}/')
+    for url in NOVEL_URLS.values():
+        print(f'  {url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
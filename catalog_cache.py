@@ -0,0 +1,95 @@
+import json
+import os
+from chapter_list import ChapterList
+
+
+class CatalogCache:
+    """一本书上次获取的目录，保存在 save_path/catalog.json
+
+    记录目录页响应的 ETag / Last-Modified、书名和章节列表。下次更新时带上
+    If-None-Match / If-Modified-Since 发送条件请求，目录未变（304）时直接沿用缓存的
+    章节列表，不再下载和解析目录页；目录有变化时与上次的列表比较，只重新下载
+    新增或改动的章节。
+    """
+
+    CACHE_FILE = 'catalog.json'
+
+    def __init__(self, save_path):
+        self.save_path = save_path
+        self.title = None
+        self.etag = None
+        self.last_modified = None
+        self.chapters = None
+        # update() 之前的章节列表，用于比较目录变化
+        self.previous = None
+        self._load()
+
+    @property
+    def cache_path(self):
+        return os.path.join(self.save_path, self.CACHE_FILE)
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except ValueError:
+            # 缓存损坏时当作没有缓存，重新获取完整目录
+            return
+        self.title = data.get('title')
+        self.etag = data.get('etag')
+        self.last_modified = data.get('last_modified')
+        self.chapters = ChapterList(data['chapters']) if data.get('chapters') is not None else None
+
+    def validators(self):
+        """条件请求头；还没有缓存的章节列表时返回空字典"""
+        headers = {}
+        if self.chapters is None:
+            return headers
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def update(self, chapters, etag=None, last_modified=None):
+        """记下新获取的目录（尚未写盘，由 save() 保存）"""
+        self.previous = self.chapters
+        self.chapters = chapters if isinstance(chapters, ChapterList) else ChapterList(chapters)
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def changed_indices(self):
+        """与上次目录相比新增或改动（同一序号的标题或 URL 不同）的章节序号，从1开始
+
+        章节仓库和下载清单都按序号记录章节，因此按位置比较；没有上次的目录时返回空集合，
+        交由下载清单判断哪些章节需要下载。
+        """
+        if self.previous is None:
+            return set()
+        changed = set()
+        for number, chapter in enumerate(self.chapters, 1):
+            if number > len(self.previous):
+                changed.add(number)
+                continue
+            old = self.previous[number - 1]
+            if old['url'] != chapter['url'] or old['title'] != chapter['title']:
+                changed.add(number)
+        return changed
+
+    def save(self):
+        """原子地写入缓存文件"""
+        os.makedirs(self.save_path, exist_ok=True)
+        chapters = None
+        if self.chapters is not None:
+            chapters = [{'title': chapter['title'], 'url': chapter['url']} for chapter in self.chapters]
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'title': self.title,
+                'etag': self.etag,
+                'last_modified': self.last_modified,
+                'chapters': chapters
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
@@ -0,0 +1,267 @@
+from array import array
+from collections import Counter
+from collections.abc import Mapping, MutableMapping, Sequence
+
+
+def split_url(url):
+    """把章节地址拆成 (前缀, 末段)：前缀为最后一个 '/' 或 '=' 及之前的部分，同一本书的章节通常相同"""
+    cut = max(url.rfind('/', 0, len(url) - 1), url.rfind('=')) + 1
+    return url[:cut], url[cut:]
+
+
+class ChapterView(Mapping):
+    """ChapterList 中一章的只读字典视图，键为 title、url，编号后有 index，分配文件名后有 file
+
+    视图只记着所属列表和位置，用到哪个字段才从列存储中取出，不常驻内存。
+    """
+
+    __slots__ = ('_chapters', '_position')
+
+    def __init__(self, chapters, position):
+        self._chapters = chapters
+        self._position = position
+
+    def __getitem__(self, key):
+        return self._chapters._field(self._position, key)
+
+    def __iter__(self):
+        return iter(self._chapters._keys())
+
+    def __len__(self):
+        return len(self._chapters._keys())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __reduce__(self):
+        # 传给其他进程或序列化时只带上这一章，而不是整个列表
+        return dict, (dict(self),)
+
+
+class ChapterList(Sequence):
+    """按列存储的章节目录，接口与 [{'title', 'url'}, ...] 相同
+
+    几千本书的目录同时在内存中时，每章一个字典、两个字符串的开销远大于内容本身。这里
+    所有标题拼成一个字符串并记下各自的结束位置，地址拆成前缀和末段：前缀（同一本书的
+    章节地址通常只差最后的编号）在表中只存一份，数字末段存进整数数组，其余末段才单独
+    保存。list[i] 返回按需取值的 ChapterView，切片与原列表共用各列，不复制。
+    列表创建后不可修改；select_chapters 编号（numbered）和分配文件名（with_files）
+    都返回共用各列的新列表。
+    """
+
+    __slots__ = ('_titles', '_title_ends', '_prefixes', '_prefix_ids', '_numbers', '_suffixes',
+                 '_start', '_stop', '_index_base', '_file_title', '_files')
+
+    def __init__(self, chapters=()):
+        titles = []
+        self._title_ends = array('I')
+        self._prefixes = []
+        self._prefix_ids = array('I')
+        # 末段为不带前导零的数字时存成整数，否则为 -1，末段字符串放在 _suffixes[位置]
+        self._numbers = array('q')
+        self._suffixes = {}
+        prefix_ids = {}
+        length = 0
+        for chapter in chapters:
+            title, url = (chapter['title'], chapter['url']) if isinstance(chapter, Mapping) else chapter
+            titles.append(title)
+            length += len(title)
+            self._title_ends.append(length)
+            prefix, suffix = split_url(url)
+            prefix_id = prefix_ids.get(prefix)
+            if prefix_id is None:
+                prefix_id = prefix_ids[prefix] = len(self._prefixes)
+                self._prefixes.append(prefix)
+            self._prefix_ids.append(prefix_id)
+            if suffix.isdigit() and suffix.isascii() and (suffix == '0' or suffix[0] != '0') and len(suffix) < 19:
+                self._numbers.append(int(suffix))
+            else:
+                self._suffixes[len(self._numbers)] = suffix
+                self._numbers.append(-1)
+        self._titles = ''.join(titles)
+        self._start = 0
+        self._stop = len(self._numbers)
+        self._index_base = None
+        self._file_title = None
+        self._files = None
+
+    def _derive(self, start, stop, **columns):
+        """共用各列、只改变窗口或附加列的新列表"""
+        derived = object.__new__(ChapterList)
+        for name in self.__slots__:
+            setattr(derived, name, getattr(self, name))
+        derived._start = start
+        derived._stop = stop
+        for name, value in columns.items():
+            setattr(derived, name, value)
+        return derived
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return [self[position] for position in range(start, stop, step)]
+            return self._derive(self._start + start, self._start + max(start, stop))
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('章节序号超出范围')
+        return ChapterView(self, self._start + item)
+
+    def __repr__(self):
+        return f'ChapterList({len(self)} 章)'
+
+    def numbered(self, first=1):
+        """给章节编上序号：第一章为 first，依次递增（即 select_chapters 的 index）"""
+        return self._derive(self._start, self._stop, _index_base=first - self._start)
+
+    def with_files(self, file_title, renamed=None):
+        """附加文件名：默认为 f'{file_title(章节)}.txt'，renamed 为 {位置: 文件名} 的例外（重名的章节）"""
+        files = {self._start + position: name for position, name in (renamed or {}).items()}
+        return self._derive(self._start, self._stop, _file_title=file_title, _files=files)
+
+    def _keys(self):
+        keys = ('title', 'url')
+        if self._index_base is not None:
+            keys += ('index',)
+        if self._files is not None:
+            keys += ('file',)
+        return keys
+
+    def _title(self, position):
+        start = self._title_ends[position - 1] if position else 0
+        return self._titles[start:self._title_ends[position]]
+
+    def _url(self, position):
+        number = self._numbers[position]
+        suffix = self._suffixes[position] if number < 0 else str(number)
+        return self._prefixes[self._prefix_ids[position]] + suffix
+
+    def _field(self, position, key):
+        if key == 'title':
+            return self._title(position)
+        if key == 'url':
+            return self._url(position)
+        if key == 'index' and self._index_base is not None:
+            return self._index_base + position
+        if key == 'file' and self._files is not None:
+            name = self._files.get(position)
+            return name if name is not None else f'{self._file_title(ChapterView(self, position))}.txt'
+        raise KeyError(key)
+
+    def titles(self):
+        """逐章产出标题，不创建视图"""
+        for position in range(self._start, self._stop):
+            yield self._title(position)
+
+    def to_dicts(self):
+        """转换为普通的字典列表（写入 JSON 等）"""
+        return [dict(chapter) for chapter in self]
+
+
+# ChapterProgress 中的状态码；RETRYING 及以上表示第 (状态码 - RETRYING + 1) 次重试
+STATUSES = ('等待中', '下载中', '已完成', '失败')
+RETRYING = len(STATUSES)
+ABSENT = 255
+
+
+def status_code(status):
+    """状态文字对应的状态码，不认识的状态返回 None"""
+    if status in STATUSES:
+        return STATUSES.index(status)
+    if status.startswith('重试中(') and status.endswith(')') and status[4:-1].isdigit():
+        code = RETRYING + int(status[4:-1]) - 1
+        # 重试次数为 0 或超出一个字节能表示的范围时原样保存，读回的文字不变
+        if RETRYING <= code < ABSENT:
+            return code
+    return None
+
+
+def status_text(code):
+    return STATUSES[code] if code < RETRYING else f'重试中({code - RETRYING + 1})'
+
+
+def progress_key(chapter):
+    """章节在 chapter_progress 中的键：有序号时为序号，否则为标题"""
+    index = chapter.get('index')
+    return index if index is not None else chapter['title']
+
+
+class ChapterProgress(MutableMapping):
+    """各章下载状态，键为章节序号，值为 '等待中'、'下载中'、'已完成'、'失败'、'重试中(n)'
+
+    连续序号 first..first+count-1 的状态各存成一个字节；其他键（没有序号的章节按标题）
+    和不认识的状态放在一个小字典里。用法与原来按标题索引的字典相同，只是键改为序号。
+    """
+
+    __slots__ = ('first', '_codes', '_extra')
+
+    def __init__(self, first=1, count=0, status=None):
+        self.first = first
+        code = ABSENT if status is None else status_code(status)
+        self._codes = bytearray([code]) * count
+        self._extra = {}
+
+    @classmethod
+    def for_chapters(cls, chapter_list, status=None):
+        """为 select_chapters 编过号的章节列表建立状态表，所有章节初始为 status"""
+        first = chapter_list[0]['index'] if len(chapter_list) else 1
+        return cls(first, len(chapter_list), status)
+
+    def _slot(self, key):
+        if isinstance(key, int) and 0 <= key - self.first < len(self._codes):
+            return key - self.first
+        return None
+
+    def __getitem__(self, key):
+        slot = self._slot(key)
+        if slot is None or self._codes[slot] == ABSENT:
+            return self._extra[key]
+        return status_text(self._codes[slot])
+
+    def __setitem__(self, key, status):
+        slot = self._slot(key)
+        code = status_code(status) if slot is not None else None
+        if code is None:
+            if slot is not None:
+                self._codes[slot] = ABSENT
+            self._extra[key] = status
+            return
+        self._codes[slot] = code
+        self._extra.pop(key, None)
+
+    def __delitem__(self, key):
+        slot = self._slot(key)
+        if slot is not None and self._codes[slot] != ABSENT:
+            self._codes[slot] = ABSENT
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        for slot, code in enumerate(self._codes):
+            if code != ABSENT:
+                yield self.first + slot
+        yield from list(self._extra)
+
+    def __len__(self):
+        return len(self._codes) - self._codes.count(ABSENT) + len(self._extra)
+
+    def counts(self):
+        """各状态的章节数"""
+        counts = {}
+        for code, count in Counter(self._codes).items():
+            if code != ABSENT:
+                counts[status_text(code)] = count
+        for status in list(self._extra.values()):
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+
+def status_counts(chapter_progress):
+    """各状态的章节数，chapter_progress 可以是 ChapterProgress 或普通字典"""
+    if isinstance(chapter_progress, ChapterProgress):
+        return chapter_progress.counts()
+    return dict(Counter(list(chapter_progress.values())))
@@ -0,0 +1,310 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，未安装时只能使用 zlib 压缩
+    zstandard = None
+
+# 索引记录：章节号、数据偏移、记录长度、CRC32
+_INDEX_ENTRY = struct.Struct('<IQII')
+# 数据记录头：章节标题的字节数，其后依次为标题和正文（均为 UTF-8）；
+# 最高位为压缩标记，置位时正文为压缩后的字节
+_RECORD_HEADER = struct.Struct('<I')
+_COMPRESSED_FLAG = 1 << 31
+
+FSYNC_POLICIES = ('always', 'batch', 'never')
+COMPRESSIONS = (None, 'zlib', 'zstd')
+
+
+class ChapterCodec:
+    """章节正文压缩：zstd（需要 zstandard）或标准库 zlib，都可以带共享字典
+
+    网文章节之间有大量重复的套话和用词，用训练出的字典逐章压缩，
+    单章也能压得很小，同时保留按章随机读取。
+    """
+
+    def __init__(self, name, dictionary=None, level=None):
+        if name not in ('zlib', 'zstd'):
+            raise ValueError(f'未知的压缩方式: {name}')
+        if name == 'zstd' and zstandard is None:
+            raise RuntimeError('zstd 压缩需要安装 zstandard: pip install zstandard')
+        self.name = name
+        self.dictionary = dictionary or None
+        self.level = level if level is not None else (3 if name == 'zstd' else 6)
+        self._local = threading.local()
+        self._zstd_dict = None
+        if name == 'zstd' and self.dictionary:
+            self._zstd_dict = zstandard.ZstdCompressionDict(self.dictionary)
+            self._zstd_dict.precompute_compress(level=self.level)
+
+    def compress(self, data):
+        if self.name == 'zstd':
+            compressor = getattr(self._local, 'compressor', None)
+            if compressor is None:
+                compressor = self._local.compressor = zstandard.ZstdCompressor(
+                    level=self.level, dict_data=self._zstd_dict
+                )
+            return compressor.compress(data)
+        if self.dictionary:
+            compressor = zlib.compressobj(self.level, zdict=self.dictionary)
+        else:
+            compressor = zlib.compressobj(self.level)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data):
+        if self.name == 'zstd':
+            decompressor = getattr(self._local, 'decompressor', None)
+            if decompressor is None:
+                decompressor = self._local.decompressor = zstandard.ZstdDecompressor(dict_data=self._zstd_dict)
+            return decompressor.decompress(data)
+        if self.dictionary:
+            decompressor = zlib.decompressobj(zdict=self.dictionary)
+        else:
+            decompressor = zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    @staticmethod
+    def train(name, samples, dict_size=112 * 1024):
+        """用若干章正文（bytes）训练共享字典，样本不足以训练时返回 b''"""
+        if name == 'zstd':
+            try:
+                return zstandard.train_dictionary(dict_size, samples).as_bytes()
+            except zstandard.ZstdError:
+                return b''
+        # zlib 的预设字典只用最后 32KB：取样本中重复出现的行，最常见的放在末尾
+        lines = Counter(line for sample in samples for line in sample.splitlines() if line)
+        common = [line for line, count in lines.most_common() if count > 1]
+        dictionary = b''
+        for line in common:
+            if len(dictionary) + len(line) + 1 > 32 * 1024:
+                break
+            dictionary = line + b'\n' + dictionary
+        return dictionary
+
+
+class PackedChapterStore:
+    """单文件章节仓库：一本书只占两个文件，代替每章一个 .txt
+
+    chapters.dat 只追加写入章节记录，chapters.idx 追加定长索引项。同一章再次写入时
+    追加新记录，索引以最后一项为准。打开时整份索引一次读入内存，读取某章时通过
+    mmap 只访问该章所在的字节。先写数据再写索引，崩溃后残缺的索引项在下次打开时丢弃。
+
+    fsync 策略：'always' 每章落盘，'batch' 每 fsync_every 章及 flush/close 时落盘，
+    'never' 交给操作系统。
+
+    compression 为 'zstd' 或 'zlib' 时正文逐章压缩、读取时才解压。前 train_after 章
+    按原样写入并作为样本训练共享字典，之后的章节用字典压缩；字典和压缩方式
+    保存在仓库目录中，一经确定不再改变，打开已有仓库时自动沿用。字典训练前关闭的
+    仓库，重新打开时从已写入的（未压缩的）章节重新收集样本。
+    """
+
+    DATA_FILE = 'chapters.dat'
+    INDEX_FILE = 'chapters.idx'
+    CODEC_FILE = 'chapters.codec'
+    DICT_FILE = 'chapters.dict'
+
+    def __init__(self, path, fsync='batch', fsync_every=64, compression=None, train_after=64):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'未知的 fsync 策略: {fsync}')
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'未知的压缩方式: {compression}')
+        self.path = path
+        self.fsync = fsync
+        self.fsync_every = fsync_every
+        self.train_after = train_after
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._unsynced = 0
+        self._mmap = None
+        self._samples = []
+        self.codec = self._load_codec(compression)
+        self._data = open(os.path.join(path, self.DATA_FILE), 'ab+')
+        self._index = open(os.path.join(path, self.INDEX_FILE), 'ab+')
+        self._load_index()
+        if self.codec is not None and not self._dict_ready:
+            self._collect_samples()
+
+    def _load_codec(self, compression):
+        codec_path = os.path.join(self.path, self.CODEC_FILE)
+        dict_path = os.path.join(self.path, self.DICT_FILE)
+        if os.path.exists(codec_path):
+            with open(codec_path, encoding='utf-8') as f:
+                stored = f.read().strip()
+            if compression is not None and compression != stored:
+                raise ValueError(f'仓库已使用 {stored} 压缩，不能改为 {compression}: {self.path}')
+            compression = stored
+        elif compression is not None:
+            with open(codec_path, 'w', encoding='utf-8') as f:
+                f.write(compression)
+        if compression is None:
+            return None
+        self._dict_ready = os.path.exists(dict_path)
+        dictionary = None
+        if self._dict_ready:
+            with open(dict_path, 'rb') as f:
+                dictionary = f.read()
+        return ChapterCodec(compression, dictionary)
+
+    def _train_codec(self):
+        """样本攒够后训练字典并落盘，之后写入的章节都用字典压缩"""
+        dictionary = ChapterCodec.train(self.codec.name, self._samples)
+        dict_path = os.path.join(self.path, self.DICT_FILE)
+        with open(dict_path + '.tmp', 'wb') as f:
+            f.write(dictionary)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(dict_path + '.tmp', dict_path)
+        self.codec = ChapterCodec(self.codec.name, dictionary, self.codec.level)
+        self._dict_ready = True
+        self._samples = []
+
+    def _collect_samples(self):
+        """字典尚未训练时已写入的章节都是原样保存的，取它们的正文作为样本"""
+        for chapter_no in self.chapter_numbers():
+            record = self._record(chapter_no, verify=False)
+            (header,) = _RECORD_HEADER.unpack_from(record)
+            self._samples.append(record[_RECORD_HEADER.size + header:])
+        if self._samples and len(self._samples) >= self.train_after:
+            self._train_codec()
+
+    def _load_index(self):
+        data_size = os.fstat(self._data.fileno()).st_size
+        self._index.seek(0)
+        raw = self._index.read()
+        valid = len(raw) - len(raw) % _INDEX_ENTRY.size
+        for pos in range(0, valid, _INDEX_ENTRY.size):
+            chapter_no, offset, length, crc = _INDEX_ENTRY.unpack_from(raw, pos)
+            if offset + length > data_size:
+                # 数据没写完整的记录及其后的索引项都作废
+                valid = pos
+                break
+            self._entries[chapter_no] = (offset, length, crc)
+        if valid != len(raw):
+            self._index.truncate(valid)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __contains__(self, chapter_no):
+        return chapter_no in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def append(self, chapter_no, title, content):
+        """追加一章，返回写入的字节数"""
+        title_bytes = title.encode('utf-8')
+        body = content.encode('utf-8')
+        with self._lock:
+            header = len(title_bytes)
+            if self.codec is not None:
+                if self._dict_ready:
+                    body = self.codec.compress(body)
+                    header |= _COMPRESSED_FLAG
+                else:
+                    self._samples.append(body)
+                    if len(self._samples) >= self.train_after:
+                        self._train_codec()
+            record = _RECORD_HEADER.pack(header) + title_bytes + body
+            crc = zlib.crc32(record)
+            self._data.seek(0, os.SEEK_END)
+            offset = self._data.tell()
+            self._data.write(record)
+            self._data.flush()
+            if self.fsync == 'always':
+                os.fsync(self._data.fileno())
+            self._index.write(_INDEX_ENTRY.pack(chapter_no, offset, len(record), crc))
+            self._index.flush()
+            self._entries[chapter_no] = (offset, len(record), crc)
+            self._unsynced += 1
+            if self.fsync == 'always' or (self.fsync == 'batch' and self._unsynced >= self.fsync_every):
+                self._sync()
+        return len(record)
+
+    def _sync(self):
+        os.fsync(self._data.fileno())
+        os.fsync(self._index.fileno())
+        self._unsynced = 0
+
+    def flush(self):
+        """把尚未落盘的章节 fsync 到磁盘（'never' 策略下只刷新缓冲区）"""
+        with self._lock:
+            self._data.flush()
+            self._index.flush()
+            if self.fsync != 'never' and self._unsynced:
+                self._sync()
+
+    def _record(self, chapter_no, verify):
+        entry = self._entries.get(chapter_no)
+        if entry is None:
+            return None
+        offset, length, crc = entry
+        with self._lock:
+            if self._mmap is None or offset + length > len(self._mmap):
+                # 文件在上次映射之后又追加了内容，重新映射
+                if self._mmap is not None:
+                    self._mmap.close()
+                self._mmap = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+            record = self._mmap[offset:offset + length]
+        if verify and zlib.crc32(record) != crc:
+            raise ValueError(f'章节 {chapter_no} 校验失败: {self.path}')
+        return record
+
+    def get(self, chapter_no, verify=True):
+        """读取一章正文（压缩的章节在此时才解压），不存在时返回 None"""
+        record = self._record(chapter_no, verify)
+        if record is None:
+            return None
+        (header,) = _RECORD_HEADER.unpack_from(record)
+        body = record[_RECORD_HEADER.size + (header & ~_COMPRESSED_FLAG):]
+        if header & _COMPRESSED_FLAG:
+            body = self.codec.decompress(body)
+        return body.decode('utf-8')
+
+    def get_title(self, chapter_no):
+        record = self._record(chapter_no, verify=False)
+        if record is None:
+            return None
+        (header,) = _RECORD_HEADER.unpack_from(record)
+        return record[_RECORD_HEADER.size:_RECORD_HEADER.size + (header & ~_COMPRESSED_FLAG)].decode('utf-8')
+
+    def stats(self):
+        """统计章节数、正文原始字节数和实际占用字节数（会逐章解压，开销与全书大小成正比）"""
+        raw_bytes = 0
+        stored_bytes = 0
+        for chapter_no in self.chapter_numbers():
+            stored_bytes += self._entries[chapter_no][1]
+            raw_bytes += len(self.get(chapter_no, verify=False).encode('utf-8'))
+        return {
+            'chapters': len(self._entries),
+            'raw_bytes': raw_bytes,
+            'stored_bytes': stored_bytes,
+            'ratio': round(raw_bytes / stored_bytes, 3) if stored_bytes else 0.0,
+            'compression': self.codec.name if self.codec else None
+        }
+
+    def chapter_numbers(self):
+        return sorted(self._entries)
+
+    def iter_chapters(self):
+        """按章节号顺序逐章产出 (章节号, 标题, 正文)"""
+        for chapter_no in self.chapter_numbers():
+            yield chapter_no, self.get_title(chapter_no), self.get(chapter_no)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._data.close()
+            self._index.close()
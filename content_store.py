@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+
+# download_novel 的 storage='dedup' 把正文存入下载目录同级的这个目录，同一目录下的书共享
+SHARED_OBJECTS_DIR = '.chapter_objects'
+
+
+def shared_objects_dir(save_path):
+    """与 save_path 同级的共享正文仓库目录"""
+    return os.path.join(os.path.dirname(os.path.abspath(save_path)), SHARED_OBJECTS_DIR)
+
+
+def body_hash(data):
+    """正文（UTF-8 字节）的 SHA-256，与 download_manifest.content_hash 相同"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ContentStore:
+    """按内容寻址的章节正文仓库：每种正文只保存一份
+
+    正文以 SHA-256 命名，保存在 <root>/<哈希前两位>/<哈希>。同样的正文无论来自哪本书、
+    哪一章、重新下载多少次，都只写一次；写入时先写临时文件再 rename，多个线程或进程
+    同时写入同一正文也不会留下残缺的文件。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def object_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def __contains__(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    def put(self, data, digest=None):
+        """保存正文字节，返回 (哈希, 是否新写入)"""
+        digest = digest or body_hash(data)
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            return digest, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return digest, True
+
+    def get(self, digest):
+        with open(self.object_path(digest), 'rb') as f:
+            return f.read()
+
+    def stats(self):
+        """仓库中的正文数和总字节数（遍历目录）"""
+        objects = 0
+        stored_bytes = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith('.tmp'):
+                    objects += 1
+                    stored_bytes += os.path.getsize(os.path.join(directory, name))
+        return {'objects': objects, 'stored_bytes': stored_bytes}
+
+
+class DedupChapterStore:
+    """去重的章节仓库：一本书只保存章节号到正文哈希的引用，正文放在共享的 ContentStore
+
+    接口与 PackedChapterStore 相同，可以作为 download_novel 的 storage='dedup'。
+    引用追加写入 <path>/chapters.refs（每行一个 JSON，同一章以最后一行为准，
+    末尾写了一半的行在加载时忽略）。写入前先比较哈希：与已保存的引用相同时什么也不写，
+    站点把未改动的章节标记为“已更新”时不会产生任何写入。
+    read_only 时只加载引用、不打开引用文件，关闭时也不压缩，可以和正在写入的同一本书同时打开。
+    """
+
+    REFS_FILE = 'chapters.refs'
+
+    def __init__(self, path, objects, read_only=False):
+        self.path = path
+        self.objects = objects if isinstance(objects, ContentStore) else ContentStore(objects)
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        self._refs = {}
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._load()
+        self._file = None if read_only else open(self.refs_path, 'a', encoding='utf-8')
+
+    @property
+    def refs_path(self):
+        return os.path.join(self.path, self.REFS_FILE)
+
+    def _load(self):
+        if not os.path.exists(self.refs_path):
+            return
+        with open(self.refs_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    ref = json.loads(line)
+                except ValueError:
+                    break
+                self._refs[ref['index']] = ref
+                self._lines += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __contains__(self, chapter_no):
+        return chapter_no in self._refs
+
+    def __len__(self):
+        return len(self._refs)
+
+    def unchanged(self, chapter_no, digest):
+        """该章已保存且正文哈希相同"""
+        ref = self._refs.get(chapter_no)
+        return ref is not None and ref['sha256'] == digest
+
+    def append(self, chapter_no, title, content):
+        """保存一章，返回实际写入仓库的正文字节数（正文已存在时为 0）"""
+        if self.read_only:
+            raise ValueError(f'章节仓库以只读方式打开: {self.path}')
+        data = content.encode('utf-8')
+        digest = body_hash(data)
+        if self.unchanged(chapter_no, digest) and self._refs[chapter_no]['title'] == title:
+            return 0
+        digest, written = self.objects.put(data, digest)
+        ref = {'index': chapter_no, 'title': title, 'sha256': digest, 'bytes': len(data)}
+        with self._lock:
+            self._file.write(json.dumps(ref, ensure_ascii=False) + '\n')
+            self._file.flush()
+            self._refs[chapter_no] = ref
+            self._lines += 1
+        return len(data) if written else 0
+
+    def get(self, chapter_no, verify=True):
+        """读取一章正文，不存在时返回 None；verify 时校验正文哈希"""
+        ref = self._refs.get(chapter_no)
+        if ref is None:
+            return None
+        data = self.objects.get(ref['sha256'])
+        if verify and body_hash(data) != ref['sha256']:
+            raise ValueError(f'章节 {chapter_no} 校验失败: {self.path}')
+        return data.decode('utf-8')
+
+    def get_title(self, chapter_no):
+        ref = self._refs.get(chapter_no)
+        return ref['title'] if ref is not None else None
+
+    def refs(self):
+        """按章节号排列的引用：{'index', 'title', 'sha256', 'bytes'}"""
+        return [self._refs[chapter_no] for chapter_no in self.chapter_numbers()]
+
+    def stats(self):
+        """本书的去重统计：章节数、正文原始字节数、去重后（每种正文一份）的字节数和节省的字节数"""
+        raw_bytes = 0
+        unique = {}
+        for ref in self._refs.values():
+            raw_bytes += ref['bytes']
+            unique[ref['sha256']] = ref['bytes']
+        stored_bytes = sum(unique.values())
+        return {
+            'chapters': len(self._refs),
+            'unique_chapters': len(unique),
+            'raw_bytes': raw_bytes,
+            'stored_bytes': stored_bytes,
+            'saved_bytes': raw_bytes - stored_bytes,
+            'ratio': round(raw_bytes / stored_bytes, 3) if stored_bytes else 0.0,
+            'compression': None
+        }
+
+    def chapter_numbers(self):
+        return sorted(self._refs)
+
+    def iter_chapters(self):
+        """按章节号顺序逐章产出 (章节号, 标题, 正文)"""
+        for chapter_no in self.chapter_numbers():
+            yield chapter_no, self.get_title(chapter_no), self.get(chapter_no)
+
+    def flush(self):
+        if self._file is None:
+            return
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """关闭引用文件；被覆盖的旧引用较多时压缩成每章一行"""
+        with self._lock:
+            if self._file is None or self._file.closed:
+                return
+            self._file.close()
+            if self._lines > len(self._refs):
+                tmp_path = self.refs_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    for chapter_no in sorted(self._refs):
+                        f.write(json.dumps(self._refs[chapter_no], ensure_ascii=False) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.refs_path)
+                self._lines = len(self._refs)
+
+
+def dedup_stats(refs_paths, objects):
+    """多本书合计的去重统计：所有引用的正文字节数、共享仓库实际占用的字节数和节省的字节数"""
+    objects = objects if isinstance(objects, ContentStore) else ContentStore(objects)
+    raw_bytes = 0
+    chapters = 0
+    for refs_path in refs_paths:
+        # 只读打开：其中的书可能正由别处写入，这里不能改写或压缩它的引用文件
+        with DedupChapterStore(os.path.dirname(refs_path), objects, read_only=True) as store:
+            stats = store.stats()
+        raw_bytes += stats['raw_bytes']
+        chapters += stats['chapters']
+    stored = objects.stats()
+    return {
+        'novels': len(refs_paths),
+        'chapters': chapters,
+        'objects': stored['objects'],
+        'raw_bytes': raw_bytes,
+        'stored_bytes': stored['stored_bytes'],
+        'saved_bytes': raw_bytes - stored['stored_bytes'],
+        'ratio': round(raw_bytes / stored['stored_bytes'], 3) if stored['stored_bytes'] else 0.0
+    }
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from chapter_list import ChapterList
+
+
+def content_hash(content):
+    """章节正文（UTF-8）的 SHA-256"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def unique_file_names(chapter_list, file_title):
+    """给每章分配保存用的文件名；清理后重名的章节追加章节序号，避免互相覆盖
+
+    chapter_list 为 ChapterList 时只记下重名的例外，其余文件名在用到时由 file_title 算出。
+    """
+    counts = {}
+    for chapter in chapter_list:
+        name = file_title(chapter)
+        counts[name] = counts.get(name, 0) + 1
+    if isinstance(chapter_list, ChapterList):
+        renamed = {}
+        for position, chapter in enumerate(chapter_list):
+            name = file_title(chapter)
+            if counts[name] > 1:
+                renamed[position] = f"{name}_{chapter['index']}.txt"
+        return chapter_list.with_files(file_title, renamed)
+    named = []
+    for chapter in chapter_list:
+        name = file_title(chapter)
+        if counts[name] > 1:
+            name = f"{name}_{chapter['index']}"
+        named.append(dict(chapter, file=f'{name}.txt'))
+    return named
+
+
+class DownloadManifest:
+    """单本小说的下载清单
+
+    记录每章的序号、URL、保存文件、内容哈希、字节数、状态和时间。清单由快照
+    manifest.json 和追加写的日志 manifest.journal 组成：每完成一章只向日志追加一行，
+    checkpoint() 时把全部记录写入临时文件再 rename 成新快照并清空日志，任何时刻
+    崩溃都不会留下损坏的清单（日志末尾写了一半的行在加载时忽略）。
+    断点续传时一次读入清单，在内存中算出缺失的章节，不再逐章检查文件是否存在。
+    """
+
+    SNAPSHOT_FILE = 'manifest.json'
+    JOURNAL_FILE = 'manifest.journal'
+
+    def __init__(self, save_path, checkpoint_every=500):
+        self.save_path = save_path
+        self.checkpoint_every = checkpoint_every
+        self.entries = {}
+        self.exists = False
+        self._lock = threading.Lock()
+        self._journal = None
+        self._journal_lines = 0
+        self._load()
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.save_path, self.SNAPSHOT_FILE)
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.save_path, self.JOURNAL_FILE)
+
+    def _load(self):
+        if os.path.exists(self.snapshot_path):
+            self.exists = True
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                for entry in json.load(f)['chapters']:
+                    self.entries[entry['index']] = entry
+        if os.path.exists(self.journal_path):
+            self.exists = True
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    self.entries[entry['index']] = entry
+                    self._journal_lines += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def is_done(self, chapter):
+        entry = self.entries.get(chapter.get('index'))
+        return entry is not None and entry['status'] == 'done' and entry['url'] == chapter['url']
+
+    def unchanged(self, chapter, sha256):
+        """该章已完成且保存的正文哈希与 sha256 相同（认领的旧章节没有哈希，总是视为有变化）"""
+        entry = self.entries.get(chapter.get('index'))
+        return entry is not None and entry['status'] == 'done' and entry['sha256'] == sha256
+
+    def missing(self, chapter_list):
+        """返回尚未完成（或 URL 已变化）的章节，保持原有顺序"""
+        return [chapter for chapter in chapter_list if not self.is_done(chapter)]
+
+    def adopt(self, chapter_list, saved):
+        """首次为已有下载建立清单：saved(chapter) 为真的章节直接记为完成（哈希未知）"""
+        for chapter in chapter_list:
+            if saved(chapter):
+                self._record(chapter, 'done', None, None)
+
+    def mark_done(self, chapter, content):
+        self._record(chapter, 'done', content_hash(content), len(content.encode('utf-8')))
+
+    def mark_failed(self, chapter):
+        self._record(chapter, 'failed', None, None)
+
+    def _record(self, chapter, status, sha256, length):
+        entry = {
+            'index': chapter['index'],
+            'title': chapter['title'],
+            'url': chapter['url'],
+            'file': chapter.get('file'),
+            'sha256': sha256,
+            'bytes': length,
+            'status': status,
+            'updated': datetime.now().isoformat(timespec='seconds')
+        }
+        with self._lock:
+            self.entries[entry['index']] = entry
+            if self._journal is None:
+                os.makedirs(self.save_path, exist_ok=True)
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._journal.flush()
+            self._journal_lines += 1
+            if self._journal_lines >= self.checkpoint_every:
+                self._checkpoint()
+
+    def checkpoint(self):
+        """把全部记录原子地写成新快照并清空日志"""
+        with self._lock:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        os.makedirs(self.save_path, exist_ok=True)
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'chapters': [self.entries[index] for index in sorted(self.entries)]},
+                      f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # 快照已包含日志中的全部记录，日志可以清空
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_lines = 0
+        self.exists = True
+
+    def close(self):
+        with self._lock:
+            if self._journal_lines or not self.exists:
+                self._checkpoint()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
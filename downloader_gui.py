@@ -0,0 +1,313 @@
+import os
+import queue
+import sys
+import threading
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+from log_sink import LogBuffer
+from nihao import NovelDownloader, CancelToken
+
+
+class NovelDownloaderGUI:
+    # 日志框最多保留的行数；更早的行写入按大小轮转的日志文件（设为 None 则直接丢弃）
+    LOG_MAX_LINES = 2000
+    LOG_SPILL_PATH = os.path.join('logs', 'downloader.log')
+
+    def __init__(self, root):
+        self.root = root
+        self.root.title('小说下载器')
+        self.root.geometry('800x600')
+        self.root.resizable(True, True)
+        
+        # 创建下载器实例
+        self.downloader = NovelDownloader()
+        self.downloader.chapter_progress = {}
+        # 当前下载的停止标记，开始下载时创建
+        self.cancel_token = None
+        self.download_thread = None
+        
+        # 创建消息队列用于线程间通信
+        self.queue = queue.Queue()
+        
+        # 创建UI
+        self._create_widgets()
+        
+        # 关闭窗口时停止下载、写出日志并释放连接
+        self.root.protocol('WM_DELETE_WINDOW', self._on_close)
+        
+        # 启动消息处理循环
+        self._process_queue()
+    
+    def _create_widgets(self):
+        # 创建主框架
+        main_frame = ttk.Frame(self.root, padding='10')
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # URL输入区域
+        url_frame = ttk.LabelFrame(main_frame, text='小说信息', padding='10')
+        url_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(url_frame, text='小说URL:').grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.url_entry = ttk.Entry(url_frame, width=70)
+        self.url_entry.grid(row=0, column=1, sticky=tk.EW, padx=5, pady=5)
+        url_frame.columnconfigure(1, weight=1)
+        
+        # 下载选项区域
+        options_frame = ttk.LabelFrame(main_frame, text='下载选项', padding='10')
+        options_frame.pack(fill=tk.X, pady=5)
+        
+        # 章节范围选择
+        ttk.Label(options_frame, text='章节范围:').grid(row=0, column=0, sticky=tk.W, pady=5)
+        
+        self.chapter_var = tk.StringVar(value='all')
+        all_radio = ttk.Radiobutton(options_frame, text='全部章节', variable=self.chapter_var, value='all', command=self._toggle_chapter_input)
+        all_radio.grid(row=0, column=1, sticky=tk.W, padx=5)
+        
+        range_radio = ttk.Radiobutton(options_frame, text='指定范围', variable=self.chapter_var, value='range', command=self._toggle_chapter_input)
+        range_radio.grid(row=0, column=2, sticky=tk.W)
+        
+        ttk.Label(options_frame, text='从:').grid(row=0, column=3, sticky=tk.W)
+        self.start_chapter = ttk.Entry(options_frame, width=5, state=tk.DISABLED)
+        self.start_chapter.grid(row=0, column=4, sticky=tk.W)
+        
+        ttk.Label(options_frame, text='到:').grid(row=0, column=5, sticky=tk.W)
+        self.end_chapter = ttk.Entry(options_frame, width=5, state=tk.DISABLED)
+        self.end_chapter.grid(row=0, column=6, sticky=tk.W)
+        
+        # 保存路径选择
+        ttk.Label(options_frame, text='保存路径:').grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.path_entry = ttk.Entry(options_frame, width=50)
+        self.path_entry.grid(row=1, column=1, columnspan=4, sticky=tk.EW, padx=5, pady=5)
+        self.path_entry.insert(0, os.path.join(os.getcwd(), 'novels'))
+        
+        browse_btn = ttk.Button(options_frame, text='浏览', command=self._browse_path)
+        browse_btn.grid(row=1, column=5, sticky=tk.W)
+        
+        options_frame.columnconfigure(1, weight=1)
+        
+        # 控制按钮区域
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.pack(fill=tk.X, pady=10)
+        
+        self.start_btn = ttk.Button(btn_frame, text='开始下载', command=self._start_download)
+        self.start_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.stop_btn = ttk.Button(btn_frame, text='停止下载', command=self._stop_download, state=tk.DISABLED)
+        self.stop_btn.pack(side=tk.LEFT, padx=5)
+        
+        # 进度显示区域
+        progress_frame = ttk.LabelFrame(main_frame, text='下载进度', padding='10')
+        progress_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        
+        self.progress_var = tk.DoubleVar()
+        self.progress_bar = ttk.Progressbar(progress_frame, variable=self.progress_var, length=100, mode='determinate')
+        self.progress_bar.pack(fill=tk.X, pady=5)
+        
+        self.status_label = ttk.Label(progress_frame, text='就绪', anchor=tk.W)
+        self.status_label.pack(fill=tk.X, pady=5)
+        
+        # 日志区域
+        log_frame = ttk.LabelFrame(main_frame, text='下载日志', padding='10')
+        log_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        
+        # 创建滚动条
+        scrollbar = ttk.Scrollbar(log_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.log_text = tk.Text(log_frame, wrap=tk.WORD, yscrollcommand=scrollbar.set, height=10)
+        self.log_text.pack(fill=tk.BOTH, expand=True)
+        scrollbar.config(command=self.log_text.yview)
+        
+        # 重定向stdout到日志缓冲：工作线程只追加到缓冲，由 _process_queue 定时批量写入文本框
+        self.log_buffer = LogBuffer(self.LOG_MAX_LINES, self.LOG_SPILL_PATH)
+        self._saved_streams = (sys.stdout, sys.stderr)
+        sys.stdout = self.log_buffer.stream('stdout')
+        sys.stderr = self.log_buffer.stream('stderr')
+    
+    def _toggle_chapter_input(self):
+        if self.chapter_var.get() == 'range':
+            self.start_chapter.config(state=tk.NORMAL)
+            self.end_chapter.config(state=tk.NORMAL)
+        else:
+            self.start_chapter.config(state=tk.DISABLED)
+            self.end_chapter.config(state=tk.DISABLED)
+    
+    def _browse_path(self):
+        path = filedialog.askdirectory()
+        if path:
+            self.path_entry.delete(0, tk.END)
+            self.path_entry.insert(0, path)
+    
+    def _start_download(self):
+        url = self.url_entry.get().strip()
+        save_path = self.path_entry.get().strip()
+        
+        if not url:
+            messagebox.showerror('错误', '请输入小说URL')
+            return
+        
+        if not save_path:
+            messagebox.showerror('错误', '请选择保存路径')
+            return
+        
+        start_chapter = None
+        end_chapter = None
+        
+        if self.chapter_var.get() == 'range':
+            try:
+                start_chapter = int(self.start_chapter.get()) if self.start_chapter.get() else None
+                end_chapter = int(self.end_chapter.get()) if self.end_chapter.get() else None
+                
+                if start_chapter and end_chapter and start_chapter > end_chapter:
+                    messagebox.showerror('错误', '起始章节不能大于结束章节')
+                    return
+            except ValueError:
+                messagebox.showerror('错误', '章节号必须为数字')
+                return
+        
+        # 禁用开始按钮，启用停止按钮
+        self.start_btn.config(state=tk.DISABLED)
+        self.stop_btn.config(state=tk.NORMAL)
+        
+        # 在获取小说信息之前就创建停止标记，这期间按下停止同样生效
+        self.cancel_token = CancelToken()
+        
+        # 在新线程中开始下载
+        self.download_thread = threading.Thread(
+            target=self._download_novel_thread,
+            args=(url, save_path, start_chapter, end_chapter, self.cancel_token),
+            daemon=True
+        )
+        self.download_thread.start()
+    
+    def _download_novel_thread(self, url, save_path, start_chapter, end_chapter, cancel_token):
+        try:
+            # 获取小说信息
+            novel_info = self.downloader.get_novel_info(url)
+            if cancel_token.cancelled:
+                self.queue.put(('status', '下载已停止'))
+                return
+            if not novel_info:
+                self.queue.put(('error', '获取小说信息失败'))
+                return
+            
+            # 获取章节列表
+            chapter_list = self.downloader.get_chapter_list(url)
+            if cancel_token.cancelled:
+                self.queue.put(('status', '下载已停止'))
+                return
+            if not chapter_list:
+                self.queue.put(('error', '获取章节列表失败'))
+                return
+            
+            total_chapters = len(chapter_list)
+            self.queue.put(('total', total_chapters))
+            self.queue.put(('status', f'开始下载《{novel_info["title"]}》，共{total_chapters}章'))
+            
+            # 定义进度回调函数
+            def progress_callback(percent, chapter_title):
+                self.queue.put(('progress', percent))
+                self.queue.put(('status', f'正在下载: {chapter_title} ({percent:.1f}%)'))
+            
+            # 执行下载并传入进度回调
+            self.downloader.download_novel(url, save_path, start_chapter, end_chapter, progress_callback,
+                                           cancel_token=cancel_token)
+            if cancel_token.cancelled:
+                self.queue.put(('status', '下载已停止'))
+            else:
+                self.queue.put(('complete', '下载完成'))
+        except Exception as e:
+            self.queue.put(('error', f'下载出错: {str(e)}'))
+        finally:
+            # 恢复按钮状态
+            self.queue.put(('enable_buttons', None))
+    
+    def _stop_download(self):
+        # 取消排队中的章节，正在下载的章节完成后退出；还在获取目录时则不再开始下载
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+        self.queue.put(('status', '正在停止下载...'))
+        self.stop_btn.config(state=tk.DISABLED)
+    
+    # 关闭窗口时等待正在下载的章节收尾的最长秒数
+    CLOSE_TIMEOUT = 2.0
+
+    def _on_close(self):
+        """关闭窗口：停止下载，关闭下载器，把缓冲中的日志写入日志文件后销毁窗口"""
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+        if self.download_thread is not None:
+            self.download_thread.join(self.CLOSE_TIMEOUT)
+        try:
+            self.downloader.close()
+        except Exception as e:
+            print(f"关闭下载器失败: {str(e)}")
+        sys.stdout, sys.stderr = self._saved_streams
+        self.log_buffer.close()
+        self.root.destroy()
+
+    def _process_queue(self):
+        while not self.queue.empty():
+            message_type, data = self.queue.get()
+            
+            if message_type == 'status':
+                self.status_label.config(text=data)
+                self.log_buffer.append('status', data)
+            elif message_type == 'progress':
+                self.progress_var.set(data)
+            elif message_type == 'total':
+                self.progress_bar['maximum'] = data
+            elif message_type == 'complete':
+                self.status_label.config(text=data)
+                self.log_buffer.append('status', data)
+                self._flush_log()
+                messagebox.showinfo('完成', data)
+                self.start_btn.config(state=tk.NORMAL)
+                self.stop_btn.config(state=tk.DISABLED)
+            elif message_type == 'error':
+                self.status_label.config(text=data)
+                self.log_buffer.append('status', data)
+                self._flush_log()
+                messagebox.showerror('错误', data)
+                self.start_btn.config(state=tk.NORMAL)
+                self.stop_btn.config(state=tk.DISABLED)
+            elif message_type == 'enable_buttons':
+                self.start_btn.config(state=tk.NORMAL)
+                self.stop_btn.config(state=tk.DISABLED)
+        
+        self._flush_log()
+        self.root.after(100, self._process_queue)
+
+    def _flush_log(self):
+        """把日志缓冲中新增的行一次性写入文本框，并删掉超出保留行数的旧行"""
+        lines, dropped = self.log_buffer.drain()
+        if not lines and not dropped:
+            return
+        # 相邻同类的行合并成一段，一次 insert 写入全部内容
+        chunks = []
+        if dropped:
+            chunks += [f'……积压过多，跳过 {dropped} 行（见日志文件）\n', 'status']
+        for tag, line in lines:
+            if chunks and chunks[-1] == tag:
+                chunks[-2] += line + '\n'
+            else:
+                chunks += [line + '\n', tag]
+        widget = self.log_text
+        widget.configure(state=tk.NORMAL)
+        widget.insert(tk.END, *chunks)
+        excess = int(widget.index('end-1c').split('.')[0]) - 1 - self.LOG_MAX_LINES
+        if excess > 0:
+            widget.delete('1.0', f'{excess + 1}.0')
+        widget.configure(state=tk.DISABLED)
+        widget.see(tk.END)
+
+
+def main():
+    root = tk.Tk()
+    NovelDownloaderGUI(root)
+    root.mainloop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+import argparse
+import html
+import json
+import os
+import threading
+import uuid
+import zipfile
+from datetime import datetime, timezone
+
+from chapter_store import PackedChapterStore
+from content_store import DedupChapterStore, shared_objects_dir
+from download_manifest import DownloadManifest
+
+# 章节状态：尚未结束、已保存、失败（导出时跳过）
+_PENDING, _DONE, _FAILED = 0, 1, 2
+
+EXPORT_FORMATS = ('txt', 'epub')
+
+
+def export_format(path):
+    """按扩展名判断导出格式：.epub 为 EPUB，其余为合并的 TXT"""
+    return 'epub' if str(path).lower().endswith('.epub') else 'txt'
+
+
+class TxtBookWriter:
+    """合并 TXT：按章追加到 <path>.part，写完后 rename 成目标文件"""
+
+    def __init__(self, path, title, author=None, chunk_size=64 * 1024):
+        self.path = str(path)
+        self.part_path = self.path + '.part'
+        self._file = open(self.part_path, 'w', encoding='utf-8', buffering=chunk_size)
+        header = title if not author else f'{title}\n作者：{author}'
+        self._file.write(header + '\n\n')
+
+    def write_chapter(self, title, content):
+        self._file.write(f'{title}\n\n')
+        self._file.write(content.rstrip('\n'))
+        self._file.write('\n\n\n')
+
+    def close(self):
+        self._file.close()
+        os.replace(self.part_path, self.path)
+
+    def abort(self):
+        """放弃导出，删除写了一半的文件"""
+        self._file.close()
+        os.remove(self.part_path)
+
+
+class EpubBookWriter:
+    """EPUB 3（同时带 EPUB 2 的 toc.ncx）：每章一个 XHTML，直接流式写入 zip
+
+    章节正文按段落编码、攒够 chunk_size 字节写一次，内存中只保留各章的标题，
+    目录、content.opf 等在 close() 时写入。
+    """
+
+    def __init__(self, path, title, author=None, chunk_size=64 * 1024, language='zh'):
+        self.path = str(path)
+        self.part_path = self.path + '.part'
+        self.title = title
+        self.author = author
+        self.language = language
+        self.chunk_size = chunk_size
+        self.book_id = f'urn:uuid:{uuid.uuid4()}'
+        self._titles = []
+        self._zip = zipfile.ZipFile(self.part_path, 'w', zipfile.ZIP_DEFLATED)
+        # mimetype 必须是第一个文件且不压缩
+        self._zip.writestr(zipfile.ZipInfo('mimetype'), 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        self._zip.writestr('META-INF/container.xml', (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+            '  <rootfiles>\n'
+            '    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>\n'
+            '  </rootfiles>\n'
+            '</container>\n'
+        ))
+
+    @staticmethod
+    def _chapter_name(number):
+        return f'text/chapter_{number:05d}.xhtml'
+
+    def write_chapter(self, title, content):
+        self._titles.append(title)
+        escaped_title = html.escape(title)
+        with self._zip.open('OEBPS/' + self._chapter_name(len(self._titles)), 'w') as f:
+            chunk = [(
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<!DOCTYPE html>\n'
+                f'<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="{self.language}">\n'
+                f'<head><meta charset="UTF-8"/><title>{escaped_title}</title></head>\n'
+                f'<body>\n<h2>{escaped_title}</h2>\n'
+            ).encode('utf-8')]
+            size = len(chunk[0])
+            for paragraph in content.split('\n'):
+                paragraph = paragraph.strip()
+                if not paragraph:
+                    continue
+                data = f'<p>{html.escape(paragraph)}</p>\n'.encode('utf-8')
+                chunk.append(data)
+                size += len(data)
+                if size >= self.chunk_size:
+                    f.write(b''.join(chunk))
+                    chunk = []
+                    size = 0
+            chunk.append(b'</body>\n</html>\n')
+            f.write(b''.join(chunk))
+
+    def _write_package(self):
+        title = html.escape(self.title)
+        author = f'<dc:creator>{html.escape(self.author)}</dc:creator>' if self.author else ''
+        modified = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        numbers = range(1, len(self._titles) + 1)
+        manifest = ''.join(
+            f'    <item id="c{number}" href="{self._chapter_name(number)}" media-type="application/xhtml+xml"/>\n'
+            for number in numbers
+        )
+        spine = ''.join(f'    <itemref idref="c{number}"/>\n' for number in numbers)
+        self._zip.writestr('OEBPS/content.opf', (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">\n'
+            '  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+            f'    <dc:identifier id="book-id">{self.book_id}</dc:identifier>\n'
+            f'    <dc:title>{title}</dc:title>\n'
+            f'    <dc:language>{self.language}</dc:language>\n'
+            f'    {author}\n'
+            f'    <meta property="dcterms:modified">{modified}</meta>\n'
+            '  </metadata>\n'
+            '  <manifest>\n'
+            '    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>\n'
+            '    <item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>\n'
+            f'{manifest}'
+            '  </manifest>\n'
+            '  <spine toc="ncx">\n'
+            f'{spine}'
+            '  </spine>\n'
+            '</package>\n'
+        ))
+        nav = ''.join(
+            f'      <li><a href="{self._chapter_name(number)}">{html.escape(chapter_title)}</a></li>\n'
+            for number, chapter_title in zip(numbers, self._titles)
+        )
+        self._zip.writestr('OEBPS/nav.xhtml', (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!DOCTYPE html>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">\n'
+            f'<head><meta charset="UTF-8"/><title>{title}</title></head>\n'
+            '<body>\n'
+            '  <nav epub:type="toc">\n'
+            '    <ol>\n'
+            f'{nav}'
+            '    </ol>\n'
+            '  </nav>\n'
+            '</body>\n'
+            '</html>\n'
+        ))
+        points = ''.join(
+            f'    <navPoint id="p{number}" playOrder="{number}">'
+            f'<navLabel><text>{html.escape(chapter_title)}</text></navLabel>'
+            f'<content src="{self._chapter_name(number)}"/></navPoint>\n'
+            for number, chapter_title in zip(numbers, self._titles)
+        )
+        self._zip.writestr('OEBPS/toc.ncx', (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">\n'
+            f'  <head><meta name="dtb:uid" content="{self.book_id}"/></head>\n'
+            f'  <docTitle><text>{title}</text></docTitle>\n'
+            '  <navMap>\n'
+            f'{points}'
+            '  </navMap>\n'
+            '</ncx>\n'
+        ))
+
+    def close(self):
+        self._write_package()
+        self._zip.close()
+        os.replace(self.part_path, self.path)
+
+    def abort(self):
+        self._zip.close()
+        os.remove(self.part_path)
+
+
+def open_book_writer(path, title, author=None, fmt=None, chunk_size=64 * 1024):
+    """按格式（默认由扩展名判断）创建导出写入器"""
+    fmt = fmt or export_format(path)
+    if fmt == 'txt':
+        return TxtBookWriter(path, title, author, chunk_size)
+    if fmt == 'epub':
+        return EpubBookWriter(path, title, author, chunk_size)
+    raise ValueError(f'未知的导出格式: {fmt}')
+
+
+def saved_chapter_reader(save_path, store=None):
+    """读取已保存章节正文的函数：store 为章节仓库（packed/dedup）时按章节号读取，否则读 save_path 下的 .txt"""
+    if store is not None:
+        return lambda chapter: store.get(chapter['index'])
+
+    def read(chapter):
+        file_path = os.path.join(save_path, chapter['file'])
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, encoding='utf-8') as f:
+            return f.read()
+
+    return read
+
+
+class BookExporter:
+    """按目录顺序流式导出一本书，可以在下载进行中同步导出
+
+    chapter_list 给出导出顺序（get_chapter_list 的顺序）。每章保存或失败后调用
+    chapter_done / chapter_failed，导出器把从当前位置起连续已结束的章节依次写入：
+    恰好轮到的章节直接使用传入的正文，提前完成的章节只记一个状态，轮到时再用
+    read_chapter 从存储中读回，所以无论下载顺序如何，内存中最多只有一章正文。
+    失败的章节跳过，finish() 时仍未结束的章节同样跳过。
+    """
+
+    def __init__(self, writer, chapter_list, read_chapter):
+        self.writer = writer
+        self.chapters = chapter_list
+        self.read_chapter = read_chapter
+        self.written = 0
+        self.skipped = 0
+        self._positions = {chapter['index']: position for position, chapter in enumerate(chapter_list)}
+        self._states = bytearray(len(chapter_list))
+        self._next = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def chapter_done(self, chapter, content=None):
+        """某章已保存；content 为刚保存的正文，轮到该章时省去一次读取"""
+        self._set_state(chapter, _DONE, content)
+
+    def chapter_failed(self, chapter):
+        self._set_state(chapter, _FAILED)
+
+    def _set_state(self, chapter, state, content=None):
+        with self._lock:
+            position = self._positions.get(chapter.get('index'))
+            if self._closed or position is None or position < self._next:
+                return
+            self._states[position] = state
+            if position == self._next and state == _DONE and content is not None:
+                self._write(chapter, content)
+                self._next += 1
+            self._pump()
+
+    def _pump(self):
+        while self._next < len(self.chapters) and self._states[self._next] != _PENDING:
+            chapter = self.chapters[self._next]
+            content = self.read_chapter(chapter) if self._states[self._next] == _DONE else None
+            if content is None:
+                self.skipped += 1
+            else:
+                self._write(chapter, content)
+            self._next += 1
+
+    def _write(self, chapter, content):
+        self.writer.write_chapter(chapter['title'], content)
+        self.written += 1
+
+    def finish(self):
+        """写完剩余的章节并生成最终文件，返回 {'chapters': 写入章数, 'skipped': 跳过章数}"""
+        with self._lock:
+            if self._closed:
+                return {'chapters': self.written, 'skipped': self.skipped}
+            self._pump()
+            self.skipped += len(self.chapters) - self._next
+            self._next = len(self.chapters)
+            self._closed = True
+            self.writer.close()
+        return {'chapters': self.written, 'skipped': self.skipped}
+
+    def abort(self):
+        """放弃导出（例如下载被停止），删除未完成的文件"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self.writer.abort()
+
+
+def export_book(save_path, output_path, title=None, author=None, fmt=None, chunk_size=64 * 1024):
+    """把 save_path 中已下载的章节按章节序号导出为一个文件，返回导出统计
+
+    章节顺序和文件名取自下载清单；save_path 是单文件仓库或去重仓库时直接按仓库中的章节号读取。
+    """
+    if os.path.exists(os.path.join(save_path, PackedChapterStore.INDEX_FILE)):
+        store = PackedChapterStore(save_path)
+    elif os.path.exists(os.path.join(save_path, DedupChapterStore.REFS_FILE)):
+        store = DedupChapterStore(save_path, shared_objects_dir(save_path), read_only=True)
+    else:
+        store = None
+    try:
+        if store is not None:
+            chapter_list = [{'index': chapter_no, 'title': store.get_title(chapter_no)}
+                            for chapter_no in store.chapter_numbers()]
+        else:
+            manifest = DownloadManifest(save_path)
+            if not manifest.exists:
+                raise ValueError(f'没有下载清单，无法确定章节顺序: {save_path}')
+            chapter_list = [entry for index, entry in sorted(manifest.entries.items())
+                            if entry['status'] == 'done' and entry.get('file')]
+        writer = open_book_writer(output_path, title or os.path.basename(os.path.normpath(save_path)),
+                                  author, fmt, chunk_size)
+        exporter = BookExporter(writer, chapter_list, saved_chapter_reader(save_path, store))
+        try:
+            for chapter in chapter_list:
+                exporter.chapter_done(chapter)
+        except Exception:
+            exporter.abort()
+            raise
+        return exporter.finish()
+    finally:
+        if store is not None:
+            store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把已下载的章节导出为合并的 TXT 或 EPUB')
+    parser.add_argument('save_path', help='下载目录（download_novel 的 save_path）')
+    parser.add_argument('output', help='导出文件，扩展名为 .epub 时导出 EPUB，否则为 TXT')
+    parser.add_argument('--title', help='书名，默认为下载目录名')
+    parser.add_argument('--author', help='作者')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, help='导出格式，默认由扩展名判断')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出导出统计')
+    args = parser.parse_args()
+
+    try:
+        stats = export_book(args.save_path, args.output, args.title, args.author, args.format)
+    except Exception as e:
+        print(f"导出失败: {str(e)}")
+        raise SystemExit(1)
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False))
+    else:
+        print(f"已导出 {stats['chapters']} 章到 {args.output}，跳过 {stats['skipped']} 章")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+
+class LogBuffer:
+    """线程安全的环形日志缓冲
+
+    工作线程通过 stream() 得到的类文件对象写日志，只在锁内把整行追加到缓冲，
+    不接触任何界面控件；界面线程定时调用 drain() 一次取走新增的行批量显示。
+    最多保留 max_lines 行：超出的旧行从缓冲中丢弃，指定 spill_path 时先写入
+    按大小轮转的日志文件（spill_bytes 字节一个文件，保留 spill_backups 个旧文件）。
+    界面来不及取走的行同样只保留最新的 max_lines 行，drain() 会返回被跳过的行数。
+    """
+
+    def __init__(self, max_lines=2000, spill_path=None, spill_bytes=5 * 1024 * 1024, spill_backups=3):
+        self.max_lines = max_lines
+        self._history = deque()
+        self._pending = deque()
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._spill = None
+        if spill_path:
+            directory = os.path.dirname(spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._spill = RotatingFileHandler(spill_path, maxBytes=spill_bytes, backupCount=spill_backups,
+                                              encoding='utf-8', delay=True)
+            self._spill.setFormatter(logging.Formatter('%(message)s'))
+
+    def stream(self, tag='stdout'):
+        """返回写入本缓冲的类文件对象，可直接赋给 sys.stdout / sys.stderr"""
+        return LogStream(self, tag)
+
+    def append(self, tag, line):
+        self.extend(tag, [line])
+
+    def extend(self, tag, lines):
+        evicted = []
+        with self._lock:
+            for line in lines:
+                self._history.append((tag, line))
+                if len(self._history) > self.max_lines:
+                    evicted.append(self._history.popleft())
+                self._pending.append((tag, line))
+                if len(self._pending) > self.max_lines:
+                    self._pending.popleft()
+                    self._dropped += 1
+        if evicted:
+            self._write_spill(evicted)
+
+    def drain(self):
+        """取走上次以来新增的行，返回 ([(tag, 行), ...], 因积压被跳过的行数)"""
+        with self._lock:
+            lines = list(self._pending)
+            self._pending.clear()
+            dropped = self._dropped
+            self._dropped = 0
+        return lines, dropped
+
+    def lines(self):
+        """当前保留的全部行"""
+        with self._lock:
+            return list(self._history)
+
+    def close(self):
+        """把仍保留在缓冲中的行也写入日志文件并关闭"""
+        if self._spill is None:
+            return
+        with self._lock:
+            lines = list(self._history)
+            self._history.clear()
+        self._write_spill(lines)
+        spill, self._spill = self._spill, None
+        spill.close()
+
+    def _write_spill(self, lines):
+        spill = self._spill
+        if spill is None:
+            return
+        # handle() 持有处理器自身的锁，多个线程同时写入和轮转文件不会冲突
+        for tag, line in lines:
+            spill.handle(logging.makeLogRecord({'msg': f'[{tag}] {line}'}))
+
+
+class LogStream:
+    """LogBuffer 的类文件写入端：按换行切分，不完整的行留到下次 write 拼接
+
+    行尾的回车属于 CRLF 换行，直接去掉；行内的回车（tqdm 等进度条用来原地刷新）
+    之前的内容视为被覆盖，只保留最后一段。
+    """
+
+    def __init__(self, buffer, tag):
+        self.buffer = buffer
+        self.tag = tag
+        self._partial = ''
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        if not text:
+            return 0
+        with self._lock:
+            lines = (self._partial + text).split('\n')
+            # 不完整的行原样保留，CRLF 的回车可能和换行分在两次 write 中
+            self._partial = lines.pop()
+            lines = [line.removesuffix('\r').rsplit('\r', 1)[-1] for line in lines]
+        if lines:
+            self.buffer.extend(self.tag, lines)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
@@ -1,67 +1,190 @@
-import sys
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
-                           QHBoxLayout, QLineEdit, QPushButton, QListWidget,
-                           QTextEdit, QProgressBar, QMessageBox)
-import requests
-from bs4 import BeautifulSoup
-from novel_downloader import download_chapter
-
-class QidianSpider:
-    def search_novel(self, keyword):
-        try:
-            # 错误行：url = ' `https://www.qidian.com/search?kw=` ' + keyword
-            # 修正为：
-            url = 'https://www.qidian.com/search?kw=' + keyword
-            response = requests.get(url, timeout=10)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            # 解析搜索结果逻辑...
-            return []
-        except Exception as e:
-            raise
-
-class MainWindow(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.spider = QidianSpider()
-        self.init_ui()
-
-    def init_ui(self):
-        # 创建搜索输入框和按钮
-        self.search_input = QLineEdit()
-        self.search_btn = QPushButton('搜索')
-        # 新增下载按钮
-        self.download_btn = QPushButton('下载选中章节')
-        self.download_btn.clicked.connect(self.handle_download)
-
-    def handle_download(self):
-        selected_item = self.novel_list.currentItem()
-        if selected_item:
-            novel_id = selected_item.data(32)  # 假设存储了小说ID
-            download_chapter(novel_id, 1)  # 下载第一章
-        
-        # 创建布局并添加组件
-        search_layout = QHBoxLayout()
-        search_layout.addWidget(self.search_input)
-        search_layout.addWidget(self.search_btn)
-        
-        # 将搜索布局添加到主布局
-        main_layout = QVBoxLayout()
-        main_layout.addLayout(search_layout)
-        self.search_btn.clicked.connect(self.handle_search)
-
-    def handle_search(self):
-        try:
-            keyword = self.search_input.text()
-            results = self.spider.search_novel(keyword)
-            # 更新列表逻辑...
-        except Exception as e:
-            self.show_error(str(e))
-
-    def show_error(self, message):
-        QMessageBox.critical(self, '错误', message)
-
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
+import sys
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
+                           QHBoxLayout, QLineEdit, QPushButton, QListWidget, QListWidgetItem,
+                           QTextEdit, QProgressBar, QMessageBox, QLabel)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+import os
+import threading
+from nihao import NovelDownloader, novel_id
+from 小说阅读器 import StorageManager, NovelSearcher
+from chapter_list import status_counts
+from search_service import QidianSpider, normalize_keyword
+
+class MainWindow(QMainWindow):
+    # 输入停止这么久（毫秒）之后才发起搜索
+    SEARCH_DEBOUNCE_MS = 300
+
+    # 后台搜索完成：(关键词, 结果列表, 错误信息)，通过信号回到界面线程
+    search_finished = pyqtSignal(str, object, object)
+    # 后台下载完成：(小说地址, 错误信息)
+    download_finished = pyqtSignal(str, object)
+
+    def __init__(self):
+        super().__init__()
+        self.searcher = NovelSearcher()
+        self.spider = QidianSpider(fallback=self.searcher)
+        # 保存的章节即时写入全文索引，离线搜索也能搜到
+        self.storage = StorageManager(searcher=self.searcher)
+        # 最近一次发起的搜索，较早搜索的结果晚到时丢弃
+        self._search_keyword = None
+        self.search_finished.connect(self.show_search_results)
+        self.download_finished.connect(self.show_download_result)
+        # 当前打开的分页阅读器和页码
+        self.reader = None
+        self.page_no = 0
+        self.init_ui()
+
+    def init_ui(self):
+        # 创建搜索输入框和按钮
+        self.search_input = QLineEdit()
+        self.search_btn = QPushButton('搜索')
+        # 输入防抖：每次输入重新计时，停止输入 SEARCH_DEBOUNCE_MS 后才搜索
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.handle_search)
+        self.search_input.textChanged.connect(lambda text: self.search_timer.start())
+        self.search_input.returnPressed.connect(self.handle_search)
+        # 新增下载按钮
+        self.download_btn = QPushButton('下载选中章节')
+        self.download_btn.clicked.connect(self.handle_download)
+        # 小说列表（搜索结果和本地已保存的小说），双击本地小说在阅读区打开
+        self.novel_list = QListWidget()
+        self.novel_list.itemDoubleClicked.connect(self.handle_open)
+        # 阅读区：一次只显示一页
+        self.reader_view = QTextEdit()
+        self.reader_view.setReadOnly(True)
+        self.prev_btn = QPushButton('上一页')
+        self.next_btn = QPushButton('下一页')
+        self.page_label = QLabel()
+        self.prev_btn.clicked.connect(lambda: self.show_page(self.page_no - 1))
+        self.next_btn.clicked.connect(lambda: self.show_page(self.page_no + 1))
+        
+        # 创建布局并添加组件
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.search_btn)
+        search_layout.addWidget(self.download_btn)
+
+        page_layout = QHBoxLayout()
+        page_layout.addWidget(self.prev_btn)
+        page_layout.addWidget(self.page_label)
+        page_layout.addWidget(self.next_btn)
+
+        reader_layout = QVBoxLayout()
+        reader_layout.addWidget(self.reader_view)
+        reader_layout.addLayout(page_layout)
+
+        content_layout = QHBoxLayout()
+        content_layout.addWidget(self.novel_list, 1)
+        content_layout.addLayout(reader_layout, 3)
+        
+        # 将搜索布局添加到主布局
+        main_layout = QVBoxLayout()
+        main_layout.addLayout(search_layout)
+        main_layout.addLayout(content_layout)
+        central = QWidget()
+        central.setLayout(main_layout)
+        self.setCentralWidget(central)
+        self.search_btn.clicked.connect(self.handle_search)
+        self.load_library()
+
+    def load_library(self):
+        """列出本地已保存的整本小说（<存储目录>/<作者>/<书名>.txt）"""
+        for novel_path in sorted(self.storage.base_dir.glob('*/*.txt')):
+            item = QListWidgetItem(f'{novel_path.stem} - {novel_path.parent.name}')
+            item.setData(Qt.UserRole + 1, (novel_path.parent.name, novel_path.stem))
+            self.novel_list.addItem(item)
+
+    def handle_open(self, item):
+        local = item.data(Qt.UserRole + 1)
+        if local:
+            self.open_novel(*local)
+
+    def open_novel(self, author, title):
+        """在阅读区打开本地小说：按页读取，首次打开时建立分页索引"""
+        try:
+            self.reader = self.storage.open_reader(author, title)
+            self.setWindowTitle(title)
+            self.show_page(0)
+        except Exception as e:
+            self.show_error(f'打开小说失败: {str(e)}')
+
+    def show_page(self, number):
+        if self.reader is None or not 0 <= number < self.reader.page_count:
+            return
+        self.page_no = number
+        self.reader_view.setPlainText(self.reader.page(number))
+        chapter_title = self.reader.chapters[self.reader.chapter_of(number)][0]
+        self.page_label.setText(f'{chapter_title}  {number + 1}/{self.reader.page_count}')
+
+    def handle_download(self):
+        """在后台下载选中的搜索结果的第一章，保存到 novels/<小说编号>"""
+        selected_item = self.novel_list.currentItem()
+        url = selected_item.data(Qt.UserRole + 2) if selected_item else None
+        if not url:
+            return
+        threading.Thread(target=self._download_first_chapter, args=(url,), daemon=True).start()
+
+    def _download_first_chapter(self, url):
+        downloader = NovelDownloader()
+        try:
+            downloader.download_novel(url, os.path.join('novels', novel_id(url)), 1, 1)
+            error = '章节下载失败' if status_counts(downloader.chapter_progress).get('失败') else None
+        except Exception as e:
+            error = str(e)
+        finally:
+            downloader.close()
+        self.download_finished.emit(url, error)
+
+    def show_download_result(self, url, error):
+        if error is not None:
+            self.show_error(f'下载失败: {error}')
+            return
+        QMessageBox.information(self, '完成', f'已下载第一章: {url}')
+
+    def handle_search(self):
+        self.search_timer.stop()
+        keyword = self.search_input.text()
+        if not normalize_keyword(keyword):
+            return
+        self._search_keyword = keyword
+        # 搜索在后台线程中进行，完成后通过信号把结果交回界面线程
+        self.spider.search_novel_async(keyword).add_done_callback(
+            lambda future: self.search_finished.emit(
+                keyword,
+                None if future.exception() else future.result(),
+                str(future.exception()) if future.exception() else None
+            )
+        )
+
+    def show_search_results(self, keyword, results, error):
+        if keyword != self._search_keyword:
+            return
+        if error is not None:
+            self.show_error(f'搜索失败: {error}')
+            return
+        self.novel_list.clear()
+        for result in results:
+            text = f"{result['title']} - {result['author']}"
+            item = QListWidgetItem(text + ('（本地）' if result.get('offline') else ''))
+            item.setData(Qt.UserRole, result['id'])
+            item.setData(Qt.UserRole + 2, result['url'])
+            if result.get('offline'):
+                item.setData(Qt.UserRole + 1, (result['author'], result['title']))
+            self.novel_list.addItem(item)
+
+    def closeEvent(self, event):
+        self.spider.close()
+        self.storage.close()
+        self.searcher.close()
+        super().closeEvent(event)
+
+    def show_error(self, message):
+        QMessageBox.critical(self, '错误', message)
+
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    window.show()
     sys.exit(app.exec_())
\ No newline at end of file
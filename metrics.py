@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+# 秒为单位的直方图桶上界，覆盖 1ms 到 30s，最后隐含 +Inf
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 每章的处理阶段：fetch 请求章节页，ttfb 发出请求到收到响应头（两种传输层都记录），
+# parse 构建文档树，clean 提取和清理正文，write 保存；aiohttp 传输层另有 dns（域名解析）和 connect（建立连接）
+PHASES = ('dns', 'connect', 'ttfb', 'fetch', 'parse', 'clean', 'write')
+
+
+class Histogram:
+    """固定桶直方图：observe 只做一次二分查找和两次加法"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """按桶估计分位数（取所在桶的上界），没有数据时返回 0"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], self.counts))
+        }
+
+
+class Metrics:
+    """下载过程的埋点：各阶段耗时直方图、计数器以及可选的逐章 span 记录
+
+    下载器的 metrics 为 None 时各埋点处只多一次判断，不计时也不加锁。
+    keep_spans 为真时保留最近 max_spans 条逐章记录，可导出为 JSON lines。
+    """
+
+    def __init__(self, keep_spans=False, max_spans=100000, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}
+        self.spans = deque(maxlen=max_spans) if keep_spans else None
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, phase, seconds, chapter=None):
+        """记录一章某个阶段的耗时"""
+        with self._lock:
+            histogram = self.histograms.get(phase)
+            if histogram is None:
+                histogram = self.histograms[phase] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            if self.spans is not None:
+                self.spans.append({
+                    'phase': phase,
+                    'chapter': chapter.get('index') if chapter else None,
+                    'title': chapter.get('title') if chapter else None,
+                    'seconds': round(seconds, 6),
+                    'time': round(time.time(), 3)
+                })
+
+    def span(self, phase, started, chapter=None):
+        """记录从 started（time.perf_counter() 的值）到现在的耗时"""
+        self.observe(phase, time.perf_counter() - started, chapter)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'uptime': round(time.time() - self.started, 3),
+                'counters': dict(self.counters),
+                'phases': {phase: histogram.snapshot() for phase, histogram in self.histograms.items()}
+            }
+
+    def write_json_lines(self, fp):
+        """把逐章 span（若有）和一行汇总写入文件对象，每行一个 JSON"""
+        with self._lock:
+            spans = list(self.spans or ())
+        for span in spans:
+            fp.write(json.dumps(dict(span, type='span'), ensure_ascii=False) + '\n')
+        fp.write(json.dumps(dict(self.snapshot(), type='summary'), ensure_ascii=False) + '\n')
+
+    def prometheus_text(self, prefix='novel_downloader'):
+        """Prometheus 文本格式的快照"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            metric = f'{prefix}_{name}_total'
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {value}')
+        metric = f'{prefix}_phase_seconds'
+        if snapshot['phases']:
+            lines.append(f'# TYPE {metric} histogram')
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            for phase, histogram in histograms:
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{phase="{phase}"}} {histogram.sum}')
+                lines.append(f'{metric}_count{{phase="{phase}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
@@ -1,463 +1,1051 @@
-import requests
-from bs4 import BeautifulSoup
+"""小说下载器核心（不依赖任何界面库）
+
+requests、tqdm、asyncio、aiohttp、bs4 等较重的依赖都在第一次用到时才导入，导入本模块本身很快；
+图形界面在 downloader_gui.py 中，NovelDownloaderGUI 仍可从本模块按原名取得（按需导入）。
+命令行下载：python nihao.py <小说地址> -o <保存目录>，不带参数时启动图形界面。
+"""
+import argparse
+import sys
 import threading
 import os
-from fake_useragent import UserAgent
-from tqdm import tqdm
 import time
-from pathlib import Path
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-import queue
-import sys
-from main import nihao
-from 小说阅读器 import nihao 
+import functools
+from rate_limit import HostRateLimiter, RetryPolicy
+from page_parser import (site_of, charset_from_content_type, resolve_parser, parse_novel_info,
+                         parse_chapter_list, parse_chapter_content, parse_chapter_content_timed)
+from chapter_store import PackedChapterStore
+from download_manifest import DownloadManifest, unique_file_names, content_hash
+from content_store import DedupChapterStore, shared_objects_dir
+from catalog_cache import CatalogCache
+from response_cache import ResponseCache, CachedResponse
+from progress import ProgressAggregator
+from chapter_list import ChapterList, ChapterProgress, progress_key, status_counts
+from exporter import BookExporter, open_book_writer, saved_chapter_reader
+from user_agents import random_user_agent
 
+# aiohttp 传输层为可选功能，创建 AiohttpTransport 时才导入 aiohttp
+aiohttp = None
+# asyncio 导入较慢（约占导入本模块耗时的一半），创建下载引擎时才导入
+asyncio = None
 
 
-class NovelDownloader:
+def _import_asyncio():
+    global asyncio
+    if asyncio is None:
+        import asyncio as module
+        asyncio = module
+    return asyncio
+
+
+def _import_aiohttp():
+    global aiohttp
+    if aiohttp is None:
+        try:
+            import aiohttp as module
+        except ImportError:
+            raise RuntimeError('异步下载引擎需要安装 aiohttp: pip install aiohttp') from None
+        aiohttp = module
+    return aiohttp
+
+
+def __getattr__(name):
+    # 图形界面按需导入，只用下载核心时不加载 tkinter
+    if name == 'NovelDownloaderGUI':
+        from downloader_gui import NovelDownloaderGUI
+        return NovelDownloaderGUI
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def novel_id(url):
+    """从小说页地址中取出站点内的小说编号，不支持的网站返回 None"""
+    site = site_of(url)
+    if site == 'qidian':
+        return url.split('/')[-1]
+    if site == 'jjwxc':
+        return url.split('/')[-1].split('.')[0]
+    return None
+
+
+def catalog_url(url):
+    """由小说页地址推出目录页地址"""
+    site = site_of(url)
+    if site == 'qidian':
+        return f"https://book.qidian.com/info/{novel_id(url)}#Catalog"
+    if site == 'jjwxc':
+        return f"https://www.jjwxc.net/onebook.php?novelid={novel_id(url)}"
+    return None
+
+
+def chapter_file_title(chapter):
+    """章节保存用的文件名（去掉不能出现在文件名中的字符）"""
+    return chapter['title'].replace('?', '').replace(':', '：')
+
+
+def select_chapters(chapter_list, start_chapter=None, end_chapter=None):
+    """给章节标上目录中的序号（index，从1开始）并截取要下载的范围，返回 ChapterList"""
+    if not isinstance(chapter_list, ChapterList):
+        chapter_list = ChapterList(chapter_list)
+    chapter_list = chapter_list.numbered(1)
+    if start_chapter is not None:
+        chapter_list = chapter_list[start_chapter - 1:]
+    if end_chapter is not None:
+        chapter_list = chapter_list[:end_chapter - (start_chapter or 1) + 1]
+    return chapter_list
+
+
+def open_store(save_path, storage):
+    """按存储方式打开章节仓库：'files' 每章一个 .txt（返回 None），'packed' 为单文件仓库，
+    'dedup' 只保存正文哈希的引用，正文存入同级目录下各书共享的内容寻址仓库"""
+    if storage == 'files':
+        return None
+    if storage == 'packed':
+        return PackedChapterStore(save_path)
+    if storage == 'dedup':
+        return DedupChapterStore(save_path, shared_objects_dir(save_path))
+    raise ValueError(f'未知的存储方式: {storage}')
+
+
+def chapter_file_name(chapter):
+    """章节的 .txt 文件名：优先使用 unique_file_names 分配的不重名文件名"""
+    return chapter.get('file') or f'{chapter_file_title(chapter)}.txt'
+
+
+def chapter_saved(chapter, save_path, store=None):
+    """断点续传检查：章节是否已经保存过"""
+    if store is not None:
+        return chapter.get('index') in store
+    return os.path.exists(os.path.join(save_path, chapter_file_name(chapter)))
+
+
+def load_manifest(chapter_list, save_path, store=None):
+    """载入下载清单，返回 (清单, 带文件名的章节列表)
+
+    清单不存在（旧版本下载的目录）时，一次列出目录或读取仓库索引认领已保存的章节，
+    之后的续传只比较清单，不再逐章 stat。
+    """
+    if store is None:
+        chapter_list = unique_file_names(chapter_list, chapter_file_title)
+    manifest = DownloadManifest(save_path)
+    if not manifest.exists:
+        if store is not None:
+            manifest.adopt(chapter_list, lambda chapter: chapter['index'] in store)
+        else:
+            existing = set(os.listdir(save_path))
+            manifest.adopt(chapter_list, lambda chapter: chapter['file'] in existing)
+    return manifest, chapter_list
+
+
+def pending_chapters(chapter_list, manifest, changed=()):
+    """需要下载的章节在 chapter_list 中的位置：清单中尚未完成的，以及目录更新后新增或改动的"""
+    return [position for position, chapter in enumerate(chapter_list)
+            if chapter['index'] in changed or not manifest.is_done(chapter)]
+
+
+def open_exporter(export, novel_info, chapter_list, positions, save_path, store=None):
+    """为 download_novel 的 export 参数创建边下载边导出的 BookExporter，export 为 None 时返回 None
+
+    positions 为需要下载的章节位置，其余章节已经保存过，先交给导出器按顺序写入。
+    """
+    if export is None:
+        return None
+    writer = open_book_writer(export, novel_info['title'], novel_info.get('author'))
+    exporter = BookExporter(writer, chapter_list, saved_chapter_reader(save_path, store))
+    pending = set(positions)
+    for position, chapter in enumerate(chapter_list):
+        if position not in pending:
+            exporter.chapter_done(chapter)
+    return exporter
+
+
+def close_exporter(exporter, completed):
+    """下载结束后生成导出文件并返回导出统计；下载未完成（出错或被停止）时删除未完成的文件"""
+    if exporter is None:
+        return None
+    if not completed:
+        exporter.abort()
+        return None
+    stats = exporter.finish()
+    if stats['skipped']:
+        print(f"导出时跳过了 {stats['skipped']} 个未下载成功的章节")
+    return stats
+
+
+def chapter_unchanged(chapter, chapter_content, manifest):
+    """写入前的去重预检：清单中该章已完成且正文哈希相同（站点标记为更新但正文未变），无需重写"""
+    return manifest is not None and manifest.unchanged(chapter, content_hash(chapter_content))
+
+
+def write_chapter(chapter, save_path, chapter_content, store=None):
+    """保存章节正文：写入单文件仓库（需要章节序号）或 save_path 下的 <标题>.txt"""
+    if store is not None:
+        if 'index' not in chapter:
+            raise ValueError(f"写入单文件仓库需要章节序号: {chapter['title']}")
+        store.append(chapter['index'], chapter['title'], chapter_content)
+        return
+    file_path = os.path.join(save_path, chapter_file_name(chapter))
+    try:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(chapter_content)
+    except Exception:
+        # 删除写了一半的文件以便后续重试
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+
+def parse_page(page_cache, page, key, parse):
+    """解析缓存的小说页或目录页（同一份响应只解析一次）
+
+    解析出错或结果为空（多半是反爬验证页）时把响应从缓存中丢弃再抛出或返回，
+    成功时才让缓存把响应写入磁盘。
+    """
+    try:
+        result = page.memoized(key, parse)
+    except Exception:
+        page_cache.discard(page)
+        raise
+    if result:
+        page_cache.keep(page)
+    else:
+        page_cache.discard(page)
+    return result
+
+
+def process_context():
+    """解析进程池的启动方式：下载时进程里已有多个线程，fork 会把其他线程持有的锁原样复制到子进程，
+    可能让子进程卡死；可用时用 forkserver，否则用 spawn"""
+    import multiprocessing
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class CancelToken:
+    """停止下载的标记，可以在任何线程中调用 cancel()
+
+    调用方可以先创建它再获取小说信息和目录，最后交给 download_novel：
+    开始下载前按下的停止同样生效。尚未开始的章节不再请求，正在退避等待的重试立即放弃。
+    """
+
     def __init__(self):
-        self.session = requests.Session()
-        self.ua = UserAgent()
-        self.session.headers = {
-            'User-Agent': self.ua.random,
-            'Referer': 'https://www.qidian.com/'
-        }
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+    def wait(self, timeout):
+        """等待 timeout 秒，期间被取消则提前返回 True"""
+        return self._event.wait(timeout)
+
+
+class BookDownload:
+    """一本书的下载状态：保存目录、章节仓库、下载清单、导出器、各章状态和停止标记
+
+    章节下载例程（fetch_and_save）只通过它读写这些状态，同一个下载器可以同时下载多本书。
+    """
+
+    def __init__(self, save_path, store=None, manifest=None, chapter_progress=None, exporter=None,
+                 cancel_token=None):
+        self.save_path = save_path
+        self.store = store
+        self.manifest = manifest
+        self.chapter_progress = chapter_progress if chapter_progress is not None else {}
+        self.exporter = exporter
+        self.cancel_token = cancel_token or CancelToken()
+
+
+class TransportResponse:
+    """传输层返回的响应：状态码、响应体、响应头，elapsed 为收到响应头的耗时（秒）"""
+
+    __slots__ = ('status', 'content', 'headers', 'elapsed', 'reason', 'original')
+
+    def __init__(self, status, content, headers, elapsed=None, reason=None, original=None):
+        self.status = status
+        self.content = content
+        self.headers = headers
+        self.elapsed = elapsed
+        self.reason = reason
+        # 传输库自己的响应对象，构造它的异常时使用
+        self.original = original
+
+
+class RequestsTransport:
+    """requests 传输层：阻塞的 session.get 放到 max_workers 个线程中执行
+
+    session 由 NovelDownloader 创建和关闭，可以挂载自定义的适配器（连接池大小、测试用的替身站点）。
+    解析和写文件也在同一个线程池中进行。
+    """
+
+    def __init__(self, session, max_workers=5):
+        import requests
+        _import_asyncio()
+        self.session = session
+        self.concurrency = max_workers
+        self.retry_errors = (requests.Timeout, requests.ConnectionError)
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='chapter')
+        return self._executor
+
+    def ensure_workers(self, count):
+        """同时下载 count 章时线程池至少要有 count 个线程"""
+        if count > self.concurrency:
+            self.concurrency = count
+            if self._executor is not None:
+                # 旧线程池中正在执行的任务照常完成
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    async def get(self, url, timeout, headers=None):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self.executor, functools.partial(self.session.get, url, timeout=timeout, headers=headers)
+        )
+        return TransportResponse(response.status_code, response.content, response.headers,
+                                 response.elapsed.total_seconds(), response.reason, response)
+
+    def status_error(self, url, response):
+        import requests
+        return requests.HTTPError(f'{response.status} {response.reason} for url: {url}', response=response.original)
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class AiohttpTransport:
+    """aiohttp 传输层
+
+    所有请求共用一个 ClientSession：连接池显式限制总连接数和单主机连接数并保持
+    HTTP/1.1 长连接，信号量限制同时在途的请求数，响应体按块流式读取。
+    解析和写文件使用事件循环默认的线程池。
+    """
+
+    executor = None
+
+    def __init__(self, max_concurrency=100, limit_per_host=32, headers=None, chunk_size=64 * 1024, metrics=None):
+        _import_aiohttp()
+        _import_asyncio()
+        self.concurrency = max_concurrency
+        self.limit_per_host = limit_per_host
+        self.headers = headers
+        self.chunk_size = chunk_size
+        self.metrics = metrics
+        self.retry_errors = (asyncio.TimeoutError, aiohttp.ClientConnectionError)
+        self.session = None
+        self._semaphore = None
+
+    async def _ensure_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=30,
+                ttl_dns_cache=300
+            )
+            trace_configs = [self._trace_config()] if self.metrics is not None else None
+            self.session = aiohttp.ClientSession(connector=connector, headers=self.headers,
+                                                 trace_configs=trace_configs)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self.session
+
+    def _trace_config(self):
+        """记录域名解析和建立连接耗时的 aiohttp 跟踪配置"""
+        metrics = self.metrics
+        trace = aiohttp.TraceConfig()
+
+        async def dns_start(session, context, params):
+            context.dns_started = time.perf_counter()
+
+        async def dns_end(session, context, params):
+            metrics.span('dns', context.dns_started)
+
+        async def connect_start(session, context, params):
+            context.connect_started = time.perf_counter()
+
+        async def connect_end(session, context, params):
+            metrics.span('connect', context.connect_started)
+
+        trace.on_dns_resolvehost_start.append(dns_start)
+        trace.on_dns_resolvehost_end.append(dns_end)
+        trace.on_connection_create_start.append(connect_start)
+        trace.on_connection_create_end.append(connect_end)
+        return trace
+
+    def ensure_workers(self, count):
+        """同时在途的请求数由信号量限制，多出的章节排队等待"""
+
+    async def get(self, url, timeout, headers=None):
+        session = await self._ensure_session()
+        async with self._semaphore:
+            started = time.perf_counter()
+            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                elapsed = time.perf_counter() - started
+                body = bytearray()
+                # 出错的响应（交给重试或直接报错）不读响应体
+                if response.status < 400:
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        body.extend(chunk)
+                return TransportResponse(response.status, bytes(body), response.headers, elapsed,
+                                         response.reason, response)
+
+    def status_error(self, url, response):
+        original = response.original
+        return aiohttp.ClientResponseError(original.request_info, original.history, status=response.status,
+                                           message=response.reason, headers=response.headers)
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+
+class AsyncNovelDownloader:
+    """下载引擎：获取小说信息和目录、调度章节、抓取、解析、保存的唯一实现（均为协程）
+
+    请求经传输层发出：默认为 aiohttp（AiohttpTransport），NovelDownloader 的 requests 引擎
+    传入 RequestsTransport。同时下载的章节数为传输层的 concurrency：固定数量的工作协程
+    依次领取章节，停止后不再领取；解析和写文件放到传输层的线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, max_concurrency=100, limit_per_host=32, headers=None, chunk_size=64 * 1024,
+                 rate_limiter=None, retry_policy=None, parser=None, metrics=None, progress_interval=0.1,
+                 page_cache=None, transport=None):
+        _import_asyncio()
+        if transport is None:
+            transport = AiohttpTransport(max_concurrency, limit_per_host, headers or {
+                'User-Agent': random_user_agent(),
+                'Referer': 'https://www.qidian.com/'
+            }, chunk_size, metrics)
+        self.transport = transport
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        # 解析器，None 表示使用 page_parser.DEFAULT_PARSER（html.parser，lxml 需显式指定）
+        self.parser = parser
+        # 埋点（metrics.Metrics），记录各章 fetch/parse/clean/write 耗时和字节、重试、失败计数；
+        # None 时热路径上只多一次判断
+        self.metrics = metrics
+        # 小说页、目录页的响应缓存（内存 + 磁盘），GUI 先取信息和目录、download_novel 再取一次时
+        # 同一页面只请求、解析一次
+        self.page_cache = page_cache if page_cache is not None else ResponseCache()
         self.chapter_progress = {}
+        # 当前 download_novel 的进度汇总：进度条和 progress_callback 至多每 progress_interval 秒刷新一次
+        self.progress = None
+        self.progress_interval = progress_interval
+        # 上次边下载边导出的统计
+        self.export_stats = None
+        # 当前（或下一次）下载的停止标记
+        self.cancel_token = CancelToken()
+        # 流水线模式中抓取段与写入段之间的队列长度
+        self.queue_size = 32
 
-    def download_novel(self, url, save_path, start_chapter=None, end_chapter=None, progress_callback=None):
-        # 实现获取小说信息的逻辑
-        novel_info = self.get_novel_info(url)
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
+    async def __aenter__(self):
+        return self
 
-        # 实现获取章节列表的逻辑
-        chapter_list = self.get_chapter_list(url)
-        if start_chapter is not None:
-            chapter_list = chapter_list[start_chapter - 1:]
-        if end_chapter is not None:
-            chapter_list = chapter_list[:end_chapter - start_chapter + 1]
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
-        total_chapters = len(chapter_list)
-        # 初始化进度跟踪
-        self.chapter_progress = {chapter['title']: '等待中' for chapter in chapter_list}
-        self.completed_chapters = 0
-        self.progress_callback = progress_callback
-        
-        # 多线程下载章节并显示进度
-        max_threads = 5  # 限制最大线程数
-        threads = []
-        
-        with tqdm(total=total_chapters, desc=f"下载《{novel_info['title']}") as pbar:
-            for i, chapter in enumerate(chapter_list):
-                # 控制线程数量
-                while len(threading.enumerate()) > max_threads + 1:
-                    time.sleep(0.1)
-                
-                thread = threading.Thread(
-                    target=self._download_with_progress,
-                    args=(chapter, save_path, pbar, total_chapters)
-                )
-                threads.append(thread)
-                thread.start()
-                
-            # 等待所有线程完成
-            for thread in threads:
-                thread.join()
-
-    def _download_with_progress(self, chapter, save_path, pbar, total_chapters):
-        """带进度条的下载辅助函数"""
-        try:
-            result = self.download_chapter(chapter, save_path)
-            pbar.update(1)
-            pbar.set_postfix_str(f"当前: {chapter['title'][:10]}...")
-            
-            # 更新完成章节数和进度
-            self.completed_chapters += 1
-            progress_percent = (self.completed_chapters / total_chapters) * 100
-            
-            # 调用进度回调函数
-            if self.progress_callback:
-                self.progress_callback(progress_percent, chapter['title'])
-        except Exception as e:
-            print(f"线程错误: {str(e)}")
-            pbar.update(1)
+    async def close(self):
+        await self.transport.close()
 
-    def get_novel_info(self, url):
+    def cancel(self):
+        """停止当前下载：尚未开始的章节不再请求"""
+        self.cancel_token.cancel()
+
+    @property
+    def cancelled(self):
+        return self.cancel_token.cancelled
+
+    @property
+    def concurrency(self):
+        return self.transport.concurrency
+
+    def progress_snapshot(self):
+        """当前进度：各状态的章节数、已完成数以及各站点的限速和重试计数"""
+        snapshot = {
+            'completed': self.completed_chapters,
+            'progress': self.progress.snapshot() if self.progress is not None else None,
+            'chapters': status_counts(self.chapter_progress),
+            'hosts': self.rate_limiter.snapshot()
+        }
+        if self.metrics is not None:
+            snapshot['metrics'] = self.metrics.snapshot()
+        return snapshot
+
+    @property
+    def completed_chapters(self):
+        """当前下载已结束（含失败）的章节数"""
+        return self.progress.completed if self.progress is not None else 0
+
+    def _retry_postfix(self):
+        """进度条后缀中显示的累计重试次数，只在进度刷新时计算"""
+        retries = sum(host['retries'] for host in self.rate_limiter.snapshot().values())
+        return f"重试: {retries}"
+
+    async def _blocking(self, func, *args):
+        """在传输层的线程池中执行阻塞的函数（解析、写文件）"""
+        return await asyncio.get_running_loop().run_in_executor(self.transport.executor, functools.partial(func, *args))
+
+    @staticmethod
+    async def _wait(seconds, cancel_token):
+        """退避等待 seconds 秒，期间被停止则提前返回"""
+        deadline = time.monotonic() + seconds
+        while not cancel_token.cancelled:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, 0.1))
+
+    async def fetch_response(self, url, timeout=10, label=None, headers=None, book=None):
+        """带限速和重试的 GET 请求，返回 TransportResponse；headers 为附加的请求头
+
+        每次请求前先从所属站点的令牌桶取令牌；429/5xx、超时和连接错误按重试策略退避后重试，
+        label 为章节在 chapter_progress 中的键（progress_key）时会标记重试状态；
+        book 为章节所属的 BookDownload，重试状态记在它的 chapter_progress，停止标记也取自它。
+        条件请求命中时状态码为 304、响应体为空。
+        """
+        cancel_token = book.cancel_token if book is not None else self.cancel_token
+        chapter_progress = book.chapter_progress if book is not None else self.chapter_progress
+        attempt = 0
+        while True:
+            delay = self.rate_limiter.reserve(url)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            retry_after = None
+            try:
+                response = await self.transport.get(url, timeout, headers)
+            except self.transport.retry_errors as e:
+                self.rate_limiter.on_throttle(url)
+                error = e
+            else:
+                if response.status not in self.retry_policy.retry_status:
+                    if response.status >= 400:
+                        raise self.transport.status_error(url, response)
+                    self.rate_limiter.on_success(url)
+                    return response
+                if response.status in self.retry_policy.throttle_status:
+                    self.rate_limiter.on_throttle(url)
+                retry_after = response.headers.get('Retry-After')
+                error = self.transport.status_error(url, response)
+
+            if attempt >= self.retry_policy.max_retries or cancel_token.cancelled:
+                self.rate_limiter.record_give_up(url)
+                raise error
+            attempt += 1
+            self.rate_limiter.record_retry(url)
+            if self.metrics is not None:
+                self.metrics.inc('retries')
+            if label is not None:
+                chapter_progress[label] = f'重试中({attempt})'
+            await self._wait(self.retry_policy.backoff(attempt, retry_after), cancel_token)
+
+    async def _get_page(self, url, timeout=10, headers=None):
+        """经过响应缓存请求小说页、目录页，返回 CachedResponse
+
+        缓存未过期时不发请求；过期但带有 ETag/Last-Modified 时发送条件请求，304 时沿用缓存。
+        headers 为调用方的条件请求头（例如 CatalogCache 的），服务器确认未变时返回
+        状态码为 304、响应体为空的 CachedResponse。
+        """
+        page = self.page_cache.get(url)
+        if page is not None and page.fresh:
+            if self.metrics is not None:
+                self.metrics.inc('page_cache_hits')
+            return page
+        if page is not None and not page.validators():
+            page = None
+        request_headers = dict(headers or {})
+        if page is not None:
+            # 缓存的响应还能重新验证时，条件请求以它为准
+            request_headers.update(page.validators())
+        response = await self.fetch_response(url, timeout, headers=request_headers or None)
+        if response.status == 304:
+            if page is not None:
+                return self.page_cache.revalidated(page, response.headers)
+            return CachedResponse(url, response.status, {}, b'')
+        return self.page_cache.store(url, response.status, response.headers, response.content)
+
+    def _body(self, response):
+        """交给解析器的参数：原始字节、声明的编码和解析器，省去按内容探测编码"""
+        return response.content, charset_from_content_type(response.headers.get('Content-Type')), self.parser
+
+    async def get_novel_info(self, url):
         """获取小说信息，支持起点中文网和晋江文学城"""
+        if site_of(url) is None:
+            print(f"不支持的网站: {url}")
+            return None
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 起点中文网解析
-            if 'qidian.com' in url:
-                title = soup.find('h1', class_='book-title').text.strip()
-                author = soup.find('a', class_='writer').text.strip()
-            # 晋江文学城解析
-            elif 'jjwxc.net' in url:
-                title = soup.find('span', property='v:itemreviewed').text.strip()
-                author = soup.find('span', class_='authorname').text.strip()
-            else:
-                print(f"不支持的网站: {url}")
-                return None
-            
-            return {
-                'title': title,
-                'author': author,
-                'url': url
-            }
+            page = await self._get_page(url, timeout=10)
+            # 解析和写磁盘缓存都放到线程池，不阻塞事件循环上的其他下载
+            return dict(await self._blocking(parse_page, self.page_cache, page, ('info', url, self.parser),
+                                             lambda: parse_novel_info(url, *self._body(page))))
         except Exception as e:
             print(f"获取小说信息失败: {str(e)}")
             return None
 
-    def get_chapter_list(self, url):
-        """获取章节列表，支持起点中文网和晋江文学城"""
-        chapter_list = []
+    async def get_chapter_list(self, url, cache=None):
+        """获取章节列表，支持起点中文网和晋江文学城
+
+        给出 CatalogCache 时发送条件请求：目录未变（304）直接返回缓存的列表，否则解析后记入缓存。
+        """
+        chapters_url = catalog_url(url)
+        if chapters_url is None:
+            print(f"不支持的网站: {url}")
+            return []
         try:
-            # 起点中文网解析
-            if 'qidian.com' in url:
-                novel_id = url.split('/')[-1]
-                chapters_url = f"https://book.qidian.com/info/{novel_id}#Catalog"
-                response = self.session.get(chapters_url, timeout=10)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # 解析章节列表
-                volume_list = soup.find_all('div', class_='volume')
-                for volume in volume_list:
-                    chapters = volume.find_all('a', class_='chapter-name')
-                    for chapter in chapters:
-                        chapter_title = chapter.text.strip()
-                        chapter_url = 'https:' + chapter['href']
-                        chapter_list.append({
-                            'title': chapter_title,
-                            'url': chapter_url
-                        })
-            # 晋江文学城解析
-            elif 'jjwxc.net' in url:
-                novel_id = url.split('/')[-1].split('.')[0]
-                chapters_url = f"https://www.jjwxc.net/onebook.php?novelid={novel_id}"
-                response = self.session.get(chapters_url, timeout=10)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # 解析章节列表
-                chapter_table = soup.find('table', class_='cytable')
-                if chapter_table:
-                    chapters = chapter_table.find_all('tr')[1:]
-                    for chapter in chapters:
-                        a_tag = chapter.find('a')
-                        if a_tag:
-                            chapter_title = a_tag.text.strip()
-                            chapter_url = f"https://www.jjwxc.net/{a_tag['href']}"
-                            chapter_list.append({
-                                'title': chapter_title,
-                                'url': chapter_url
-                            })
-            else:
-                print(f"不支持的网站: {url}")
-                return []
-            
+            headers = cache.validators() if cache is not None else None
+            page = await self._get_page(chapters_url, timeout=10, headers=headers)
+            if page.status_code == 304:
+                return cache.chapters
+            # ChapterList 不可修改，缓存的解析结果可以直接交给调用方
+            chapter_list = await self._blocking(parse_page, self.page_cache, page, ('catalog', url, self.parser),
+                                                lambda: parse_chapter_list(url, *self._body(page)))
+            if cache is not None:
+                cache.update(chapter_list, page.headers.get('ETag'), page.headers.get('Last-Modified'))
             return chapter_list
         except Exception as e:
             print(f"获取章节列表失败: {str(e)}")
             return []
 
-    def download_chapter(self, chapter, save_path):
-        """下载章节内容并支持断点续传"""
-        chapter_url = chapter['url']
-        chapter_title = chapter['title'].replace('?', '').replace(':', '：')
-        file_path = os.path.join(save_path, f'{chapter_title}.txt')
-        
-        # 断点续传检查：如果文件已存在则跳过
-        if os.path.exists(file_path):
-            self.chapter_progress[chapter_title] = '已完成'
+    async def download_novel(self, url, save_path, start_chapter=None, end_chapter=None, progress_callback=None,
+                             storage='files', incremental=False, export=None, pipeline=False, extract_workers=None,
+                             concurrency=None, cancel_token=None):
+        """下载小说，返回与章节列表顺序一致的结果列表
+
+        结果为 True 表示该章已保存（含清单中早已完成的章节），下载失败或被停止而没有执行的章节为 False；
+        获取小说信息失败时直接返回 False。
+        concurrency 为同时下载的章节数，默认为传输层的 concurrency。
+        流水线模式（pipeline=True）中正文提取在 extract_workers 个进程中进行。
+        storage='packed' 时所有章节写入 save_path 下的单文件仓库（PackedChapterStore），
+        storage='dedup' 时只在 save_path 中记录正文哈希，正文存入同级目录共享的内容寻址仓库，相同正文只存一份。
+        正文哈希与清单中已保存的相同（站点标记为更新但内容未变）的章节不再重写。
+        incremental=True 为增量更新：用 save_path 中缓存的目录发送条件请求（ETag/If-Modified-Since），
+        目录未变时不再下载和解析目录页，只下载新增或改动的章节。
+        export 为导出文件路径时边下载边按目录顺序导出合并的 TXT（扩展名为 .epub 时导出 EPUB），
+        导出统计记在 export_stats。cancel_token 为调用方预先创建的 CancelToken。
+        """
+        self.cancel_token = cancel_token = cancel_token or CancelToken()
+        concurrency = concurrency or self.concurrency
+        self.transport.ensure_workers(concurrency)
+        cache = CatalogCache(save_path) if incremental else None
+        if cache is not None and cache.title:
+            # 增量更新不再请求小说页，书名取自目录缓存
+            novel_info = {'title': cache.title, 'url': url}
+        else:
+            novel_info = await self.get_novel_info(url)
+            if novel_info is None:
+                return False
+        if not os.path.exists(save_path):
+            os.makedirs(save_path)
+
+        chapter_list = select_chapters(await self.get_chapter_list(url, cache), start_chapter, end_chapter)
+
+        # 打开存储和下载清单，清单中已完成且目录中未改动的章节不再请求
+        store = open_store(save_path, storage)
+        manifest, chapter_list = load_manifest(chapter_list, save_path, store)
+        total_chapters = len(chapter_list)
+        self.chapter_progress = ChapterProgress.for_chapters(chapter_list, '已完成')
+        positions = pending_chapters(chapter_list, manifest, cache.changed_indices() if cache else ())
+        results = [True] * total_chapters
+        for position in positions:
+            self.chapter_progress[chapter_list[position]['index']] = '等待中'
+            results[position] = False
+        completed = total_chapters - len(positions)
+        book = BookDownload(save_path, store, manifest, self.chapter_progress, cancel_token=cancel_token)
+        self.export_stats = None
+        finished = False
+
+        try:
+            book.exporter = open_exporter(export, novel_info, chapter_list, positions, save_path, store)
+            from tqdm import tqdm
+            with tqdm(total=total_chapters, initial=completed, desc=f"下载《{novel_info['title']}") as pbar:
+                self.progress = ProgressAggregator(total_chapters, progress_callback, pbar, completed,
+                                                   min_interval=self.progress_interval, postfix=self._retry_postfix)
+                try:
+                    run = self._run_pipeline if pipeline else self._run_chapters
+                    await run(chapter_list, positions, book, results, concurrency, extract_workers)
+                finally:
+                    self.progress.close()
+            finished = not cancel_token.cancelled
+        finally:
+            self.export_stats = close_exporter(book.exporter, finished)
+            manifest.close()
+            if store is not None:
+                store.close()
+        # 被停止时不更新目录缓存，下次仍按本次的目录变化补齐
+        if cache is not None and not cancel_token.cancelled:
+            cache.title = novel_info['title']
+            cache.save()
+        return results
+
+    @staticmethod
+    async def _run_workers(positions, handle, concurrency, cancel_token):
+        """有界的章节调度：concurrency 个工作协程依次领取章节交给 handle，停止后不再领取"""
+        todo = iter(positions)
+
+        async def worker():
+            for position in todo:
+                if cancel_token.cancelled:
+                    return
+                await handle(position)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(positions))))))
+
+    async def _run_chapters(self, chapter_list, positions, book, results, concurrency, extract_workers=None):
+        """逐章抓取、解析并保存"""
+        async def handle(position):
+            chapter = chapter_list[position]
+            try:
+                result = await self.fetch_and_save(chapter, book)
+            except Exception as e:
+                print(f"下载章节出错 {chapter['title']}: {str(e)}")
+                result = False
+            results[position] = result
+            self.progress.advance(chapter['title'], failed=not result)
+
+        await self._run_workers(positions, handle, concurrency, book.cancel_token)
+
+    async def _run_pipeline(self, chapter_list, positions, book, results, concurrency, extract_workers=None):
+        """流水线模式：抓取、解析、写入分为三段
+
+        抓取段只下载原始字节；正文提取和清理交给 ProcessPoolExecutor 在多个进程中并行执行，
+        不再和网络 I/O 争抢 GIL；单独的写入段按抓取完成的顺序落盘。段间队列有界，
+        超长的书内存占用也保持平稳。
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        loop = asyncio.get_running_loop()
+        extract = self._extract
+        # 解析进程（forkserver/spawn）会重新导入 page_parser，看不到本进程中 set_default_parser 的设置，
+        # 因此在这里确定实际使用的解析器，随参数一起传过去
+        parser = resolve_parser(self.parser)
+        pending = asyncio.Queue(maxsize=self.queue_size)
+
+        async def writer():
+            while True:
+                item = await pending.get()
+                if item is None:
+                    return
+                position, chapter, extraction = item
+                result = False
+                if extraction is not None:
+                    try:
+                        chapter_content = self._extracted(chapter, await extraction)
+                    except Exception as e:
+                        print(f"解析章节失败 {chapter['title']}: {str(e)}")
+                        chapter_content = None
+                    result = await self._save_chapter(chapter, chapter_content, book)
+                results[position] = result
+                self.progress.advance(chapter['title'], failed=not result)
+
+        with ProcessPoolExecutor(max_workers=extract_workers, mp_context=process_context()) as extract_pool:
+            async def fetch_stage(position):
+                chapter = chapter_list[position]
+                payload = await self._fetch_chapter(chapter, book)
+                extraction = None
+                if payload is not None:
+                    extraction = loop.run_in_executor(extract_pool, extract, *payload[:-1], parser)
+                # 写入段跟不上时在这里等待，抓取随之放慢
+                await pending.put((position, chapter, extraction))
+
+            writer_task = asyncio.ensure_future(writer())
+            try:
+                await self._run_workers(positions, fetch_stage, concurrency, book.cancel_token)
+            finally:
+                await pending.put(None)
+                await writer_task
+
+    async def download_chapter(self, chapter, save_path, store=None):
+        """下载章节内容并支持断点续传，store 为 PackedChapterStore 时写入单文件仓库"""
+        book = BookDownload(save_path, store, chapter_progress=self.chapter_progress, cancel_token=self.cancel_token)
+        if chapter_saved(chapter, save_path, store):
+            book.chapter_progress[progress_key(chapter)] = '已完成'
             return True
-        
+        return await self.fetch_and_save(chapter, book)
+
+    async def fetch_and_save(self, chapter, book):
+        """下载、解析并保存一章，状态记在 book（BookDownload），返回是否成功
+
+        不做存在性检查（download_novel 已按清单筛掉完成的章节）；失败时在 book 的
+        chapter_progress、下载清单和导出器中标记失败。
+        """
+        payload = await self._fetch_chapter(chapter, book)
+        if payload is None:
+            return False
+        try:
+            chapter_content = self._extracted(chapter, await self._blocking(self._extract, *payload))
+        except Exception as e:
+            print(f"下载章节失败 {chapter_file_title(chapter)}: {str(e)}")
+            self._mark_failed(chapter, book)
+            return False
+        return await self._save_chapter(chapter, chapter_content, book)
+
+    @property
+    def _extract(self):
+        """正文提取函数；开启埋点时换成同时返回建树和清理耗时的版本（流水线模式在解析进程中计时）"""
+        return parse_chapter_content if self.metrics is None else parse_chapter_content_timed
+
+    def _extracted(self, chapter, result):
+        """取出 _extract 的正文；开启埋点时结果为 (正文, parse 秒数, clean 秒数)，顺带记录耗时"""
+        if self.metrics is None or result is None:
+            return result
+        chapter_content, parse_seconds, clean_seconds = result
+        self.metrics.observe('parse', parse_seconds, chapter)
+        self.metrics.observe('clean', clean_seconds, chapter)
+        return chapter_content
+
+    async def _fetch_chapter(self, chapter, book):
+        """请求章节页，返回 parse_chapter_content 的参数元组，失败时返回 None"""
+        chapter_url = chapter['url']
+        chapter_title = chapter_file_title(chapter)
+        if site_of(chapter_url) is None:
+            print(f"不支持的网站章节: {chapter_url}")
+            return None
+        metrics = self.metrics
+        try:
+            started = time.perf_counter() if metrics is not None else None
+            response = await self.fetch_response(chapter_url, timeout=15, label=progress_key(chapter), book=book)
+            if metrics is not None:
+                metrics.span('fetch', started, chapter)
+                if response.elapsed is not None:
+                    metrics.observe('ttfb', response.elapsed, chapter)
+                metrics.inc('bytes_downloaded', len(response.content))
+            return (chapter_url,) + self._body(response)
+        except Exception as e:
+            print(f"下载章节失败 {chapter_title}: {str(e)}")
+            self._mark_failed(chapter, book)
+            return None
+
+    async def _save_chapter(self, chapter, chapter_content, book):
+        """保存提取出的正文；chapter_content 为 None 表示解析失败"""
+        chapter_title = chapter_file_title(chapter)
+        if chapter_content is None:
+            print(f"无法解析章节内容: {chapter_title}")
+            self._mark_failed(chapter, book)
+            return False
+        metrics = self.metrics
         try:
-            response = self.session.get(chapter_url, timeout=15)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 解析章节内容
-            if 'qidian.com' in chapter_url:
-                content_div = soup.find('div', class_='read-content j_readContent')
-                if not content_div:
-                    print(f"无法解析章节内容: {chapter_title}")
-                    return False
-                
-                # 提取并清理文本内容
-                p_tags = content_div.find_all('p')
-                chapter_content = '\n'.join([p.text.strip() for p in p_tags if p.text.strip()])
-            elif 'jjwxc.net' in chapter_url:
-                content_div = soup.find('div', id='content')
-                if not content_div:
-                    print(f"无法解析章节内容: {chapter_title}")
-                    return False
-                
-                # 提取并清理文本内容
-                chapter_content = content_div.text.strip()
-                # 移除晋江特有的广告和导航文本
-                chapter_content = chapter_content.replace('晋江文学城', '').replace('www.jjwxc.net', '').strip()
-                # 处理换行
-                chapter_content = '\n'.join([line.strip() for line in chapter_content.splitlines() if line.strip()])
+            if chapter_unchanged(chapter, chapter_content, book.manifest):
+                if metrics is not None:
+                    metrics.inc('chapters_unchanged')
             else:
-                print(f"不支持的网站章节: {chapter_url}")
-                return False
-            
-            # 保存章节内容
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(chapter_content)
-            
-            self.chapter_progress[chapter_title] = '已完成'
+                started = time.perf_counter() if metrics is not None else None
+                await self._blocking(write_chapter, chapter, book.save_path, chapter_content, book.store)
+                if metrics is not None:
+                    metrics.span('write', started, chapter)
+                    metrics.inc('bytes_written', len(chapter_content.encode('utf-8')))
+            if metrics is not None:
+                metrics.inc('chapters_done')
+            book.chapter_progress[progress_key(chapter)] = '已完成'
+            if book.manifest is not None:
+                book.manifest.mark_done(chapter, chapter_content)
+            if book.exporter is not None:
+                await self._blocking(book.exporter.chapter_done, chapter, chapter_content)
             return True
         except Exception as e:
             print(f"下载章节失败 {chapter_title}: {str(e)}")
-            # 保存未完成标记以便后续重试
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            self.chapter_progress[chapter_title] = '失败'
+            self._mark_failed(chapter, book)
             return False
 
+    def _mark_failed(self, chapter, book):
+        book.chapter_progress[progress_key(chapter)] = '失败'
+        if book.manifest is not None:
+            book.manifest.mark_failed(chapter)
+        if book.exporter is not None:
+            book.exporter.chapter_failed(chapter)
+        if self.metrics is not None:
+            self.metrics.inc('chapters_failed')
+
+
+class NovelDownloader:
+    """下载器的同步接口：各方法在后台事件循环中执行 AsyncNovelDownloader 的同名协程并等待结果
 
-class NovelDownloaderGUI:
-    def __init__(self, root):
-        self.root = root
-        self.root.title('小说下载器')
-        self.root.geometry('800x600')
-        self.root.resizable(True, True)
-        
-        # 创建下载器实例
-        self.downloader = NovelDownloader()
-        self.downloader.chapter_progress = {}
-        
-        # 创建消息队列用于线程间通信
-        self.queue = queue.Queue()
-        
-        # 创建UI
-        self._create_widgets()
-        
-        # 启动消息处理循环
-        self._process_queue()
-    
-    def _create_widgets(self):
-        # 创建主框架
-        main_frame = ttk.Frame(self.root, padding='10')
-        main_frame.pack(fill=tk.BOTH, expand=True)
-        
-        # URL输入区域
-        url_frame = ttk.LabelFrame(main_frame, text='小说信息', padding='10')
-        url_frame.pack(fill=tk.X, pady=5)
-        
-        ttk.Label(url_frame, text='小说URL:').grid(row=0, column=0, sticky=tk.W, pady=5)
-        self.url_entry = ttk.Entry(url_frame, width=70)
-        self.url_entry.grid(row=0, column=1, sticky=tk.EW, padx=5, pady=5)
-        url_frame.columnconfigure(1, weight=1)
-        
-        # 下载选项区域
-        options_frame = ttk.LabelFrame(main_frame, text='下载选项', padding='10')
-        options_frame.pack(fill=tk.X, pady=5)
-        
-        # 章节范围选择
-        ttk.Label(options_frame, text='章节范围:').grid(row=0, column=0, sticky=tk.W, pady=5)
-        
-        self.chapter_var = tk.StringVar(value='all')
-        all_radio = ttk.Radiobutton(options_frame, text='全部章节', variable=self.chapter_var, value='all', command=self._toggle_chapter_input)
-        all_radio.grid(row=0, column=1, sticky=tk.W, padx=5)
-        
-        range_radio = ttk.Radiobutton(options_frame, text='指定范围', variable=self.chapter_var, value='range', command=self._toggle_chapter_input)
-        range_radio.grid(row=0, column=2, sticky=tk.W)
-        
-        ttk.Label(options_frame, text='从:').grid(row=0, column=3, sticky=tk.W)
-        self.start_chapter = ttk.Entry(options_frame, width=5, state=tk.DISABLED)
-        self.start_chapter.grid(row=0, column=4, sticky=tk.W)
-        
-        ttk.Label(options_frame, text='到:').grid(row=0, column=5, sticky=tk.W)
-        self.end_chapter = ttk.Entry(options_frame, width=5, state=tk.DISABLED)
-        self.end_chapter.grid(row=0, column=6, sticky=tk.W)
-        
-        # 保存路径选择
-        ttk.Label(options_frame, text='保存路径:').grid(row=1, column=0, sticky=tk.W, pady=5)
-        self.path_entry = ttk.Entry(options_frame, width=50)
-        self.path_entry.grid(row=1, column=1, columnspan=4, sticky=tk.EW, padx=5, pady=5)
-        self.path_entry.insert(0, os.path.join(os.getcwd(), 'novels'))
-        
-        browse_btn = ttk.Button(options_frame, text='浏览', command=self._browse_path)
-        browse_btn.grid(row=1, column=5, sticky=tk.W)
-        
-        options_frame.columnconfigure(1, weight=1)
-        
-        # 控制按钮区域
-        btn_frame = ttk.Frame(main_frame)
-        btn_frame.pack(fill=tk.X, pady=10)
-        
-        self.start_btn = ttk.Button(btn_frame, text='开始下载', command=self._start_download)
-        self.start_btn.pack(side=tk.LEFT, padx=5)
-        
-        self.stop_btn = ttk.Button(btn_frame, text='停止下载', command=self._stop_download, state=tk.DISABLED)
-        self.stop_btn.pack(side=tk.LEFT, padx=5)
-        
-        # 进度显示区域
-        progress_frame = ttk.LabelFrame(main_frame, text='下载进度', padding='10')
-        progress_frame.pack(fill=tk.BOTH, expand=True, pady=5)
-        
-        self.progress_var = tk.DoubleVar()
-        self.progress_bar = ttk.Progressbar(progress_frame, variable=self.progress_var, length=100, mode='determinate')
-        self.progress_bar.pack(fill=tk.X, pady=5)
-        
-        self.status_label = ttk.Label(progress_frame, text='就绪', anchor=tk.W)
-        self.status_label.pack(fill=tk.X, pady=5)
-        
-        # 日志区域
-        log_frame = ttk.LabelFrame(main_frame, text='下载日志', padding='10')
-        log_frame.pack(fill=tk.BOTH, expand=True, pady=5)
-        
-        # 创建滚动条
-        scrollbar = ttk.Scrollbar(log_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        self.log_text = tk.Text(log_frame, wrap=tk.WORD, yscrollcommand=scrollbar.set, height=10)
-        self.log_text.pack(fill=tk.BOTH, expand=True)
-        scrollbar.config(command=self.log_text.yview)
-        
-        # 重定向stdout到文本框
-        sys.stdout = TextRedirector(self.log_text, 'stdout')
-        sys.stderr = TextRedirector(self.log_text, 'stderr')
-    
-    def _toggle_chapter_input(self):
-        if self.chapter_var.get() == 'range':
-            self.start_chapter.config(state=tk.NORMAL)
-            self.end_chapter.config(state=tk.NORMAL)
+    engine='requests'（默认）时请求经 self.session（requests.Session，可挂载自定义适配器）
+    在 max_workers 个线程中发出；engine='async' 时改用 aiohttp，最多 max_concurrency 个请求
+    同时在途、单个站点最多 limit_per_host 个连接。事件循环线程在第一次调用时才启动。
+    """
+
+    def __init__(self, max_workers=5, engine='requests', max_concurrency=100, limit_per_host=32,
+                 rate_limiter=None, retry_policy=None, parser=None, metrics=None, progress_interval=0.1,
+                 page_cache=None):
+        import requests
+        self.session = requests.Session()
+        self.session.headers = {
+            'User-Agent': random_user_agent(),
+            'Referer': 'https://www.qidian.com/'
+        }
+        self.max_workers = max_workers
+        if engine == 'requests':
+            transport = RequestsTransport(self.session, max_workers)
+        elif engine == 'async':
+            transport = AiohttpTransport(max_concurrency, limit_per_host, headers=dict(self.session.headers),
+                                         metrics=metrics)
         else:
-            self.start_chapter.config(state=tk.DISABLED)
-            self.end_chapter.config(state=tk.DISABLED)
-    
-    def _browse_path(self):
-        path = filedialog.askdirectory()
-        if path:
-            self.path_entry.delete(0, tk.END)
-            self.path_entry.insert(0, path)
-    
-    def _start_download(self):
-        url = self.url_entry.get().strip()
-        save_path = self.path_entry.get().strip()
-        
-        if not url:
-            messagebox.showerror('错误', '请输入小说URL')
-            return
-        
-        if not save_path:
-            messagebox.showerror('错误', '请选择保存路径')
-            return
-        
-        start_chapter = None
-        end_chapter = None
-        
-        if self.chapter_var.get() == 'range':
-            try:
-                start_chapter = int(self.start_chapter.get()) if self.start_chapter.get() else None
-                end_chapter = int(self.end_chapter.get()) if self.end_chapter.get() else None
-                
-                if start_chapter and end_chapter and start_chapter > end_chapter:
-                    messagebox.showerror('错误', '起始章节不能大于结束章节')
-                    return
-            except ValueError:
-                messagebox.showerror('错误', '章节号必须为数字')
-                return
-        
-        # 禁用开始按钮，启用停止按钮
-        self.start_btn.config(state=tk.DISABLED)
-        self.stop_btn.config(state=tk.NORMAL)
-        
-        # 在新线程中开始下载
-        self.download_thread = threading.Thread(
-            target=self._download_novel_thread,
-            args=(url, save_path, start_chapter, end_chapter),
-            daemon=True
+            raise ValueError(f'未知的下载引擎: {engine}')
+        self.engine = engine
+        self._async_engine = AsyncNovelDownloader(
+            rate_limiter=rate_limiter, retry_policy=retry_policy, parser=parser, metrics=metrics,
+            progress_interval=progress_interval, page_cache=page_cache, transport=transport
         )
-        self.download_thread.start()
-    
-    def _download_novel_thread(self, url, save_path, start_chapter, end_chapter):
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def run_coroutine(self, coro):
+        """在后台事件循环中执行协程并等待结果
+
+        批量下载把整个调度协程交给这里，在同一个事件循环中直接等待 async_downloader 的各个协程。
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='novel-download-loop', daemon=True).start()
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
         try:
-            # 获取小说信息
-            novel_info = self.downloader.get_novel_info(url)
-            if not novel_info:
-                self.queue.put(('error', '获取小说信息失败'))
-                return
-            
-            # 获取章节列表
-            chapter_list = self.downloader.get_chapter_list(url)
-            if not chapter_list:
-                self.queue.put(('error', '获取章节列表失败'))
-                return
-            
-            total_chapters = len(chapter_list)
-            self.queue.put(('total', total_chapters))
-            self.queue.put(('status', f'开始下载《{novel_info["title"]}》，共{total_chapters}章'))
-            
-            # 定义进度回调函数
-            def progress_callback(percent, chapter_title):
-                self.queue.put(('progress', percent))
-                self.queue.put(('status', f'正在下载: {chapter_title} ({percent:.1f}%)'))
-            
-            # 执行下载并传入进度回调
-            self.downloader.download_novel(url, save_path, start_chapter, end_chapter, progress_callback)
-            self.queue.put(('complete', '下载完成'))
-        except Exception as e:
-            self.queue.put(('error', f'下载出错: {str(e)}'))
-        finally:
-            # 恢复按钮状态
-            self.queue.put(('enable_buttons', None))
-    
-    def _stop_download(self):
-        # 这里可以实现停止下载的逻辑
-        self.queue.put(('status', '正在停止下载...'))
-        self.stop_btn.config(state=tk.DISABLED)
-    
-    def _process_queue(self):
-        while not self.queue.empty():
-            message_type, data = self.queue.get()
-            
-            if message_type == 'status':
-                self.status_label.config(text=data)
-                self.log_text.insert(tk.END, data + '\n')
-                self.log_text.see(tk.END)
-            elif message_type == 'progress':
-                self.progress_var.set(data)
-            elif message_type == 'total':
-                self.progress_bar['maximum'] = data
-            elif message_type == 'complete':
-                self.status_label.config(text=data)
-                self.log_text.insert(tk.END, data + '\n')
-                self.log_text.see(tk.END)
-                messagebox.showinfo('完成', data)
-                self.start_btn.config(state=tk.NORMAL)
-                self.stop_btn.config(state=tk.DISABLED)
-            elif message_type == 'error':
-                self.status_label.config(text=data)
-                self.log_text.insert(tk.END, data + '\n')
-                self.log_text.see(tk.END)
-                messagebox.showerror('错误', data)
-                self.start_btn.config(state=tk.NORMAL)
-                self.stop_btn.config(state=tk.DISABLED)
-            elif message_type == 'enable_buttons':
-                self.start_btn.config(state=tk.NORMAL)
-                self.stop_btn.config(state=tk.DISABLED)
-        
-        self.root.after(100, self._process_queue)
-
-
-class TextRedirector:
-    def __init__(self, widget, tag='stdout'):
-        self.widget = widget
-        self.tag = tag
-
-    def write(self, str):
-        self.widget.configure(state=tk.NORMAL)
-        self.widget.insert(tk.END, str)
-        self.widget.configure(state=tk.DISABLED)
-        self.widget.see(tk.END)
-
-    def flush(self):
-        pass
+            return future.result()
+        except BaseException:
+            # 例如命令行中按下 Ctrl+C：连同后台的协程一起取消
+            future.cancel()
+            raise
+
+    def close(self):
+        """释放连接池并停止后台事件循环"""
+        if self._loop is not None:
+            self.run_coroutine(self._async_engine.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+        self.session.close()
+
+    @property
+    def async_downloader(self):
+        """实际执行下载的 AsyncNovelDownloader，其协程须在 run_coroutine 的事件循环中执行"""
+        return self._async_engine
+
+    @property
+    def rate_limiter(self):
+        return self._async_engine.rate_limiter
+
+    @property
+    def retry_policy(self):
+        return self._async_engine.retry_policy
+
+    @property
+    def parser(self):
+        return self._async_engine.parser
+
+    @property
+    def metrics(self):
+        return self._async_engine.metrics
+
+    @property
+    def page_cache(self):
+        return self._async_engine.page_cache
+
+    @property
+    def chapter_progress(self):
+        return self._async_engine.chapter_progress
+
+    @chapter_progress.setter
+    def chapter_progress(self, chapter_progress):
+        self._async_engine.chapter_progress = chapter_progress
+
+    @property
+    def progress(self):
+        return self._async_engine.progress
+
+    @property
+    def export_stats(self):
+        return self._async_engine.export_stats
+
+    @property
+    def completed_chapters(self):
+        return self._async_engine.completed_chapters
+
+    def cancel(self):
+        """停止当前下载：排队中的章节不再执行"""
+        self._async_engine.cancel()
+
+    @property
+    def cancelled(self):
+        return self._async_engine.cancelled
+
+    def progress_snapshot(self):
+        """当前进度：各状态的章节数、已完成数以及各站点的限速和重试计数"""
+        return self._async_engine.progress_snapshot()
+
+    def get_novel_info(self, url):
+        """获取小说信息，支持起点中文网和晋江文学城"""
+        return self.run_coroutine(self._async_engine.get_novel_info(url))
+
+    def get_chapter_list(self, url, cache=None):
+        """获取章节列表，支持起点中文网和晋江文学城；给出 CatalogCache 时发送条件请求"""
+        return self.run_coroutine(self._async_engine.get_chapter_list(url, cache))
+
+    def download_chapter(self, chapter, save_path, store=None):
+        """下载章节内容并支持断点续传，store 为 PackedChapterStore 时写入单文件仓库"""
+        return self.run_coroutine(self._async_engine.download_chapter(chapter, save_path, store))
+
+    def download_novel(self, url, save_path, start_chapter=None, end_chapter=None, progress_callback=None,
+                       max_workers=None, pipeline=False, extract_workers=None, storage='files', incremental=False,
+                       export=None, cancel_token=None):
+        """下载小说，返回与章节列表顺序一致的结果列表，参数见 AsyncNovelDownloader.download_novel
+
+        max_workers 为同时下载的章节数，默认为创建下载器时的设置。
+        """
+        return self.run_coroutine(self._async_engine.download_novel(
+            url, save_path, start_chapter, end_chapter, progress_callback, storage=storage, incremental=incremental,
+            export=export, pipeline=pipeline, extract_workers=extract_workers, concurrency=max_workers,
+            cancel_token=cancel_token
+        ))
+
+
+def main(argv=None):
+    """命令行入口：给出小说地址时无界面下载，否则启动图形界面"""
+    parser = argparse.ArgumentParser(description='下载小说，不带参数时启动图形界面')
+    parser.add_argument('url', nargs='?', help='小说页地址')
+    parser.add_argument('-o', '--output', help='保存目录，默认 novels/<小说编号>')
+    parser.add_argument('--start', type=int, help='起始章节（从 1 开始）')
+    parser.add_argument('--end', type=int, help='结束章节')
+    parser.add_argument('--workers', type=int, default=5, help='同时下载的章节数')
+    parser.add_argument('--engine', choices=('requests', 'async'), default='requests', help='下载引擎')
+    parser.add_argument('--storage', choices=('files', 'packed', 'dedup'), default='files', help='章节存储方式')
+    parser.add_argument('--incremental', action='store_true', help='增量更新，只下载新增或改动的章节')
+    parser.add_argument('--export', help='边下载边导出合并的 TXT（扩展名为 .epub 时导出 EPUB）')
+    args = parser.parse_args(argv)
+
+    if args.url is None:
+        from downloader_gui import main as gui_main
+        gui_main()
+        return 0
+    if site_of(args.url) is None:
+        parser.error(f'不支持的网站: {args.url}')
+
+    save_path = args.output or os.path.join('novels', novel_id(args.url))
+    downloader = NovelDownloader(max_workers=args.workers, engine=args.engine)
+    try:
+        results = downloader.download_novel(args.url, save_path, args.start, args.end, storage=args.storage,
+                                            incremental=args.incremental, export=args.export)
+    except KeyboardInterrupt:
+        print('下载已中断')
+        return 130
+    finally:
+        downloader.close()
+    if results is False:
+        print('获取小说信息失败')
+        return 1
+    if not results:
+        print('没有获取到章节列表')
+        return 1
+    failed = status_counts(downloader.chapter_progress).get('失败', 0)
+    if failed:
+        print(f'{failed} 章下载失败，重新运行即可续传')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
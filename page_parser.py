@@ -0,0 +1,179 @@
+import re
+import time
+from chapter_list import ChapterList
+
+# 默认用 html.parser：站点的章节页常有未闭合的 <p> 等不规范标签，lxml 修补文档树的方式不同，
+# 提取出的正文会和 html.parser 不一致（例如丢掉嵌套在 <p> 里的块级元素之后的文字）。
+# lxml 更快，但只能在确认目标页面的提取结果不变后用 set_default_parser 或 parser 参数显式启用。
+DEFAULT_PARSER = 'html.parser'
+
+
+def _has_class(name):
+    """SoupStrainer 用的 class 匹配：不同解析器传入的可能是整串 class 或拆分后的列表"""
+    def match(value):
+        if not value:
+            return False
+        if isinstance(value, str):
+            value = value.split()
+        return name in value
+    return match
+
+
+_STRAINERS = None
+
+
+def _strainer(name):
+    """按名称取页面过滤条件，第一次解析时才导入 bs4 并创建
+
+    每种页面只解析真正要读取的节点，其余标签在建树时直接丢弃。
+    过滤条件只比后面的 find 更宽松，保证提取结果与解析整页时一致。
+    """
+    global _STRAINERS
+    if _STRAINERS is None:
+        from bs4 import SoupStrainer
+        _STRAINERS = {
+            'qidian_info': SoupStrainer(['h1', 'a']),
+            'jjwxc_info': SoupStrainer('span'),
+            'qidian_catalog': SoupStrainer('div', class_=_has_class('volume')),
+            'jjwxc_catalog': SoupStrainer('table', class_=_has_class('cytable')),
+            'qidian_content': SoupStrainer('div', class_=_has_class('j_readContent')),
+            'jjwxc_content': SoupStrainer('div', id='content')
+        }
+    return _STRAINERS[name]
+
+_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+# GB2312/GBK 页面里常混有超出其字符集的字，按超集 GB18030 解码
+_GB_SUPERSET = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'x-gbk': 'gb18030'}
+
+
+def set_default_parser(name):
+    """切换 BeautifulSoup 使用的解析器，如 'lxml'、'html.parser'（默认）"""
+    global DEFAULT_PARSER
+    DEFAULT_PARSER = name
+
+
+def resolve_parser(parser=None):
+    """实际使用的解析器名称：parser 为 None 时取当前的 DEFAULT_PARSER"""
+    return parser or DEFAULT_PARSER
+
+
+def site_of(url):
+    """根据URL判断所属站点，返回 'qidian'、'jjwxc'，不支持时返回 None"""
+    if 'qidian.com' in url:
+        return 'qidian'
+    if 'jjwxc.net' in url:
+        return 'jjwxc'
+    return None
+
+
+def charset_from_content_type(content_type):
+    """取 Content-Type 中显式声明的编码；未声明时返回 None，交给解析器读取 <meta charset>"""
+    if not content_type:
+        return None
+    match = _CHARSET_RE.search(content_type)
+    if not match:
+        return None
+    charset = match.group(1).lower()
+    return _GB_SUPERSET.get(charset, charset)
+
+
+def make_soup(markup, parse_only=None, encoding=None, parser=None):
+    """构建文档树：markup 可以是响应的原始字节（encoding 为声明的编码）或已解码的字符串"""
+    from bs4 import BeautifulSoup
+    parser = resolve_parser(parser)
+    if isinstance(markup, bytes):
+        return BeautifulSoup(markup, parser, parse_only=parse_only, from_encoding=encoding)
+    return BeautifulSoup(markup, parser, parse_only=parse_only)
+
+
+def parse_novel_info(url, html, encoding=None, parser=None):
+    """从小说页HTML中解析标题和作者"""
+    # 起点中文网解析
+    if site_of(url) == 'qidian':
+        soup = make_soup(html, _strainer('qidian_info'), encoding, parser)
+        title = soup.find('h1', class_='book-title').text.strip()
+        author = soup.find('a', class_='writer').text.strip()
+    # 晋江文学城解析
+    else:
+        soup = make_soup(html, _strainer('jjwxc_info'), encoding, parser)
+        title = soup.find('span', property='v:itemreviewed').text.strip()
+        author = soup.find('span', class_='authorname').text.strip()
+
+    return {
+        'title': title,
+        'author': author,
+        'url': url
+    }
+
+
+def parse_chapter_list(url, html, encoding=None, parser=None):
+    """从目录页HTML中解析章节列表，返回按列存储的 ChapterList（用法同 [{'title', 'url'}, ...]）"""
+    chapter_list = []
+
+    # 起点中文网解析
+    if site_of(url) == 'qidian':
+        soup = make_soup(html, _strainer('qidian_catalog'), encoding, parser)
+        volume_list = soup.find_all('div', class_='volume')
+        for volume in volume_list:
+            chapters = volume.find_all('a', class_='chapter-name')
+            for chapter in chapters:
+                chapter_title = chapter.text.strip()
+                chapter_url = 'https:' + chapter['href']
+                chapter_list.append((chapter_title, chapter_url))
+    # 晋江文学城解析
+    else:
+        soup = make_soup(html, _strainer('jjwxc_catalog'), encoding, parser)
+        chapter_table = soup.find('table', class_='cytable')
+        if chapter_table:
+            chapters = chapter_table.find_all('tr')[1:]
+            for chapter in chapters:
+                a_tag = chapter.find('a')
+                if a_tag:
+                    chapter_title = a_tag.text.strip()
+                    chapter_url = f"https://www.jjwxc.net/{a_tag['href']}"
+                    chapter_list.append((chapter_title, chapter_url))
+    return ChapterList(chapter_list)
+
+
+def chapter_content_node(chapter_url, html, encoding=None, parser=None):
+    """构建章节页文档树，返回正文所在的节点，找不到正文区域时返回 None"""
+    if site_of(chapter_url) == 'qidian':
+        soup = make_soup(html, _strainer('qidian_content'), encoding, parser)
+        return soup.find('div', class_='read-content j_readContent')
+    soup = make_soup(html, _strainer('jjwxc_content'), encoding, parser)
+    return soup.find('div', id='content')
+
+
+def clean_chapter_content(chapter_url, content_div):
+    """从正文节点提取并清理文本内容"""
+    if site_of(chapter_url) == 'qidian':
+        lines = (p.text.strip() for p in content_div.find_all('p'))
+        return '\n'.join([line for line in lines if line])
+
+    chapter_content = content_div.text.strip()
+    # 移除晋江特有的广告和导航文本
+    chapter_content = chapter_content.replace('晋江文学城', '').replace('www.jjwxc.net', '').strip()
+    # 处理换行
+    return '\n'.join([line.strip() for line in chapter_content.splitlines() if line.strip()])
+
+
+def parse_chapter_content(chapter_url, html, encoding=None, parser=None):
+    """从章节页HTML中提取正文，找不到正文区域时返回 None"""
+    content_div = chapter_content_node(chapter_url, html, encoding, parser)
+    if not content_div:
+        return None
+    return clean_chapter_content(chapter_url, content_div)
+
+
+def parse_chapter_content_timed(chapter_url, html, encoding=None, parser=None):
+    """同 parse_chapter_content，另外返回建树和清理各自的耗时：(正文, parse 秒数, clean 秒数)
+
+    供开启埋点时在流水线的解析进程中使用，耗时随结果一起传回。
+    """
+    started = time.perf_counter()
+    content_div = chapter_content_node(chapter_url, html, encoding, parser)
+    parsed = time.perf_counter()
+    if not content_div:
+        return None, parsed - started, 0.0
+    content = clean_chapter_content(chapter_url, content_div)
+    return content, parsed - started, time.perf_counter() - parsed
@@ -0,0 +1,242 @@
+import json
+import mmap
+import os
+import re
+from array import array
+from collections import OrderedDict
+
+# 章节标题行：第xx章/节/回/卷……（数字可为阿拉伯数字或中文数字）。按字节匹配，
+# 多字节字符用分支而不是字符类，避免只匹配到字符的一部分
+_NUMERALS = '|'.join(re.escape(char) for char in '零一二三四五六七八九十百千万两〇')
+_UNITS = '|'.join(re.escape(char) for char in '章节回卷集部篇')
+_CHAPTER_HEADING = re.compile(
+    f'^(?:[ \\t]|\u3000)*第(?:[0-9]|{_NUMERALS})+(?:{_UNITS})[^\\n]*$'.encode('utf-8'), re.M
+)
+
+INDEX_VERSION = 1
+
+
+class PagedNovelReader:
+    """按页读取整本小说 .txt 的阅读器后端
+
+    首次打开时扫描一遍文件，建立章节和分页的字节偏移索引，保存在文件旁的 <文件名>.idx
+    （文件大小或修改时间变化时重建）；之后再打开只读索引。正文通过 mmap 访问，
+    page(n) 只解码第 n 页，并顺带解码前后 prefetch 页放进缓存，翻页时直接命中。
+    缓存最多 cache_pages 页，打开多大的文件、翻过多少页，内存占用都不变。
+
+    每页不超过 page_bytes 字节，尽量在换行处分页，章节总是从新的一页开始。
+    """
+
+    INDEX_SUFFIX = '.idx'
+
+    def __init__(self, path, page_bytes=4096, prefetch=1, cache_pages=8):
+        self.path = str(path)
+        self.page_bytes = page_bytes
+        self.prefetch = prefetch
+        self.cache_pages = max(cache_pages, 2 * prefetch + 1)
+        self._cache = OrderedDict()
+        self._open_file()
+        # pages[i] 为第 i 页的起始偏移，末尾多一项文件大小；chapters 为 (标题, 起始页)
+        self.pages = array('Q')
+        self.chapters = []
+        if not self._load_index():
+            self._build_index()
+            self._save_index()
+
+    @property
+    def index_path(self):
+        return self.path + self.INDEX_SUFFIX
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.page_count
+
+    @property
+    def page_count(self):
+        return max(len(self.pages) - 1, 0)
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except ValueError:
+            return False
+        if (data.get('version') != INDEX_VERSION or data.get('size') != self._size
+                or data.get('mtime_ns') != self._mtime_ns or data.get('page_bytes') != self.page_bytes):
+            return False
+        self.pages = array('Q', data['pages'])
+        self.chapters = [tuple(chapter) for chapter in data['chapters']]
+        return True
+
+    def _save_index(self):
+        data = {
+            'version': INDEX_VERSION,
+            'size': self._size,
+            'mtime_ns': self._mtime_ns,
+            'page_bytes': self.page_bytes,
+            'pages': self.pages.tolist(),
+            'chapters': self.chapters
+        }
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            # 索引只是缓存，写不进去（例如只读目录）下次重建即可
+            print(f"保存分页索引失败: {str(e)}")
+
+    def _build_index(self):
+        if self._mmap is None:
+            return
+        data = self._mmap
+        starts = [(match.start(), match.group().decode('utf-8', errors='replace').strip())
+                  for match in _CHAPTER_HEADING.finditer(data)]
+        # 第一章之前的内容（书名、简介等）单独作为一节
+        if not starts or starts[0][0] > 0 and data[:starts[0][0]].strip():
+            starts.insert(0, (0, '（前言）'))
+        elif starts[0][0] > 0:
+            starts[0] = (0, starts[0][1])
+        ends = [start for start, title in starts[1:]] + [self._size]
+        for (start, title), end in zip(starts, ends):
+            self.chapters.append((title, len(self.pages)))
+            position = start
+            while position < end:
+                self.pages.append(position)
+                position = self._page_end(position, end)
+        self.pages.append(self._size)
+
+    def _page_end(self, start, end):
+        cut = start + self.page_bytes
+        if cut >= end:
+            return end
+        newline = self._mmap.rfind(b'\n', start, cut)
+        if newline != -1:
+            return newline + 1
+        # 没有换行的超长段落：退到 UTF-8 字符边界
+        while cut > start + 1 and self._mmap[cut] & 0xC0 == 0x80:
+            cut -= 1
+        return cut
+
+    def _decode(self, number):
+        text = self._cache.get(number)
+        if text is None:
+            text = self._mmap[self.pages[number]:self.pages[number + 1]].decode('utf-8', errors='replace')
+            self._cache[number] = text
+            if len(self._cache) > self.cache_pages:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(number)
+        return text
+
+    def page(self, number):
+        """第 number 页（从 0 开始）的文字"""
+        if not 0 <= number < self.page_count:
+            raise IndexError(f'页码超出范围: {number}')
+        text = self._decode(number)
+        for neighbor in range(number - self.prefetch, number + self.prefetch + 1):
+            if neighbor != number and 0 <= neighbor < self.page_count:
+                self._decode(neighbor)
+        # 刚读的页放在缓存最后，不会先于预取的页被淘汰
+        self._cache.move_to_end(number)
+        return text
+
+    def chapter_page(self, chapter_no):
+        """第 chapter_no 章（从 0 开始，按 chapters 的顺序）的起始页"""
+        return self.chapters[chapter_no][1]
+
+    def chapter_of(self, page_number):
+        """某页所在章节在 chapters 中的位置"""
+        low, high = 0, len(self.chapters) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.chapters[middle][1] <= page_number:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def chapter_range(self, chapter_no):
+        """第 chapter_no 章在文件中的字节范围 (起, 止)"""
+        first = self.chapters[chapter_no][1]
+        last = self.chapters[chapter_no + 1][1] if chapter_no + 1 < len(self.chapters) else self.page_count
+        return self.pages[first], self.pages[last]
+
+    def remove_chapters(self, chapter_nos, chunk_size=1024 * 1024):
+        """从文件中删除若干章（chapters 中的位置），返回删除的字节数
+
+        按索引算出要保留的字节范围，一次顺序拷贝（每次 chunk_size 字节）到临时文件后
+        rename 替换原文件；分页不跨章节，剩余章节的分页偏移整体前移即可，索引不必重新扫描。
+        """
+        removing = set(chapter_nos)
+        if not removing:
+            return 0
+        pages = array('Q')
+        chapters = []
+        keep = []
+        removed_bytes = 0
+        removed_pages = 0
+        for chapter_no, (title, first) in enumerate(self.chapters):
+            last = self.chapters[chapter_no + 1][1] if chapter_no + 1 < len(self.chapters) else self.page_count
+            start, end = self.pages[first], self.pages[last]
+            if chapter_no in removing:
+                removed_bytes += end - start
+                removed_pages += last - first
+                continue
+            chapters.append((title, first - removed_pages))
+            pages.extend(offset - removed_bytes for offset in self.pages[first:last])
+            if keep and keep[-1][1] == start:
+                keep[-1] = (keep[-1][0], end)
+            else:
+                keep.append((start, end))
+        pages.append(self._size - removed_bytes)
+
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                for start, end in keep:
+                    for position in range(start, end, chunk_size):
+                        f.write(self._mmap[position:min(position + chunk_size, end)])
+                f.flush()
+                os.fsync(f.fileno())
+            # 先关闭映射再替换（Windows 不能替换仍被映射的文件）
+            self._close_file()
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            if self._file.closed:
+                self._open_file()
+
+        self._cache.clear()
+        self.pages = pages
+        self.chapters = chapters
+        self._save_index()
+        return removed_bytes
+
+    def _open_file(self):
+        self._file = open(self.path, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self._size = stat.st_size
+        self._mtime_ns = stat.st_mtime_ns
+        # 空文件不能 mmap
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+
+    def _close_file(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def close(self):
+        self._cache.clear()
+        self._close_file()
@@ -0,0 +1,119 @@
+import threading
+import time
+
+
+class ProgressAggregator:
+    """线程安全的下载进度汇总
+
+    工作线程每结束一章调用 advance()，只在锁内更新计数。进度条和进度回调按 min_interval
+    合并（默认 0.1 秒，即最多 10 Hz），章节完成得再快回调频率也不会变高；被合并掉的最后
+    一次更新由定时器在间隔结束时补发，close() 保证最终状态一定送达。
+
+    callback(percent, chapter_title) 与 download_novel 的 progress_callback 一致；
+    postfix() 返回附加在进度条后缀中的文字（如重试次数），同样只在刷新时调用。
+    clock 和 timer 默认为 time.monotonic 和 threading.Timer，测试时可传入假时钟和手动触发的定时器。
+    """
+
+    def __init__(self, total, callback=None, pbar=None, completed=0, min_interval=0.1, postfix=None,
+                 clock=time.monotonic, timer=threading.Timer):
+        self.total = total
+        self.callback = callback
+        self.pbar = pbar
+        self.min_interval = min_interval
+        self.postfix = postfix
+        self._clock = clock
+        self._timer_factory = timer
+        self.started = clock()
+        self._completed = completed
+        self._initial = completed
+        self._failed = 0
+        self._current = None
+        # 进度条已经显示到的完成数
+        self._shown = completed
+        # 上次刷新的时间，None 表示还没有刷新过（第一章结束时立即刷新）
+        self._last_emit = None
+        self._timer = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+
+    @property
+    def completed(self):
+        return self._completed
+
+    @property
+    def failed(self):
+        return self._failed
+
+    def advance(self, chapter_title=None, failed=False):
+        """记一章结束（成功或失败），必要时刷新进度"""
+        with self._lock:
+            self._completed += 1
+            if failed:
+                self._failed += 1
+            self._current = chapter_title
+            now = self._clock()
+            due = self._last_emit is None or now - self._last_emit >= self.min_interval
+            if due:
+                self._last_emit = now
+            elif self._timer is None and not self._closed:
+                self._timer = self._timer_factory(self.min_interval - (now - self._last_emit), self._flush_pending)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self._emit()
+
+    def _flush_pending(self):
+        with self._lock:
+            self._timer = None
+            if self._closed:
+                return
+            self._last_emit = self._clock()
+        self._emit()
+
+    def _emit(self):
+        # 刷新串行执行，回调看到的进度不会倒退
+        with self._emit_lock:
+            with self._lock:
+                completed = self._completed
+                chapter_title = self._current
+                delta = completed - self._shown
+                self._shown = completed
+            if not delta:
+                return
+            if self.pbar is not None:
+                self.pbar.update(delta)
+                if chapter_title:
+                    postfix = f"当前: {chapter_title[:10]}..."
+                    if self.postfix is not None:
+                        postfix += f" {self.postfix()}"
+                    self.pbar.set_postfix_str(postfix)
+            if self.callback:
+                percent = (completed / self.total) * 100 if self.total else 100.0
+                self.callback(percent, chapter_title)
+
+    def snapshot(self):
+        """当前进度：总数、完成数（含失败）、失败数、百分比、最近完成的章节和本次运行的速度"""
+        with self._lock:
+            completed = self._completed
+            failed = self._failed
+            current = self._current
+        elapsed = self._clock() - self.started
+        return {
+            'total': self.total,
+            'completed': completed,
+            'failed': failed,
+            'percent': round((completed / self.total) * 100, 2) if self.total else 100.0,
+            'current': current,
+            'chapters_per_second': round((completed - self._initial) / elapsed, 2) if elapsed > 0 else 0.0
+        }
+
+    def close(self):
+        """停止定时器并送出最终进度"""
+        with self._lock:
+            self._closed = True
+            timer = self._timer
+            self._timer = None
+        if timer is not None:
+            timer.cancel()
+        self._emit()
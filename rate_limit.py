@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+
+def host_key(url):
+    """按站点归类限速：book.qidian.com、www.qidian.com 共用 qidian.com 的令牌桶"""
+    host = urlsplit(url).hostname or ''
+    parts = host.split('.')
+    if len(parts) <= 2 or host.replace('.', '').isdigit():
+        return host
+    return '.'.join(parts[-2:])
+
+
+class TokenBucket:
+    """自适应令牌桶
+
+    rate 为每秒补充的令牌数，capacity 为允许的突发请求数。被限流（429/503、超时）时
+    速率乘以 decrease_factor，成功时加上 increase_step，即 AIMD 调速。
+    reserve() 不阻塞，只返回需要等待的秒数，线程和协程都可以使用。
+    clock 默认为 time.monotonic，测试时可传入假时钟。
+    """
+
+    def __init__(self, rate=10.0, capacity=10, min_rate=0.5, max_rate=50.0,
+                 increase_step=0.1, decrease_factor=0.5, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.tokens = float(capacity)
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.successes = 0
+        self.throttled = 0
+        self.retries = 0
+        self.give_ups = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """取一个令牌，返回获取前需要等待的秒数（令牌不足时记为欠账）"""
+        with self._lock:
+            self._refill(self._clock())
+            self.tokens -= 1
+            self.requests += 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def on_success(self):
+        with self._lock:
+            self.successes += 1
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self):
+        with self._lock:
+            self._refill(self._clock())
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            # 清空积攒的令牌，避免降速后仍有一波突发请求
+            self.tokens = min(self.tokens, 0.0)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_give_up(self):
+        with self._lock:
+            self.give_ups += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'rate': round(self.rate, 2),
+                'tokens': round(self.tokens, 2),
+                'requests': self.requests,
+                'successes': self.successes,
+                'throttled': self.throttled,
+                'retries': self.retries,
+                'give_ups': self.give_ups
+            }
+
+
+class HostRateLimiter:
+    """按站点分别维护令牌桶，bucket_options 可为单个站点覆盖默认参数"""
+
+    def __init__(self, bucket_options=None, **defaults):
+        self.defaults = defaults
+        self.bucket_options = bucket_options or {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url):
+        key = host_key(url)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                options = dict(self.defaults)
+                options.update(self.bucket_options.get(key, {}))
+                bucket = self._buckets[key] = TokenBucket(**options)
+            return bucket
+
+    def reserve(self, url):
+        return self.bucket(url).reserve()
+
+    def on_success(self, url):
+        self.bucket(url).on_success()
+
+    def on_throttle(self, url):
+        self.bucket(url).on_throttle()
+
+    def record_retry(self, url):
+        self.bucket(url).record_retry()
+
+    def record_give_up(self, url):
+        self.bucket(url).record_give_up()
+
+    def snapshot(self):
+        """各站点当前速率与计数，供进度显示使用"""
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {key: bucket.snapshot() for key, bucket in buckets.items()}
+
+
+class RetryPolicy:
+    """重试策略：每章节最多重试 max_retries 次，退避时间为带全抖动的指数退避
+
+    rng 为提供 uniform() 的随机数生成器，clock 为解析 HTTP 日期时使用的墙钟，
+    测试时可传入固定种子的 random.Random 与假时钟。
+    """
+
+    retry_status = frozenset({429, 500, 502, 503, 504})
+    throttle_status = frozenset({429, 503})
+
+    def __init__(self, max_retries=3, base_delay=1.0, max_delay=30.0, rng=None, clock=time.time):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng or random
+        self.clock = clock
+
+    def backoff(self, attempt, retry_after=None):
+        """第 attempt 次重试前的等待秒数；服务器给出 Retry-After 时以其为下限"""
+        delay = self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        server_delay = parse_retry_after(retry_after, self.clock())
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.max_delay))
+        return delay
+
+
+def parse_retry_after(value, now=None):
+    """解析 Retry-After 头（秒数或 HTTP 日期），无法解析时返回 None
+
+    now 为当前的 Unix 时间戳，省略时取 time.time()。
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        if now is None:
+            now = time.time()
+        return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+    except (TypeError, ValueError):
+        return None
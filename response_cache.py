@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+# 小说页、目录页等少量页面的响应缓存目录，与用户代理缓存放在一起
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'novel_downloader', 'pages')
+
+# 只保留解析和缓存判断用得到的响应头
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Expires')
+
+
+def cache_key(url):
+    """缓存键：去掉 #片段（不会发给服务器），起点的小说页和目录页（#Catalog）因此共用一份响应"""
+    return url.split('#', 1)[0]
+
+
+def cache_control(headers):
+    """解析 Cache-Control，返回 {指令: 值}（没有值的指令为 True）"""
+    directives = {}
+    for part in (headers.get('Cache-Control') or '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"') if value else True
+    return directives
+
+
+class CachedResponse:
+    """缓存的一次响应；parsed 保存由这份响应解析出的结果，响应不变就不必重新解析"""
+
+    __slots__ = ('url', 'status_code', 'headers', 'content', 'expires', 'parsed', 'saved')
+
+    def __init__(self, url, status_code, headers, content, expires=0.0):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.expires = expires
+        self.parsed = {}
+        # 磁盘上的副本与内存中的一致（从磁盘载入或已由 keep 写入）
+        self.saved = False
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires
+
+    def validators(self):
+        """重新验证用的条件请求头"""
+        headers = {}
+        if self.headers.get('ETag'):
+            headers['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+    def memoized(self, key, parse):
+        """同一份响应对同一 key 只调用一次 parse()"""
+        if key not in self.parsed:
+            self.parsed[key] = parse()
+        return self.parsed[key]
+
+
+class ResponseCache:
+    """内存 + 磁盘两级的 HTTP 响应缓存，按 URL（去掉片段）索引
+
+    内存中最多保留 max_entries 份响应（LRU）；cache_dir 不为 None 时还会写入磁盘，
+    磁盘上的文件总大小超过 max_disk_bytes 时按最近使用时间淘汰，下次启动仍可命中。
+    新的响应先只放在内存中：状态码 200 的页面也可能是反爬验证页，调用方解析成功后
+    用 keep() 写入磁盘，解析失败时用 discard() 丢弃，验证页不会在有效期内被反复使用。
+    有效期遵循响应的 Cache-Control（no-store 不缓存，no-cache 每次重新验证，max-age）
+    和 Expires，都没有时为 default_ttl 秒。过期的响应带有 ETag/Last-Modified 时
+    仍然保留，用来发送条件请求，服务器返回 304 时沿用缓存的响应体。
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=64, max_disk_bytes=64 * 1024 * 1024, default_ttl=300):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.default_ttl = default_ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # 磁盘缓存的总字节数，第一次写入时统计
+        self._disk_bytes = None
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.page')
+
+    def get(self, url):
+        """缓存的响应（可能已过期，用 fresh 判断），没有时返回 None"""
+        key = cache_key(url)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        entry = self._load(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def store(self, url, status_code, headers, content):
+        """记录一次响应（只在内存中）并返回对应的 CachedResponse；不可缓存的响应只返回，不保存"""
+        key = cache_key(url)
+        headers = {name: headers.get(name) for name in STORED_HEADERS if headers.get(name) is not None}
+        entry = CachedResponse(key, status_code, headers, content, self._expires(headers))
+        if status_code != 200 or 'no-store' in cache_control(headers):
+            return entry
+        if not entry.fresh and not entry.validators():
+            # 已过期又无法重新验证，缓存了也用不上
+            return entry
+        self._remember(key, entry)
+        return entry
+
+    def keep(self, entry):
+        """响应已成功解析：把仍在缓存中的响应写入磁盘"""
+        if entry.saved:
+            return
+        with self._lock:
+            cached = self._memory.get(entry.url) is entry
+        if cached:
+            self._save(entry.url, entry)
+
+    def discard(self, entry):
+        """响应无法解析：从内存和磁盘中删除，下次重新请求"""
+        with self._lock:
+            if self._memory.get(entry.url) is entry:
+                del self._memory[entry.url]
+        if self.cache_dir is None:
+            return
+        path = self._path(entry.url)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+
+    def revalidated(self, entry, headers):
+        """服务器对条件请求返回 304：更新响应头和有效期，沿用缓存的响应体和解析结果"""
+        for name in STORED_HEADERS:
+            if headers.get(name) is not None and name != 'Content-Type':
+                entry.headers[name] = headers.get(name)
+        entry.expires = self._expires(entry.headers)
+        # 新的有效期等调用方 keep 时再写入磁盘
+        entry.saved = False
+        self._remember(entry.url, entry)
+        return entry
+
+    def _expires(self, headers):
+        now = time.time()
+        directives = cache_control(headers)
+        if 'no-cache' in directives:
+            return now
+        max_age = directives.get('max-age')
+        if max_age not in (None, True):
+            try:
+                return now + max(int(max_age), 0)
+            except ValueError:
+                return now
+        if headers.get('Expires'):
+            try:
+                return parsedate_to_datetime(headers['Expires']).timestamp()
+            except (TypeError, ValueError):
+                # 无效的 Expires（例如 "0"）表示已过期
+                return now
+        return now + self.default_ttl
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != key or len(content) != meta.get('length'):
+            return None
+        try:
+            # 更新修改时间，磁盘淘汰按它判断最近使用
+            os.utime(path)
+        except OSError:
+            pass
+        entry = CachedResponse(key, meta['status_code'], meta['headers'], content, meta['expires'])
+        entry.saved = True
+        return entry
+
+    def _save(self, key, entry):
+        if self.cache_dir is None:
+            return
+        meta = {'url': key, 'status_code': entry.status_code, 'headers': entry.headers,
+                'expires': entry.expires, 'length': len(entry.content)}
+        path = self._path(key)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, 'wb') as f:
+                f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8') + b'\n')
+                f.write(entry.content)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+            entry.saved = True
+        except OSError as e:
+            # 磁盘缓存只是加速，写不进去时只用内存缓存
+            print(f"保存页面缓存失败: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk()[0]
+            else:
+                self._disk_bytes += size - old_size
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self._trim_disk()
+
+    def _scan_disk(self):
+        """磁盘缓存的 (总字节数, [(最近使用时间, 字节数, 路径)])"""
+        total = 0
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.page'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            total += stat.st_size
+            files.append((stat.st_mtime, stat.st_size, path))
+        return total, files
+
+    def _trim_disk(self):
+        """按最近使用时间淘汰磁盘缓存，直到总大小不超过 max_disk_bytes"""
+        with self._lock:
+            total, files = self._scan_disk()
+            for _, size, path in sorted(files):
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self._disk_bytes = total
+
+    def clear(self):
+        """清空内存缓存（磁盘上的缓存保留）"""
+        with self._lock:
+            self._memory.clear()
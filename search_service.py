@@ -0,0 +1,182 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def normalize_keyword(keyword):
+    """缓存和合并请求用的关键词：全角转半角、去掉首尾空白、连续空白合并、英文小写"""
+    keyword = unicodedata.normalize('NFKC', keyword or '')
+    return re.sub(r'\s+', ' ', keyword).strip().lower()
+
+
+class TTLCache:
+    """带过期时间的 LRU 缓存：最多 max_entries 项，每项 ttl 秒后失效"""
+
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class CachedSearch:
+    """在后台线程执行搜索，结果按关键词缓存，相同关键词的并发请求只发一次
+
+    search(keyword) 为实际的（阻塞）搜索函数。submit() 立即返回 Future：缓存命中时
+    Future 已经完成；同一关键词已有请求在途时返回同一个 Future；否则提交到线程池。
+    搜索抛出 offline_errors 中的异常（断网、超时）且给出了 fallback 时，改用
+    fallback(keyword) 的结果（例如本地全文索引），这类结果不进缓存，联网后重新搜索。
+    """
+
+    def __init__(self, search, fallback=None, offline_errors=(OSError,), max_workers=4,
+                 max_entries=256, ttl=300):
+        self.search = search
+        self.fallback = fallback
+        self.offline_errors = offline_errors
+        self.cache = TTLCache(max_entries, ttl)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='search')
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, keyword):
+        key = normalize_keyword(keyword)
+        results = self.cache.get(key)
+        if results is not None:
+            future = Future()
+            future.set_result(results)
+            return future
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self._inflight[key] = self._executor.submit(self._run, key)
+        # 在锁外登记回调：已经完成的 Future 会在当前线程立即回调
+        future.add_done_callback(lambda done: self._finished(key, done))
+        return future
+
+    def _run(self, key):
+        try:
+            results = self.search(key)
+        except self.offline_errors as e:
+            if self.fallback is None:
+                raise
+            print(f"在线搜索失败，改用本地索引: {str(e)}")
+            return self.fallback(key)
+        self.cache.put(key, results)
+        return results
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class QidianSpider:
+    """起点小说搜索
+
+    所有搜索共用一个带连接池的 Session，在后台线程中执行；结果按规范化后的关键词缓存
+    （LRU + TTL），同一关键词的并发搜索只请求一次。联网失败（断网、超时）时改用
+    本地全文索引 fallback（NovelSearcher）的结果。requests、bs4 在创建或第一次搜索时才导入。
+    """
+
+    SEARCH_URL = 'https://www.qidian.com/search'
+
+    def __init__(self, fallback=None, max_workers=4, cache_size=256, cache_ttl=300):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from user_agents import random_user_agent
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'User-Agent': random_user_agent(),
+            'Referer': 'https://www.qidian.com/'
+        })
+        self.fallback = fallback
+        self._search = CachedSearch(
+            self._search_online, self._search_local if fallback is not None else None,
+            offline_errors=(requests.ConnectionError, requests.Timeout),
+            max_workers=max_workers, max_entries=cache_size, ttl=cache_ttl
+        )
+
+    def search_novel(self, keyword):
+        """搜索小说（阻塞直到有结果），返回 {'id', 'title', 'author', 'url'} 列表"""
+        return self.search_novel_async(keyword).result()
+
+    def search_novel_async(self, keyword):
+        """在后台搜索，立即返回 Future；缓存命中时 Future 已完成"""
+        if not normalize_keyword(keyword):
+            future = Future()
+            future.set_result([])
+            return future
+        return self._search.submit(keyword)
+
+    def _search_online(self, keyword):
+        from bs4 import BeautifulSoup
+
+        response = self.session.get(self.SEARCH_URL, params={'kw': keyword}, timeout=10)
+        response.raise_for_status()
+        soup = BeautifulSoup(response.text, 'html.parser')
+        results = []
+        for item in soup.select('li.res-book-item'):
+            link = item.select_one('h3 a') or item.select_one('h2 a')
+            if link is None:
+                continue
+            author = item.select_one('.author .name') or item.select_one('.author a')
+            book_id = item.get('data-bid')
+            results.append({
+                'id': book_id,
+                'title': link.get_text(strip=True),
+                'author': author.get_text(strip=True) if author else '',
+                'url': f'https://book.qidian.com/info/{book_id}' if book_id else None
+            })
+        return results
+
+    def _search_local(self, keyword):
+        """离线时检索本地已下载的小说，结果带 offline=True"""
+        return [{
+            'id': None,
+            'title': result['title'],
+            'author': result['author'],
+            'url': None,
+            'chapter': result['chapter'],
+            'offline': True
+        } for result in self.fallback.search(keyword)]
+
+    def close(self):
+        self._search.close()
+        self.session.close()
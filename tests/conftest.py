@@ -0,0 +1,79 @@
+import collections
+import os
+import sys
+import threading
+from urllib.parse import urlsplit
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from mock_site import MockSite, LocalSiteAdapter, start_server  # noqa: E402
+
+
+class CountingAdapter(LocalSiteAdapter):
+    """转发到替身站点并记录每个地址的请求次数"""
+
+    def __init__(self, port, hits):
+        super().__init__(port)
+        self.hits = hits
+
+    def send(self, request, **kwargs):
+        self.hits[request.url] += 1
+        return super().send(request, **kwargs)
+
+
+@pytest.fixture
+def site():
+    """20 章的替身站点；测试中可以替换 site.site 改变页面内容"""
+    server = start_server(MockSite(20))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_downloader(site):
+    """创建请求替身站点的 NovelDownloader，downloader.hits 记录各地址（原站点地址）的请求次数
+
+    requests 引擎挂载适配器；async 引擎的请求不经过 requests.Session，在 fetch_response 中改写地址。
+    """
+    from nihao import NovelDownloader
+    from rate_limit import HostRateLimiter, RetryPolicy
+    from response_cache import ResponseCache
+
+    downloaders = []
+
+    def make(engine='requests', **kwargs):
+        kwargs.setdefault('rate_limiter', HostRateLimiter(rate=100000, capacity=100000, max_rate=100000))
+        kwargs.setdefault('retry_policy', RetryPolicy(base_delay=0.01, max_delay=0.05))
+        kwargs.setdefault('page_cache', ResponseCache(cache_dir=None))
+        kwargs.setdefault('progress_interval', 0)
+        downloader = NovelDownloader(engine=engine, **kwargs)
+        hits = collections.Counter()
+        lock = threading.Lock()
+        if engine == 'async':
+            fetch_response = downloader._async_engine.fetch_response
+
+            async def local_fetch_response(url, *args, **kwargs):
+                with lock:
+                    hits[url] += 1
+                parts = urlsplit(url)
+                query = f'?{parts.query}' if parts.query else ''
+                local_url = f'http://127.0.0.1:{site.server_port}/{parts.netloc}{parts.path}{query}'
+                return await fetch_response(local_url, *args, **kwargs)
+
+            downloader._async_engine.fetch_response = local_fetch_response
+        else:
+            adapter = CountingAdapter(site.server_port, hits)
+            downloader.session.mount('https://', adapter)
+            downloader.session.mount('http://', adapter)
+        downloader.hits = hits
+        downloaders.append(downloader)
+        return downloader
+
+    yield make
+    for downloader in downloaders:
+        downloader.close()
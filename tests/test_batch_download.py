@@ -0,0 +1,98 @@
+import collections
+
+from batch_download import BatchDownloader
+from conftest import CountingAdapter
+from mock_site import NOVEL_URLS
+from rate_limit import host_key
+
+
+def make_batch(make_downloader, site, tmp_path, **kwargs):
+    downloader = make_downloader()
+    batch = BatchDownloader(downloader, output_dir=str(tmp_path), **kwargs)
+    # BatchDownloader 挂载了自己的连接池适配器，换回转发到替身站点的适配器
+    adapter = CountingAdapter(site.server_port, downloader.hits)
+    downloader.session.mount('https://', adapter)
+    downloader.session.mount('http://', adapter)
+    return batch
+
+
+def track_in_flight(downloader):
+    """记录同时在途的请求数的峰值：总数和各站点"""
+    engine = downloader.async_downloader
+    fetch_response = engine.fetch_response
+    running = collections.Counter()
+    peak = collections.Counter()
+
+    async def tracked(url, *args, **kwargs):
+        host = host_key(url)
+        running['total'] += 1
+        running[host] += 1
+        peak['total'] = max(peak['total'], running['total'])
+        peak[host] = max(peak[host], running[host])
+        try:
+            return await fetch_response(url, *args, **kwargs)
+        finally:
+            running['total'] -= 1
+            running[host] -= 1
+
+    engine.fetch_response = tracked
+    return peak
+
+
+def test_books_take_turns(make_downloader, site, tmp_path):
+    batch = make_batch(make_downloader, site, tmp_path, max_workers=1, per_host=1, max_active_books=3)
+    order = []
+    batch.progress_callback = lambda job, chapter_title: chapter_title and order.append(job.save_path[-1])
+    batch.add(NOVEL_URLS['jjwxc'], str(tmp_path / 'a'))
+    batch.add(NOVEL_URLS['jjwxc'], str(tmp_path / 'b'), end_chapter=3)
+    batch.add(NOVEL_URLS['jjwxc'], str(tmp_path / 'c'), end_chapter=3)
+    jobs = batch.run()
+    assert [job.status for job in jobs] == ['完成'] * 3
+    assert [job.completed for job in jobs] == [20, 3, 3]
+    # 每轮每本书一章，短书不必等长书下载完
+    assert order[:9] == ['a', 'b', 'c'] * 3
+    assert order[9:] == ['a'] * 17
+
+
+def test_global_and_per_host_limits(make_downloader, site, tmp_path):
+    site.latency = 0.01
+    batch = make_batch(make_downloader, site, tmp_path, max_workers=3, per_host=2)
+    peak = track_in_flight(batch.downloader)
+    for name in 'ab':
+        batch.add(NOVEL_URLS['jjwxc'], str(tmp_path / f'jjwxc-{name}'))
+        batch.add(NOVEL_URLS['qidian'], str(tmp_path / f'qidian-{name}'))
+    jobs = batch.run()
+    assert [job.status for job in jobs] == ['完成'] * 4
+    assert all(job.completed == 20 and job.failed == 0 for job in jobs)
+    assert peak['total'] == 3
+    assert peak['jjwxc.net'] <= 2
+    assert peak['qidian.com'] <= 2
+
+
+def test_full_host_does_not_block_books_on_other_hosts(make_downloader, site, tmp_path):
+    site.latency = 0.05
+    batch = make_batch(make_downloader, site, tmp_path, max_workers=4, per_host=1)
+    batch.add(NOVEL_URLS['jjwxc'], str(tmp_path / 'a'), end_chapter=2)
+    batch.add(NOVEL_URLS['jjwxc'], str(tmp_path / 'b'), end_chapter=2)
+    batch.add(NOVEL_URLS['qidian'], str(tmp_path / 'c'), end_chapter=2)
+    jobs = batch.run()
+    assert [job.status for job in jobs] == ['完成'] * 3
+    # 晋江的第一本书还在获取信息时，排在第二本晋江书之后的起点书已经开始准备
+    requested = list(batch.downloader.hits)
+    assert requested.index(NOVEL_URLS['qidian']) < requested.index('https://www.jjwxc.net/onebook.php?novelid=2002')
+
+
+def test_cancel_stops_every_book(make_downloader, site, tmp_path):
+    site.latency = 0.01
+    batch = make_batch(make_downloader, site, tmp_path, max_workers=2, per_host=2)
+
+    def progress_callback(job, chapter_title):
+        if job.completed == 3:
+            batch.cancel()
+
+    batch.progress_callback = progress_callback
+    batch.add(NOVEL_URLS['jjwxc'], str(tmp_path / 'a'))
+    batch.add(NOVEL_URLS['qidian'], str(tmp_path / 'b'))
+    jobs = batch.run()
+    assert [job.status for job in jobs] == ['已停止'] * 2
+    assert sum(job.completed for job in jobs) < 40
@@ -0,0 +1,164 @@
+import pickle
+
+import pytest
+
+from chapter_list import ABSENT, ChapterList, ChapterProgress, ChapterView, split_url, status_counts
+
+URLS = [
+    'https://vipreader.qidian.com/chapter/1001/1',
+    'https://vipreader.qidian.com/chapter/1001/20',
+    'https://www.jjwxc.net/onebook.php?novelid=2002&chapterid=3',
+    'https://example.com/book/007',
+    'https://example.com/book/0',
+    'https://example.com/book/abc.html',
+    'https://example.com/book/12/',
+    'https://example.com/book/99999999999999999999',
+    'https://example.com/book/第一章',
+    'https://example.com/book/',
+    'chapter-without-separator',
+    '',
+]
+
+
+def catalog(urls=URLS):
+    return [{'title': f'第{number}章 标题{number}', 'url': url} for number, url in enumerate(urls, 1)]
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_split_url_round_trip(url):
+    prefix, suffix = split_url(url)
+    assert prefix + suffix == url
+
+
+def test_urls_and_titles_round_trip():
+    chapters = ChapterList(catalog())
+    assert chapters.to_dicts() == catalog()
+    assert list(chapters.titles()) == [chapter['title'] for chapter in catalog()]
+    # 元组输入与字典输入等价
+    assert ChapterList([(c['title'], c['url']) for c in catalog()]).to_dicts() == catalog()
+
+
+def test_url_prefixes_are_interned():
+    urls = [f'https://vipreader.qidian.com/chapter/1001/{number}' for number in range(1, 501)]
+    chapters = ChapterList(catalog(urls))
+    assert chapters._prefixes == ['https://vipreader.qidian.com/chapter/1001/']
+    assert chapters._suffixes == {}
+    assert [chapter['url'] for chapter in chapters] == urls
+
+    mixed = ChapterList(catalog(URLS))
+    # 前导零、非数字和超长数字的末段按字符串保存
+    assert {URLS[position] for position in mixed._suffixes} == {
+        'https://example.com/book/007', 'https://example.com/book/abc.html', 'https://example.com/book/12/',
+        'https://example.com/book/99999999999999999999', 'https://example.com/book/第一章',
+        'https://example.com/book/', 'chapter-without-separator', ''
+    }
+    assert len(mixed._prefixes) == len(set(split_url(url)[0] for url in URLS))
+
+
+def test_chapter_view_is_a_read_only_mapping():
+    chapters = ChapterList(catalog())
+    view = chapters[2]
+    assert isinstance(view, ChapterView)
+    assert dict(view) == catalog()[2]
+    assert list(view) == ['title', 'url']
+    assert len(view) == 2
+    assert view.get('index') is None
+    with pytest.raises(KeyError):
+        view['index']
+    with pytest.raises(TypeError):
+        view['title'] = '改名'
+    assert view == catalog()[2]
+    assert chapters[-1]['url'] == ''
+    with pytest.raises(IndexError):
+        chapters[len(URLS)]
+    # 序列化时只带上这一章
+    assert pickle.loads(pickle.dumps(view)) == catalog()[2]
+    assert len(pickle.dumps(view)) < len(pickle.dumps(chapters.to_dicts()))
+
+
+def test_slices_share_columns_and_number_from_first():
+    chapters = ChapterList(catalog())
+    window = chapters[3:7]
+    assert window._titles is chapters._titles
+    assert window.to_dicts() == catalog()[3:7]
+    assert chapters[::3] == [chapters[position] for position in range(0, len(URLS), 3)]
+    numbered = window.numbered(4)
+    assert [chapter['index'] for chapter in numbered] == [4, 5, 6, 7]
+    assert list(numbered[0]) == ['title', 'url', 'index']
+    files = numbered.with_files(lambda chapter: chapter['title'], renamed={1: '重名.txt'})
+    assert [chapter['file'] for chapter in files][:2] == ['第4章 标题4.txt', '重名.txt']
+    assert 'file' not in numbered[0]
+    assert chapters[5:2].to_dicts() == []
+
+
+def test_progress_stores_range_keys_as_bytes():
+    progress = ChapterProgress(first=10, count=5, status='等待中')
+    assert dict(progress) == {10: '等待中', 11: '等待中', 12: '等待中', 13: '等待中', 14: '等待中'}
+    progress[10] = '下载中'
+    progress[11] = '已完成'
+    progress[12] = '重试中(3)'
+    progress[13] = '失败'
+    assert progress._extra == {}
+    assert [progress[key] for key in range(10, 15)] == ['下载中', '已完成', '重试中(3)', '失败', '等待中']
+
+
+def test_progress_keys_outside_range_and_unknown_statuses_go_to_extra():
+    progress = ChapterProgress(first=1, count=3, status='等待中')
+    progress[0] = '已完成'
+    progress[4] = '已完成'
+    progress['番外 某章'] = '下载中'
+    progress[2] = '暂停'
+    progress[3] = '重试中(0)'
+    assert progress._extra == {0: '已完成', 4: '已完成', '番外 某章': '下载中', 2: '暂停', 3: '重试中(0)'}
+    assert progress._codes[1] == ABSENT
+    assert progress[2] == '暂停'
+    assert progress[3] == '重试中(0)'
+    # 重新设为已知状态时移回字节数组
+    progress[2] = '已完成'
+    assert 2 not in progress._extra
+    assert progress[2] == '已完成'
+    assert list(progress) == [1, 2, 0, 4, '番外 某章', 3]
+    assert len(progress) == 6
+
+
+def test_progress_retry_counts_round_trip():
+    progress = ChapterProgress(first=1, count=2)
+    progress[1] = '重试中(1)'
+    progress[2] = '重试中(1000)'
+    assert progress[1] == '重试中(1)'
+    assert progress[2] == '重试中(1000)'
+    assert progress._extra == {2: '重试中(1000)'}
+
+
+def test_progress_delitem():
+    progress = ChapterProgress(first=1, count=2, status='等待中')
+    progress['标题'] = '失败'
+    del progress[1]
+    del progress['标题']
+    assert dict(progress) == {2: '等待中'}
+    with pytest.raises(KeyError):
+        del progress[1]
+    with pytest.raises(KeyError):
+        progress[1]
+    with pytest.raises(KeyError):
+        del progress[99]
+    progress[2] = '暂停'
+    del progress[2]
+    assert len(progress) == 0
+    assert 2 not in progress
+
+
+def test_progress_for_chapters_and_counts():
+    chapters = ChapterList(catalog()).numbered(5)
+    progress = ChapterProgress.for_chapters(chapters, '等待中')
+    assert progress.first == 5
+    assert len(progress) == len(URLS)
+    progress[5] = '已完成'
+    progress[6] = '已完成'
+    progress[7] = '重试中(2)'
+    progress['额外'] = '失败'
+    progress[8] = '暂停'
+    assert status_counts(progress) == {'已完成': 2, '重试中(2)': 1, '等待中': len(URLS) - 4, '失败': 1, '暂停': 1}
+    assert status_counts(progress) == status_counts(dict(progress))
+    assert ChapterProgress.for_chapters(ChapterList()).first == 1
+    assert status_counts({}) == {}
@@ -0,0 +1,152 @@
+import json
+import os
+
+import pytest
+
+from chapter_list import status_counts
+from mock_site import NOVEL_URLS, MockSite, chapter_text
+from nihao import CancelToken
+
+
+def chapter_requests(downloader):
+    return sum(count for url, count in downloader.hits.items() if '/chapter/' in url or 'chapterid=' in url)
+
+
+def saved_text(save_path, number):
+    with open(os.path.join(save_path, f'第{number}章 测试.txt'), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('engine, pipeline', [
+    ('requests', False), ('requests', True), ('async', False), ('async', True)
+])
+def test_download_novel_saves_every_chapter(make_downloader, tmp_path, engine, pipeline):
+    downloader = make_downloader(engine, max_workers=4)
+    save_path = str(tmp_path / 'book')
+    results = downloader.download_novel(NOVEL_URLS['qidian'], save_path, pipeline=pipeline)
+    assert results == [True] * 20
+    assert status_counts(downloader.chapter_progress) == {'已完成': 20}
+    for number in (1, 7, 20):
+        assert saved_text(save_path, number) == '\n'.join(chapter_text(number))
+    # 小说页和目录页（同一地址的 #Catalog）只请求一次
+    assert downloader.hits[NOVEL_URLS['qidian']] == 1
+    assert chapter_requests(downloader) == 20
+
+
+def test_cancel_during_download_leaves_remaining_chapters_unrun(make_downloader, tmp_path):
+    downloader = make_downloader(max_workers=1)
+    cancel_token = CancelToken()
+
+    def progress_callback(percent, chapter_title):
+        if chapter_title == '第3章 测试':
+            cancel_token.cancel()
+
+    results = downloader.download_novel(NOVEL_URLS['jjwxc'], str(tmp_path / 'book'),
+                                        progress_callback=progress_callback, cancel_token=cancel_token)
+    assert results[:3] == [True] * 3
+    assert results[3:] == [False] * 17
+    assert chapter_requests(downloader) == 3
+    assert status_counts(downloader.chapter_progress) == {'已完成': 3, '等待中': 17}
+
+
+def test_cancel_before_download_starts(make_downloader, tmp_path):
+    """获取目录期间按下停止（GUI 先创建停止标记）时不再下载任何章节"""
+    downloader = make_downloader()
+    cancel_token = CancelToken()
+    assert downloader.get_novel_info(NOVEL_URLS['qidian'])['title'] == '基准测试之书'
+    cancel_token.cancel()
+    results = downloader.download_novel(NOVEL_URLS['qidian'], str(tmp_path / 'book'), cancel_token=cancel_token)
+    assert results == [False] * 20
+    assert chapter_requests(downloader) == 0
+
+
+def test_pipeline_passes_the_effective_parser_to_extract_processes(make_downloader, tmp_path, monkeypatch):
+    """解析进程重新导入 page_parser，看不到本进程中 set_default_parser 的设置，解析器名称要随参数传过去"""
+    import concurrent.futures
+    from concurrent.futures import ThreadPoolExecutor
+
+    import page_parser
+
+    parsers = []
+
+    class RecordingPool(ThreadPoolExecutor):
+        def __init__(self, max_workers=None, mp_context=None):
+            super().__init__(max_workers)
+
+        def submit(self, func, *args):
+            parsers.append(args[-1])
+            return super().submit(func, *args)
+
+    monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor', RecordingPool)
+    monkeypatch.setattr(page_parser, 'DEFAULT_PARSER', 'lxml')
+    downloader = make_downloader(max_workers=2)
+    results = downloader.download_novel(NOVEL_URLS['qidian'], str(tmp_path / 'book'), pipeline=True)
+    assert results == [True] * 20
+    assert parsers == ['lxml'] * 20
+
+
+def test_manifest_resumes_without_refetching(make_downloader, tmp_path):
+    save_path = str(tmp_path / 'book')
+    first = make_downloader()
+    assert first.download_novel(NOVEL_URLS['qidian'], save_path, end_chapter=5) == [True] * 5
+
+    second = make_downloader()
+    results = second.download_novel(NOVEL_URLS['qidian'], save_path)
+    assert results == [True] * 20
+    requested = {url.rsplit('/', 1)[1] for url in second.hits if '/chapter/' in url}
+    assert requested == {str(number) for number in range(6, 21)}
+
+
+def test_manifest_adopts_chapters_saved_by_older_versions(make_downloader, tmp_path):
+    """没有下载清单的旧目录：已有的章节文件视为已完成"""
+    save_path = tmp_path / 'book'
+    save_path.mkdir()
+    (save_path / '第1章 测试.txt').write_text('旧版本保存的正文', encoding='utf-8')
+    downloader = make_downloader()
+    assert downloader.download_novel(NOVEL_URLS['jjwxc'], str(save_path), end_chapter=3) == [True] * 3
+    assert chapter_requests(downloader) == 2
+    assert saved_text(str(save_path), 1) == '旧版本保存的正文'
+
+
+def test_failed_chapters_are_retried_next_run(site, make_downloader, tmp_path):
+    save_path = str(tmp_path / 'book')
+    # 目录页照常列出 20 章，第 19、20 章返回 404
+    site.site = MockSite(18)
+    site.site._pages[('www.jjwxc.net', '/onebook.php', 'novelid=2002')] = (
+        MockSite(20).render('www.jjwxc.net', '/onebook.php', 'novelid=2002')
+    )
+    first = make_downloader()
+    results = first.download_novel(NOVEL_URLS['jjwxc'], save_path)
+    assert results == [True] * 18 + [False] * 2
+    assert status_counts(first.chapter_progress) == {'已完成': 18, '失败': 2}
+
+    site.site = MockSite(20)
+    second = make_downloader()
+    assert second.download_novel(NOVEL_URLS['jjwxc'], save_path) == [True] * 20
+    assert sorted(int(url.rsplit('=', 1)[1]) for url in second.hits if 'chapterid=' in url) == [19, 20]
+
+
+def test_incremental_update_downloads_only_new_chapters(site, make_downloader, tmp_path):
+    save_path = str(tmp_path / 'book')
+    first = make_downloader()
+    assert first.download_novel(NOVEL_URLS['jjwxc'], save_path, incremental=True) == [True] * 20
+
+    site.site = MockSite(23)
+    second = make_downloader()
+    results = second.download_novel(NOVEL_URLS['jjwxc'], save_path, incremental=True)
+    assert results == [True] * 23
+    requested = sorted(int(url.rsplit('=', 1)[1]) for url in second.hits if 'chapterid=' in url)
+    assert requested == [21, 22, 23]
+    # 增量更新不再请求小说页，书名取自目录缓存
+    assert NOVEL_URLS['jjwxc'] not in second.hits
+    with open(os.path.join(save_path, 'catalog.json'), encoding='utf-8') as f:
+        catalog = json.load(f)
+    assert catalog['title'] == '基准测试之书'
+    assert len(catalog['chapters']) == 23
+
+
+def test_failed_novel_info_returns_false(make_downloader, tmp_path):
+    downloader = make_downloader()
+    save_path = tmp_path / 'book'
+    assert downloader.download_novel('https://book.qidian.com/info/9999', str(save_path)) is False
+    assert not save_path.exists()
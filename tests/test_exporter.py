@@ -0,0 +1,202 @@
+import os
+import xml.etree.ElementTree as ET
+import zipfile
+
+import pytest
+
+from exporter import BookExporter, EpubBookWriter, TxtBookWriter, export_book
+from mock_site import NOVEL_URLS, chapter_text
+
+OPF = '{http://www.idpf.org/2007/opf}'
+XHTML = '{http://www.w3.org/1999/xhtml}'
+NCX = '{http://www.daisy.org/z3986/2005/ncx/}'
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.chapters = []
+        self.closed = False
+        self.aborted = False
+
+    def write_chapter(self, title, content):
+        self.chapters.append((title, content))
+
+    def close(self):
+        self.closed = True
+
+    def abort(self):
+        self.aborted = True
+
+
+def chapters(count):
+    return [{'index': index, 'title': f'第{index}章'} for index in range(1, count + 1)]
+
+
+def make_exporter(count):
+    writer = RecordingWriter()
+    reads = []
+
+    def read_chapter(chapter):
+        reads.append(chapter['index'])
+        return f'读回的正文{chapter["index"]}'
+
+    return BookExporter(writer, chapters(count), read_chapter), writer, reads
+
+
+def test_out_of_order_chapters_are_written_in_catalog_order():
+    exporter, writer, reads = make_exporter(5)
+    chapter = {chapter['index']: chapter for chapter in chapters(5)}
+    exporter.chapter_done(chapter[3], '正文3')
+    exporter.chapter_done(chapter[5], '正文5')
+    assert writer.chapters == []
+    exporter.chapter_done(chapter[1], '正文1')
+    assert writer.chapters == [('第1章', '正文1')]
+    # 第 2 章完成时第 3 章已经在等待，按顺序一并写出（第 3 章从存储读回）
+    exporter.chapter_done(chapter[2], '正文2')
+    assert [title for title, _ in writer.chapters] == ['第1章', '第2章', '第3章']
+    assert writer.chapters[2] == ('第3章', '读回的正文3')
+    exporter.chapter_done(chapter[4], '正文4')
+    assert writer.chapters[3:] == [('第4章', '正文4'), ('第5章', '读回的正文5')]
+    # 恰好轮到的章节直接使用传入的正文，只有提前完成的章节才读回
+    assert reads == [3, 5]
+    assert exporter.finish() == {'chapters': 5, 'skipped': 0}
+    assert writer.closed
+
+
+def test_failed_and_unfinished_chapters_are_skipped():
+    exporter, writer, reads = make_exporter(5)
+    chapter = {chapter['index']: chapter for chapter in chapters(5)}
+    exporter.chapter_failed(chapter[2])
+    exporter.chapter_done(chapter[3])
+    exporter.chapter_done(chapter[1], '正文1')
+    assert [title for title, _ in writer.chapters] == ['第1章', '第3章']
+    exporter.chapter_done(chapter[5], '正文5')
+    assert exporter.finish() == {'chapters': 2, 'skipped': 3}
+    # 结束后的通知和重复的 finish 都被忽略
+    exporter.chapter_done(chapter[4], '正文4')
+    assert exporter.finish() == {'chapters': 2, 'skipped': 3}
+    assert len(writer.chapters) == 2
+
+
+def test_chapters_missing_from_storage_are_skipped():
+    writer = RecordingWriter()
+    exporter = BookExporter(writer, chapters(3), lambda chapter: None)
+    for chapter in chapters(3)[::-1]:
+        exporter.chapter_done(chapter)
+    assert exporter.finish() == {'chapters': 0, 'skipped': 3}
+
+
+def test_abort_removes_partial_file(tmp_path):
+    path = tmp_path / 'book.txt'
+    writer = TxtBookWriter(path, '书名', '作者')
+    exporter = BookExporter(writer, chapters(2), lambda chapter: '正文')
+    exporter.chapter_done(chapters(2)[0], '正文')
+    exporter.abort()
+    assert list(tmp_path.iterdir()) == []
+    exporter.abort()
+
+
+def write_epub(path, titles):
+    writer = EpubBookWriter(path, '书名 <测试> & 续', '作者', chunk_size=64)
+    for number, title in enumerate(titles, 1):
+        writer.write_chapter(title, '\n'.join(chapter_text(number, paragraphs=5)) + '\n\n<script>&\n')
+    writer.close()
+
+
+def test_epub_mimetype_is_first_and_stored(tmp_path):
+    path = tmp_path / 'book.epub'
+    write_epub(path, ['第一章', '第二章'])
+    with open(path, 'rb') as f:
+        head = f.read(60)
+    # 阅读器靠文件开头的固定字节识别 EPUB：local header 30 字节、文件名 8 字节，其后紧跟未压缩的内容
+    assert head[30:38] == b'mimetype'
+    assert head[38:58] == b'application/epub+zip'
+    with zipfile.ZipFile(path) as book:
+        first = book.infolist()[0]
+        assert first.filename == 'mimetype'
+        assert first.compress_type == zipfile.ZIP_STORED
+        assert first.extra == b''
+        assert book.read('mimetype') == b'application/epub+zip'
+        assert all(info.compress_type == zipfile.ZIP_DEFLATED for info in book.infolist()[1:])
+        assert book.testzip() is None
+
+
+def test_epub_package_and_navigation_are_valid(tmp_path):
+    path = tmp_path / 'book.epub'
+    titles = ['第一章 <开端>', '第二章 & 发展', '第三章 "结局"']
+    write_epub(path, titles)
+    with zipfile.ZipFile(path) as book:
+        names = set(book.namelist())
+        container = ET.fromstring(book.read('META-INF/container.xml'))
+        rootfile = container.find('.//{urn:oasis:names:tc:opendocument:xmlns:container}rootfile')
+        opf_path = rootfile.get('full-path')
+        assert opf_path == 'OEBPS/content.opf'
+        package = ET.fromstring(book.read(opf_path))
+        assert package.get('version') == '3.0'
+        metadata = package.find(f'{OPF}metadata')
+        dc = '{http://purl.org/dc/elements/1.1/}'
+        assert metadata.find(f'{dc}title').text == '书名 <测试> & 续'
+        assert metadata.find(f'{dc}creator').text == '作者'
+        identifier = metadata.find(f'{dc}identifier')
+        assert identifier.get('id') == package.get('unique-identifier')
+        assert metadata.find(f"{OPF}meta[@property='dcterms:modified']").text.endswith('Z')
+
+        items = {item.get('id'): item for item in package.find(f'{OPF}manifest')}
+        for item in items.values():
+            assert 'OEBPS/' + item.get('href') in names
+        assert [item.get('id') for item in items.values() if item.get('properties') == 'nav'] == ['nav']
+        spine = package.find(f'{OPF}spine')
+        assert items[spine.get('toc')].get('media-type') == 'application/x-dtbncx+xml'
+        order = [itemref.get('idref') for itemref in spine]
+        assert order == ['c1', 'c2', 'c3']
+
+        nav = ET.fromstring(book.read('OEBPS/' + items['nav'].get('href')))
+        links = nav.findall(f'.//{XHTML}nav/{XHTML}ol/{XHTML}li/{XHTML}a')
+        assert [link.text for link in links] == titles
+        assert [link.get('href') for link in links] == [items[idref].get('href') for idref in order]
+
+        ncx = ET.fromstring(book.read('OEBPS/toc.ncx'))
+        assert ncx.find(f'{NCX}head/{NCX}meta').get('content') == identifier.text
+        points = ncx.findall(f'.//{NCX}navPoint')
+        assert [point.find(f'{NCX}navLabel/{NCX}text').text for point in points] == titles
+        assert [point.get('playOrder') for point in points] == ['1', '2', '3']
+
+        for number, idref in enumerate(order, 1):
+            chapter = ET.fromstring(book.read('OEBPS/' + items[idref].get('href')))
+            assert chapter.find(f'.//{XHTML}h2').text == titles[number - 1]
+            paragraphs = [p.text for p in chapter.iter(f'{XHTML}p')]
+            assert paragraphs == chapter_text(number, paragraphs=5) + ['<script>&']
+
+
+@pytest.mark.parametrize('fmt', ['txt', 'epub'])
+def test_export_while_downloading_keeps_catalog_order(make_downloader, tmp_path, fmt):
+    downloader = make_downloader(max_workers=8)
+    export_path = str(tmp_path / f'book.{fmt}')
+    results = downloader.download_novel(NOVEL_URLS['jjwxc'], str(tmp_path / 'book'), export=export_path)
+    assert results == [True] * 20
+    assert downloader.export_stats == {'chapters': 20, 'skipped': 0}
+    assert not os.path.exists(export_path + '.part')
+    if fmt == 'txt':
+        with open(export_path, encoding='utf-8') as f:
+            text = f.read()
+        positions = [text.index(f'第{number}章 测试\n\n') for number in range(1, 21)]
+        assert positions == sorted(positions)
+        with open(tmp_path / 'book' / '第7章 测试.txt', encoding='utf-8') as f:
+            assert f'第7章 测试\n\n{f.read()}\n\n\n' in text
+    else:
+        with zipfile.ZipFile(export_path) as book:
+            nav = ET.fromstring(book.read('OEBPS/nav.xhtml'))
+        links = nav.findall(f'.//{XHTML}a')
+        assert [link.text for link in links] == [f'第{number}章 测试' for number in range(1, 21)]
+
+
+def test_export_book_after_download(make_downloader, tmp_path):
+    save_path = str(tmp_path / 'book')
+    downloader = make_downloader()
+    assert downloader.download_novel(NOVEL_URLS['qidian'], save_path, end_chapter=3) == [True] * 3
+    output = str(tmp_path / 'book.txt')
+    assert export_book(save_path, output, title='书名', author='作者') == {'chapters': 3, 'skipped': 0}
+    with open(output, encoding='utf-8') as f:
+        text = f.read()
+    assert text.startswith('书名\n作者：作者\n\n第1章 测试\n\n')
+    assert text.index('第2章 测试') < text.index('第3章 测试')
@@ -0,0 +1,139 @@
+import sys
+import threading
+import types
+
+import pytest
+
+from log_sink import LogBuffer
+
+
+def spilled(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+def test_stream_joins_partial_writes():
+    buffer = LogBuffer()
+    stream = buffer.stream()
+    stream.write('下载')
+    stream.write('章节')
+    assert buffer.lines() == []
+    assert stream.write('完成\n第二行\n未完') == len('完成\n第二行\n未完')
+    assert buffer.lines() == [('stdout', '下载章节完成'), ('stdout', '第二行')]
+    stream.write('的行\n')
+    assert buffer.lines()[-1] == ('stdout', '未完的行')
+    assert stream.write('') == 0
+
+
+@pytest.mark.parametrize('writes', [
+    ['第一行\r\n第二行\r\n'],
+    ['第一行\r', '\n第二行\r', '\n'],
+    ['第一行', '\r\n', '第二行\r\n'],
+])
+def test_stream_strips_crlf_even_when_split_across_writes(writes):
+    buffer = LogBuffer()
+    stream = buffer.stream('stderr')
+    for text in writes:
+        stream.write(text)
+    assert buffer.lines() == [('stderr', '第一行'), ('stderr', '第二行')]
+
+
+def test_stream_keeps_last_segment_of_carriage_return_updates():
+    buffer = LogBuffer()
+    stream = buffer.stream()
+    # tqdm 用回车原地刷新进度条
+    stream.write('下载: 10%\r下载: 50%')
+    stream.write('\r下载: 100%\r\n')
+    stream.write('\r完成\n')
+    assert buffer.lines() == [('stdout', '下载: 100%'), ('stdout', '完成')]
+
+
+def test_concurrent_writers_keep_whole_lines():
+    buffer = LogBuffer(max_lines=10000)
+    stream = buffer.stream()
+
+    def writer(name):
+        for number in range(500):
+            stream.write(f'{name}-{number}\n')
+
+    threads = [threading.Thread(target=writer, args=(name,)) for name in 'abcd']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    lines = [line for _, line in buffer.lines()]
+    assert len(lines) == 2000
+    assert sorted(lines) == sorted(f'{name}-{number}' for name in 'abcd' for number in range(500))
+
+
+def test_drain_returns_new_lines_and_counts_skipped():
+    buffer = LogBuffer(max_lines=3)
+    buffer.append('status', '开始')
+    assert buffer.drain() == ([('status', '开始')], 0)
+    assert buffer.drain() == ([], 0)
+    buffer.extend('stdout', [f'行{number}' for number in range(5)])
+    lines, dropped = buffer.drain()
+    assert lines == [('stdout', '行2'), ('stdout', '行3'), ('stdout', '行4')]
+    assert dropped == 2
+    assert buffer.drain() == ([], 0)
+
+
+def test_evicted_lines_spill_to_file_and_close_writes_the_rest(tmp_path):
+    path = str(tmp_path / 'logs' / 'downloader.log')
+    buffer = LogBuffer(max_lines=3, spill_path=path)
+    buffer.extend('stdout', [f'行{number}' for number in range(5)])
+    assert buffer.lines() == [('stdout', '行2'), ('stdout', '行3'), ('stdout', '行4')]
+    assert spilled(path) == ['[stdout] 行0', '[stdout] 行1']
+    buffer.append('status', '完成')
+    buffer.close()
+    assert spilled(path) == ['[stdout] 行0', '[stdout] 行1', '[stdout] 行2', '[stdout] 行3', '[stdout] 行4',
+                             '[status] 完成']
+    # 关闭后再次关闭不报错，也不重复写入
+    buffer.close()
+    assert len(spilled(path)) == 6
+
+
+def test_spill_file_rotates_by_size(tmp_path):
+    path = tmp_path / 'downloader.log'
+    buffer = LogBuffer(max_lines=1, spill_path=str(path), spill_bytes=200, spill_backups=2)
+    buffer.extend('stdout', [f'第{number:03d}行 ' + 'x' * 40 for number in range(40)])
+    buffer.close()
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert files == ['downloader.log', 'downloader.log.1', 'downloader.log.2']
+    assert all(p.stat().st_size <= 200 for p in tmp_path.iterdir())
+    # 最新的行在当前文件末尾
+    assert spilled(path)[-1].startswith('[stdout] 第039行')
+
+
+def test_buffer_without_spill_discards_evicted_lines():
+    buffer = LogBuffer(max_lines=2)
+    buffer.extend('stdout', ['一', '二', '三'])
+    buffer.close()
+    assert buffer.lines() == [('stdout', '二'), ('stdout', '三')]
+
+
+def test_gui_close_stops_download_and_releases_resources(tmp_path, monkeypatch):
+    from downloader_gui import NovelDownloaderGUI
+    from nihao import CancelToken
+
+    calls = []
+    buffer = LogBuffer(max_lines=10, spill_path=str(tmp_path / 'downloader.log'))
+    saved = (sys.stdout, sys.stderr)
+    monkeypatch.setattr(sys, 'stdout', buffer.stream('stdout'))
+    monkeypatch.setattr(sys, 'stderr', buffer.stream('stderr'))
+    print('下载中的日志')
+    gui = types.SimpleNamespace(
+        cancel_token=CancelToken(),
+        download_thread=threading.Thread(target=lambda: None),
+        downloader=types.SimpleNamespace(close=lambda: calls.append('downloader')),
+        log_buffer=buffer,
+        root=types.SimpleNamespace(destroy=lambda: calls.append('destroy')),
+        _saved_streams=saved,
+        CLOSE_TIMEOUT=NovelDownloaderGUI.CLOSE_TIMEOUT
+    )
+    gui.download_thread.start()
+    NovelDownloaderGUI._on_close(gui)
+    assert gui.cancel_token.cancelled
+    assert calls == ['downloader', 'destroy']
+    assert (sys.stdout, sys.stderr) == saved
+    assert spilled(tmp_path / 'downloader.log') == ['[stdout] 下载中的日志']
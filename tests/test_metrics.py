@@ -0,0 +1,107 @@
+import io
+import json
+
+import pytest
+
+from metrics import Histogram, Metrics
+from mock_site import NOVEL_URLS
+
+
+def test_histogram_bucket_bounds_are_inclusive():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 1.0, 1.5, 7.0):
+        histogram.observe(value)
+    # 等于上界的值落在该桶（Prometheus 的 le 语义），超过最后一个上界的落在 +Inf
+    assert histogram.counts == [2, 2, 2]
+    assert histogram.count == 6
+    assert histogram.sum == pytest.approx(10.15)
+    snapshot = histogram.snapshot()
+    assert snapshot['buckets'] == {'0.1': 2, '1.0': 2, '+Inf': 2}
+    assert snapshot['p50'] == 1.0
+    assert snapshot['p99'] == float('inf')
+
+
+def test_histogram_quantile():
+    histogram = Histogram(buckets=(0.1, 1.0, 10.0))
+    assert histogram.quantile(0.5) == 0.0
+    for _ in range(90):
+        histogram.observe(0.05)
+    for _ in range(10):
+        histogram.observe(5.0)
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.9) == 0.1
+    assert histogram.quantile(0.95) == 10.0
+
+
+def make_metrics():
+    metrics = Metrics(keep_spans=True, buckets=(0.1, 1.0))
+    metrics.inc('retries')
+    metrics.inc('bytes_downloaded', 2048)
+    metrics.observe('fetch', 0.05, {'index': 1, 'title': '第1章'})
+    metrics.observe('fetch', 0.5, {'index': 2, 'title': '第2章'})
+    metrics.observe('write', 2.0)
+    return metrics
+
+
+def test_prometheus_text_has_cumulative_buckets():
+    lines = make_metrics().prometheus_text().splitlines()
+    assert lines[:4] == [
+        '# TYPE novel_downloader_bytes_downloaded_total counter',
+        'novel_downloader_bytes_downloaded_total 2048',
+        '# TYPE novel_downloader_retries_total counter',
+        'novel_downloader_retries_total 1',
+    ]
+    assert lines.count('# TYPE novel_downloader_phase_seconds histogram') == 1
+    assert lines[5:] == [
+        'novel_downloader_phase_seconds_bucket{phase="fetch",le="0.1"} 1',
+        'novel_downloader_phase_seconds_bucket{phase="fetch",le="1.0"} 2',
+        'novel_downloader_phase_seconds_bucket{phase="fetch",le="+Inf"} 2',
+        'novel_downloader_phase_seconds_sum{phase="fetch"} 0.55',
+        'novel_downloader_phase_seconds_count{phase="fetch"} 2',
+        'novel_downloader_phase_seconds_bucket{phase="write",le="0.1"} 0',
+        'novel_downloader_phase_seconds_bucket{phase="write",le="1.0"} 0',
+        'novel_downloader_phase_seconds_bucket{phase="write",le="+Inf"} 1',
+        'novel_downloader_phase_seconds_sum{phase="write"} 2.0',
+        'novel_downloader_phase_seconds_count{phase="write"} 1',
+    ]
+
+
+def test_prometheus_text_without_data():
+    assert Metrics().prometheus_text() == '\n'
+
+
+def test_json_lines_export():
+    fp = io.StringIO()
+    make_metrics().write_json_lines(fp)
+    records = [json.loads(line) for line in fp.getvalue().splitlines()]
+    assert [record['type'] for record in records] == ['span', 'span', 'span', 'summary']
+    assert records[0]['phase'] == 'fetch'
+    assert records[0]['chapter'] == 1
+    assert records[0]['title'] == '第1章'
+    assert records[2]['chapter'] is None
+    summary = records[-1]
+    assert summary['counters'] == {'retries': 1, 'bytes_downloaded': 2048}
+    assert summary['phases']['fetch']['count'] == 2
+    assert summary['phases']['write']['buckets'] == {'0.1': 0, '1.0': 0, '+Inf': 1}
+
+
+def test_span_buffer_is_bounded_and_optional():
+    metrics = Metrics(keep_spans=True, max_spans=2)
+    for index in range(5):
+        metrics.observe('parse', 0.01, {'index': index})
+    assert [span['chapter'] for span in metrics.spans] == [3, 4]
+    metrics = Metrics()
+    metrics.observe('parse', 0.01)
+    fp = io.StringIO()
+    metrics.write_json_lines(fp)
+    assert len(fp.getvalue().splitlines()) == 1
+
+
+@pytest.mark.parametrize('engine', ['requests', 'async'])
+def test_download_records_every_chapter_phase(make_downloader, tmp_path, engine):
+    metrics = Metrics()
+    downloader = make_downloader(engine, metrics=metrics)
+    assert downloader.download_novel(NOVEL_URLS['qidian'], str(tmp_path / 'book')) == [True] * 20
+    phases = metrics.snapshot()['phases']
+    for phase in ('ttfb', 'fetch', 'parse', 'clean', 'write'):
+        assert phases[phase]['count'] == 20, phase
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from paged_reader import PagedNovelReader
+from 小说阅读器 import NovelCleaner, NovelSearcher, StorageManager
+
+
+def novel_text(chapters):
+    return '书名\n\n' + ''.join(
+        f'第{number}章 标题{number}\n' + ''.join(f'正文{number}-{line}，填充页面的内容。\n' for line in range(20))
+        for number in chapters
+    )
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = StorageManager(str(tmp_path / 'storage'))
+    storage.save_novel('作者', '书名', novel_text(range(1, 7)))
+    yield storage
+    storage.close()
+
+
+def all_text(reader):
+    return ''.join(reader.page(number) for number in range(reader.page_count))
+
+
+def test_delete_chapters_compacts_file_and_index(storage):
+    path = storage.get_novel_path('作者', '书名')
+    cleaner = NovelCleaner(storage=storage)
+    reader = storage.open_reader('作者', '书名', page_bytes=256)
+    assert all_text(reader) == novel_text(range(1, 7))
+
+    removed = cleaner.delete_chapters(path, ['标题2', '第5章 标题5', 3])
+    assert removed == ['第2章 标题2', '第3章 标题3', '第5章 标题5']
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == novel_text([1, 4, 6])
+
+    # 缓存的阅读器已被关闭，重新打开读到的是压缩后的内容
+    reopened = storage.open_reader('作者', '书名', page_bytes=256)
+    assert reopened is not reader
+    assert all_text(reopened) == novel_text([1, 4, 6])
+    assert [title for title, _ in reopened.chapters] == ['（前言）', '第1章 标题1', '第4章 标题4', '第6章 标题6']
+
+    # 原地更新的分页索引与重新扫描的结果相同
+    pages, chapters = reopened.pages.tolist(), reopened.chapters
+    storage.release_reader(path)
+    os.remove(str(path) + PagedNovelReader.INDEX_SUFFIX)
+    with PagedNovelReader(path, page_bytes=256) as rebuilt:
+        assert rebuilt.pages.tolist() == pages
+        assert rebuilt.chapters == chapters
+
+
+def test_deleting_unknown_chapters_leaves_file_untouched(storage):
+    path = storage.get_novel_path('作者', '书名')
+    before = os.stat(path).st_mtime_ns
+    assert NovelCleaner(storage=storage).delete_chapters(path, ['不存在的章节']) == []
+    assert os.stat(path).st_mtime_ns == before
+    assert NovelCleaner().delete_chapters(str(path) + '.missing', ['标题1']) == []
+
+
+def test_delete_chapters_removes_search_entries(tmp_path):
+    searcher = NovelSearcher(str(tmp_path / 'novels.db'))
+    storage = StorageManager(str(tmp_path / 'storage'), backend='packed', searcher=searcher)
+    try:
+        for number in range(1, 4):
+            storage.save_chapter('作者', '书名', number, f'第{number}章 标题{number}', f'章节{number}独有的关键词甲乙{number}')
+        storage.save_novel('作者', '书名', novel_text(range(1, 4)))
+        path = storage.get_novel_path('作者', '书名')
+        NovelCleaner(searcher=searcher, storage=storage).delete_chapters(path, ['标题2'])
+        assert [result['chapter'] for result in searcher.search('甲乙')] == ['第1章 标题1', '第3章 标题3']
+        # 词条确实撤下，而不只是文档被删除
+        query = searcher.segmenter.match_query('甲乙')
+        assert searcher.conn.execute(
+            'SELECT count(*) FROM search_fts WHERE search_fts MATCH ?', (query,)
+        ).fetchone()[0] == 2
+    finally:
+        storage.close()
+        searcher.close()
+
+
+def test_delete_novel_releases_reader_and_index(storage):
+    path = storage.get_novel_path('作者', '书名')
+    storage.open_reader('作者', '书名')
+    assert os.path.exists(str(path) + PagedNovelReader.INDEX_SUFFIX)
+    assert NovelCleaner(storage=storage).delete_novel(path)
+    assert not os.path.exists(path)
+    assert not os.path.exists(str(path) + PagedNovelReader.INDEX_SUFFIX)
+    assert storage._readers == {}
+    assert not NovelCleaner().delete_novel(path)
+
+
+def test_save_novel_replaces_cached_reader(storage):
+    reader = storage.open_reader('作者', '书名')
+    storage.save_novel('作者', '书名', novel_text([9]))
+    reopened = storage.open_reader('作者', '书名')
+    assert reopened is not reader
+    assert all_text(reopened) == novel_text([9])
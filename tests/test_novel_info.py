@@ -0,0 +1,101 @@
+from datetime import datetime
+
+import pytest
+
+from 小说阅读器 import NovelInfo, NovelInfoManager, prefix_upper_bound
+
+
+def novel(title, author='作者', chapter_count=10):
+    return NovelInfo(title, author, chapter_count, chapter_count * 3000, datetime(2024, 5, 1, 12, 0), f'{title}.txt')
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = NovelInfoManager(str(tmp_path / 'novels.db'))
+    yield manager
+    manager.close()
+
+
+def titles(novels):
+    return [novel.title for novel in novels]
+
+
+def like_titles(manager, prefix):
+    """同样的前缀用 LIKE 查询（区分大小写、转义通配符）的结果"""
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    manager.conn.execute('PRAGMA case_sensitive_like = ON')
+    try:
+        rows = manager.conn.execute(
+            "SELECT title FROM novel_info WHERE title LIKE ? ESCAPE '\\' ORDER BY title", (escaped + '%',)
+        ).fetchall()
+    finally:
+        manager.conn.execute('PRAGMA case_sensitive_like = OFF')
+    return [row[0] for row in rows]
+
+
+def test_database_uses_wal(manager):
+    assert manager.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_add_novels_upserts_in_one_batch(manager):
+    assert manager.add_novels([novel('斗破苍穹'), novel('遮天', '辰东'), novel('斗罗大陆', '唐家三少')]) == 3
+    assert manager.add_novels([novel('遮天', '辰东', chapter_count=20), novel('遮天', '另一位作者')]) == 2
+    rows = manager.search_by_title('遮天')
+    assert sorted((info.author, info.chapter_count) for info in rows) == [('另一位作者', 10), ('辰东', 20)]
+    assert rows[0].update_time == datetime(2024, 5, 1, 12, 0)
+    assert manager.conn.execute('SELECT count(*) FROM novel_info').fetchone()[0] == 4
+
+
+def test_prefix_search_by_title_and_author(manager):
+    manager.add_novels([novel('斗破苍穹', '天蚕土豆'), novel('斗罗大陆', '唐家三少'),
+                        novel('武动乾坤', '天蚕土豆'), novel('斗'), novel('斗破')])
+    assert titles(manager.search_by_title('斗破', prefix=True)) == ['斗破', '斗破苍穹']
+    assert titles(manager.search_by_title('斗', prefix=True)) == ['斗', '斗破', '斗破苍穹', '斗罗大陆']
+    assert sorted(titles(manager.search_by_author('天蚕', prefix=True))) == ['斗破苍穹', '武动乾坤']
+    assert manager.search_by_title('', prefix=True) == []
+
+
+@pytest.mark.parametrize('prefix, upper', [
+    ('abc', 'abd'),
+    ('斗破', '斗砵'),
+    ('a\uffff', 'a\U00010000'),
+    ('a\ud7ff', 'a\ue000'),
+    ('a\U0010ffff', 'b'),
+    ('a\U0010ffff\U0010ffff', 'b'),
+    ('\U0010ffff', None),
+])
+def test_prefix_upper_bound(prefix, upper):
+    assert prefix_upper_bound(prefix) == upper
+
+
+@pytest.mark.parametrize('prefix', [
+    '斗', '斗破', '𠀀', 'A', 'a_b', '100%', 'x\uffff', 'x\ud7ff', 'x\U0010ffff', '\U0010ffff',
+])
+def test_prefix_range_returns_same_rows_as_like(manager, prefix):
+    stored = ['斗', '斗破', '斗破苍穹', '斗罗', '斗砵', '𠀀', '𠀀𠀁', '𠀁', 'A', 'Ab', 'a', 'a_b', 'axb', 'a_bc',
+              '100', '100%', '100%x', '1000', 'x', 'x\uffff', 'x\uffffy', 'x\U00010000', 'x\ud7ff', 'x\ud7ffz',
+              'x\ue000', 'x\U0010ffff', 'x\U0010ffff\U0010ffff', 'y', '\U0010ffff', '\U0010ffff!']
+    manager.add_novels([novel(title) for title in stored])
+    expected = like_titles(manager, prefix)
+    assert expected == sorted(title for title in stored if title.startswith(prefix))
+    assert titles(manager.search_by_title(prefix, prefix=True)) == expected
+
+
+@pytest.mark.parametrize('column, index', [
+    ('title', 'sqlite_autoindex_novel_info_1'),
+    ('author', 'idx_novel_info_author'),
+])
+@pytest.mark.parametrize('value', ['斗破', 'x\U0010ffff', '\U0010ffff'])
+def test_prefix_query_plan_uses_index(manager, column, index, value):
+    statements = []
+    manager.conn.set_trace_callback(statements.append)
+    try:
+        manager._lookup(column, value, prefix=True)
+    finally:
+        manager.conn.set_trace_callback(None)
+    (query,) = [statement for statement in statements if statement.lstrip().startswith('SELECT')]
+    details = ' '.join(row[-1] for row in manager.conn.execute('EXPLAIN QUERY PLAN ' + query))
+    assert f'USING INDEX {index}' in details
+    assert 'SCAN novel_info' not in details
+    # 索引已按该列排序，ORDER BY 不需要临时排序
+    assert 'TEMP B-TREE' not in details
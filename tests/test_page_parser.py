@@ -0,0 +1,80 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from mock_site import MockSite, page
+from page_parser import (DEFAULT_PARSER, charset_from_content_type, parse_chapter_content, parse_chapter_list,
+                         parse_novel_info)
+
+QIDIAN_CHAPTER = 'https://vipreader.qidian.com/chapter/1001/3'
+JJWXC_CHAPTER = 'https://www.jjwxc.net/onebook.php?novelid=2002&chapterid=3'
+
+
+def baseline_chapter_content(chapter_url, html):
+    """原来的实现：html.parser 建完整的文档树，不加 SoupStrainer"""
+    soup = BeautifulSoup(html, 'html.parser')
+    if 'qidian.com' in chapter_url:
+        content_div = soup.find('div', class_='read-content j_readContent')
+        if not content_div:
+            return None
+        return '\n'.join([p.text.strip() for p in content_div.find_all('p') if p.text.strip()])
+    content_div = soup.find('div', id='content')
+    if not content_div:
+        return None
+    chapter_content = content_div.text.strip()
+    chapter_content = chapter_content.replace('晋江文学城', '').replace('www.jjwxc.net', '').strip()
+    return '\n'.join([line.strip() for line in chapter_content.splitlines() if line.strip()])
+
+
+def test_default_parser_is_html_parser():
+    assert DEFAULT_PARSER == 'html.parser'
+
+
+@pytest.mark.parametrize('chapter_url, body', [
+    # 没有闭合的 <p>：html.parser 把后面的段落嵌套进前一段
+    (QIDIAN_CHAPTER, '<div class="read-content j_readContent"><p>a<p>b<p>c</div>'),
+    # <p> 中的块级元素
+    (QIDIAN_CHAPTER, '<div class="read-content j_readContent"><p>a<div>x</div>b</p></div>'),
+    (QIDIAN_CHAPTER, '<div class="read-content j_readContent"><p>　　第一段</p><p> </p><p>第二段<br>续</p></div>'),
+    (QIDIAN_CHAPTER, '<div class="read-content">缺少 j_readContent</div>'),
+    (JJWXC_CHAPTER, '<div id="content">第一行<br>第二行<br><font>晋江文学城</font>www.jjwxc.net<br>第三行</div>'),
+    (JJWXC_CHAPTER, '<div id="content">没有闭合<div>嵌套<br>内容</div>'),
+    (JJWXC_CHAPTER, '<div id="other">没有正文</div>'),
+])
+def test_chapter_content_matches_baseline(chapter_url, body):
+    html = page(body)
+    assert parse_chapter_content(chapter_url, html) == baseline_chapter_content(chapter_url, html)
+
+
+def test_broken_markup_keeps_html_parser_output():
+    html = page('<div class="read-content j_readContent"><p>a<p>b<p>c</div>')
+    assert parse_chapter_content(QIDIAN_CHAPTER, html) == 'abc\nbc\nc'
+    html = page('<div class="read-content j_readContent"><p>a<div>x</div>b</p></div>')
+    assert parse_chapter_content(QIDIAN_CHAPTER, html) == 'axb'
+
+
+@pytest.mark.parametrize('host, path, query, chapter_url', [
+    ('vipreader.qidian.com', '/chapter/1001/5', '', 'https://vipreader.qidian.com/chapter/1001/5'),
+    ('www.jjwxc.net', '/onebook.php', 'novelid=2002&chapterid=5', 'https://www.jjwxc.net/onebook.php?novelid=2002&chapterid=5'),
+])
+def test_mock_site_chapters_match_baseline_from_bytes(host, path, query, chapter_url):
+    content_type, body = MockSite(10).render(host, path, query)
+    encoding = charset_from_content_type(content_type)
+    assert parse_chapter_content(chapter_url, body, encoding) == baseline_chapter_content(chapter_url, body.decode(encoding))
+
+
+def test_mock_site_info_and_catalog():
+    site = MockSite(250)
+    _, qidian = site.render('book.qidian.com', '/info/1001', '')
+    assert parse_novel_info('https://book.qidian.com/info/1001', qidian, 'utf-8') == {
+        'title': '基准测试之书', 'author': '基准作者', 'url': 'https://book.qidian.com/info/1001'
+    }
+    chapters = parse_chapter_list('https://book.qidian.com/info/1001', qidian, 'utf-8')
+    assert len(chapters) == 250
+    assert chapters[120]['url'] == 'https://vipreader.qidian.com/chapter/1001/121'
+
+    _, jjwxc = site.render('www.jjwxc.net', '/onebook.php', 'novelid=2002')
+    chapters = parse_chapter_list('https://www.jjwxc.net/book/2002.html', jjwxc, 'gbk')
+    assert chapters.to_dicts()[:2] == [
+        {'title': '第1章 测试', 'url': 'https://www.jjwxc.net/onebook.php?novelid=2002&chapterid=1'},
+        {'title': '第2章 测试', 'url': 'https://www.jjwxc.net/onebook.php?novelid=2002&chapterid=2'}
+    ]
@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+from paged_reader import PagedNovelReader
+
+
+def write_novel(path, chapters=5, lines=30, preface='书名\n简介\n\n'):
+    parts = [preface]
+    for number in range(1, chapters + 1):
+        parts.append(f'第{number}章 标题{number}\n')
+        parts.extend(f'正文{number}-{line}，内容用来填充页面。\n' for line in range(lines))
+    text = ''.join(parts)
+    path.write_text(text, encoding='utf-8')
+    return text
+
+
+@pytest.fixture
+def novel(tmp_path):
+    path = tmp_path / '书名.txt'
+    text = write_novel(path)
+    return path, text
+
+
+def test_pages_cover_the_file_and_respect_page_size(novel):
+    path, text = novel
+    with PagedNovelReader(path, page_bytes=512) as reader:
+        assert ''.join(reader.page(number) for number in range(reader.page_count)) == text
+        sizes = [len(reader.page(number).encode('utf-8')) for number in range(reader.page_count)]
+        assert max(sizes) <= 512
+        # 尽量在换行处分页
+        assert all(reader.page(number).endswith('\n') for number in range(reader.page_count))
+        assert [title for title, _ in reader.chapters] == ['（前言）'] + [f'第{n}章 标题{n}' for n in range(1, 6)]
+        for chapter_no, (title, first) in enumerate(reader.chapters):
+            # 章节总是从新的一页开始
+            assert reader.page(first).startswith(title if chapter_no else '书名')
+            assert reader.chapter_of(first) == chapter_no
+            start, end = reader.chapter_range(chapter_no)
+            last = reader.chapter_of(reader.page_count - 1) == chapter_no
+            assert start == reader.pages[first]
+            assert end == (os.path.getsize(path) if last else reader.pages[reader.chapter_page(chapter_no + 1)])
+        with pytest.raises(IndexError):
+            reader.page(reader.page_count)
+
+
+def test_long_paragraph_is_cut_on_character_boundary(tmp_path):
+    path = tmp_path / 'long.txt'
+    text = '第1章 长段落\n' + '汉' * 1000 + '\n'
+    path.write_text(text, encoding='utf-8')
+    with PagedNovelReader(path, page_bytes=100) as reader:
+        pages = [reader.page(number) for number in range(reader.page_count)]
+    assert ''.join(pages) == text
+    assert '�' not in ''.join(pages)
+
+
+def test_index_is_reused_on_reopen(novel, monkeypatch):
+    path, _ = novel
+    with PagedNovelReader(path, page_bytes=512) as reader:
+        pages, chapters = reader.pages.tolist(), reader.chapters
+    assert os.path.exists(str(path) + PagedNovelReader.INDEX_SUFFIX)
+
+    def fail(self):
+        raise AssertionError('索引未变时不应重新扫描')
+
+    monkeypatch.setattr(PagedNovelReader, '_build_index', fail)
+    with PagedNovelReader(path, page_bytes=512) as reader:
+        assert reader.pages.tolist() == pages
+        assert reader.chapters == chapters
+
+
+@pytest.mark.parametrize('change', ['content', 'page_bytes', 'corrupt', 'version'])
+def test_index_is_rebuilt_when_stale(novel, change, monkeypatch):
+    path, _ = novel
+    index_path = str(path) + PagedNovelReader.INDEX_SUFFIX
+    with PagedNovelReader(path, page_bytes=512):
+        pass
+    page_bytes = 512
+    if change == 'content':
+        text = write_novel(path, chapters=3)
+    elif change == 'page_bytes':
+        page_bytes = 256
+    elif change == 'corrupt':
+        with open(index_path, 'w', encoding='utf-8') as f:
+            f.write('{"version": 1, "pages": [')
+    else:
+        monkeypatch.setattr('paged_reader.INDEX_VERSION', 2)
+
+    builds = []
+    build_index = PagedNovelReader._build_index
+    monkeypatch.setattr(PagedNovelReader, '_build_index', lambda self: builds.append(1) or build_index(self))
+    with PagedNovelReader(path, page_bytes=page_bytes) as reader:
+        assert builds == [1]
+        assert max(len(reader.page(n).encode('utf-8')) for n in range(reader.page_count)) <= page_bytes
+        if change == 'content':
+            assert ''.join(reader.page(n) for n in range(reader.page_count)) == text
+            assert len(reader.chapters) == 4
+    # 重建后的索引写回文件，再次打开直接使用
+    with PagedNovelReader(path, page_bytes=page_bytes):
+        assert builds == [1]
+
+
+def test_page_cache_is_bounded_and_prefetches_neighbours(novel):
+    path, _ = novel
+    with PagedNovelReader(path, page_bytes=256, prefetch=1, cache_pages=4) as reader:
+        assert reader.page_count > 10
+        reader.page(5)
+        assert list(reader._cache) == [4, 6, 5]
+        for number in range(reader.page_count):
+            reader.page(number)
+            assert len(reader._cache) <= 4
+        assert list(reader._cache)[-1] == reader.page_count - 1
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / 'empty.txt'
+    path.write_text('', encoding='utf-8')
+    with PagedNovelReader(path) as reader:
+        assert reader.page_count == 0
+        assert len(reader) == 0
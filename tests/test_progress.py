@@ -0,0 +1,211 @@
+import threading
+
+import pytest
+
+from progress import ProgressAggregator
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeTimer:
+    """代替 threading.Timer，由 FakeTimers.run_due() 或测试手动触发"""
+
+    def __init__(self, due, interval, function):
+        self.due = due
+        self.interval = interval
+        self.function = function
+        self.daemon = False
+        self.started = False
+        self.cancelled = False
+
+    def start(self):
+        self.started = True
+
+    def cancel(self):
+        self.cancelled = True
+
+    def fire(self):
+        assert self.started and not self.cancelled
+        self.function()
+
+
+class FakeTimers(list):
+    """定时器工厂：按假时钟记录每个定时器的到期时间"""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def __call__(self, interval, function):
+        timer = FakeTimer(self.clock.now + interval, interval, function)
+        self.append(timer)
+        return timer
+
+    def run_due(self):
+        for timer in list(self):
+            if timer.started and not timer.cancelled and not getattr(timer, 'fired', False) \
+                    and self.clock.now >= timer.due:
+                timer.fired = True
+                timer.fire()
+
+
+class RecordingBar:
+    def __init__(self):
+        self.n = 0
+        self.postfix = None
+
+    def update(self, delta):
+        self.n += delta
+
+    def set_postfix_str(self, postfix):
+        self.postfix = postfix
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def timers(clock):
+    return FakeTimers(clock)
+
+
+@pytest.fixture
+def make(clock, timers):
+    def make(total=100, **kwargs):
+        calls = []
+        progress = ProgressAggregator(total, lambda percent, title: calls.append((percent, title)),
+                                      clock=clock, timer=timers, **kwargs)
+        return progress, calls
+    return make
+
+
+def test_first_chapter_is_shown_immediately(make, clock, timers):
+    progress, calls = make()
+    progress.advance('第1章')
+    assert calls == [(1.0, '第1章')]
+    assert timers == []
+
+
+def test_updates_within_interval_are_coalesced(make, clock, timers):
+    progress, calls = make()
+    progress.advance('第1章')
+    for number in range(2, 50):
+        clock.advance(0.001)
+        progress.advance(f'第{number}章')
+    # 100ms 内的 48 次更新只排一个定时器（第 2 章时排下，在间隔结束时到期），不回调
+    assert calls == [(1.0, '第1章')]
+    assert len(timers) == 1
+    assert timers[0].interval == pytest.approx(0.099)
+    assert timers[0].daemon
+
+    clock.advance(0.052)
+    timers[0].fire()
+    assert calls[-1] == (49.0, '第49章')
+    assert len(calls) == 2
+
+
+def test_rate_is_at_most_ten_per_second(make, clock, timers):
+    progress, calls = make(total=1000)
+    # 1000 章均匀地在 1 秒内完成
+    for number in range(1, 1001):
+        progress.advance(f'第{number}章')
+        clock.advance(0.001)
+        timers.run_due()
+    progress.close()
+    assert 10 <= len(calls) <= 12
+    assert calls[-1] == (100.0, '第1000章')
+    percents = [percent for percent, _ in calls]
+    assert percents == sorted(percents)
+
+
+def test_trailing_timer_is_not_rescheduled_until_fired(make, clock, timers):
+    progress, calls = make()
+    progress.advance('第1章')
+    clock.advance(0.02)
+    progress.advance('第2章')
+    clock.advance(0.02)
+    progress.advance('第3章')
+    assert len(timers) == 1
+    clock.advance(0.06)
+    timers[0].fire()
+    assert calls == [(1.0, '第1章'), (3.0, '第3章')]
+    # 定时器补发后重新计时：间隔内的下一次更新再排一个定时器
+    clock.advance(0.01)
+    progress.advance('第4章')
+    assert len(calls) == 2
+    assert len(timers) == 2
+    assert timers[1].interval == pytest.approx(0.09)
+
+
+def test_timer_flush_without_new_progress_does_not_call_back(make, clock, timers):
+    progress, calls = make()
+    progress.advance('第1章')
+    clock.advance(0.05)
+    progress.advance('第2章')
+    progress.close()
+    assert calls == [(1.0, '第1章'), (2.0, '第2章')]
+    assert timers[0].cancelled
+    # 已取消的定时器即使仍然触发也不再回调
+    timers[0].function()
+    progress.close()
+    assert len(calls) == 2
+
+
+def test_close_always_delivers_final_state(make, clock, timers):
+    pbar = RecordingBar()
+    progress, calls = make(total=3, pbar=pbar, completed=0, postfix=lambda: '重试 2')
+    progress.advance('第一章 开始')
+    clock.advance(0.01)
+    progress.advance('第二章 继续', failed=True)
+    clock.advance(0.01)
+    progress.advance('第三章 结束')
+    assert calls == [(pytest.approx(100 / 3), '第一章 开始')]
+    progress.close()
+    assert calls[-1] == (100.0, '第三章 结束')
+    assert pbar.n == 3
+    assert pbar.postfix == '当前: 第三章 结束... 重试 2'
+    snapshot = progress.snapshot()
+    assert snapshot['completed'] == 3
+    assert snapshot['failed'] == 1
+    assert snapshot['percent'] == 100.0
+
+
+def test_resumed_download_counts_from_completed(make, clock, timers):
+    pbar = RecordingBar()
+    progress, calls = make(total=10, pbar=pbar, completed=6)
+    clock.advance(2.0)
+    progress.advance('第7章')
+    progress.close()
+    assert calls == [(70.0, '第7章')]
+    # 进度条的初始值由 tqdm(initial=...) 给出，这里只加本次完成的章数
+    assert pbar.n == 1
+    assert progress.snapshot()['chapters_per_second'] == 0.5
+
+
+def test_real_timer_flushes_trailing_update():
+    flushed = threading.Event()
+    calls = []
+
+    def callback(percent, title):
+        calls.append(title)
+        if title == '第2章':
+            flushed.set()
+
+    progress = ProgressAggregator(2, callback, min_interval=0.05)
+    progress.advance('第1章')
+    progress.advance('第2章')
+    assert flushed.wait(2)
+    assert calls == ['第1章', '第2章']
+    progress.close()
+    assert calls == ['第1章', '第2章']
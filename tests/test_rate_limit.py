@@ -0,0 +1,174 @@
+import asyncio
+import random
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from nihao import AsyncNovelDownloader, TransportResponse
+from rate_limit import HostRateLimiter, RetryPolicy, TokenBucket, host_key, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class RecordingRandom:
+    """记录 uniform() 的取值范围，并返回区间上限，便于断言退避上界"""
+
+    def __init__(self):
+        self.calls = []
+
+    def uniform(self, a, b):
+        self.calls.append((a, b))
+        return b
+
+
+class ScriptedTransport:
+    """按顺序返回预先给定的 (状态码, 响应头) 的传输层"""
+
+    retry_errors = ()
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    async def get(self, url, timeout, headers=None):
+        status, response_headers = self.responses.pop(0)
+        return TransportResponse(status, b'', response_headers)
+
+    def status_error(self, url, response):
+        return RuntimeError(f'{response.status} for url: {url}')
+
+
+class RecordingPolicy(RetryPolicy):
+    """记录每次退避的参数，不实际等待"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.backoffs = []
+
+    def backoff(self, attempt, retry_after=None):
+        self.backoffs.append((attempt, retry_after))
+        return 0.0
+
+
+def test_bucket_allows_burst_then_reports_wait():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=clock)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+    # 欠账按速率补回
+    clock.advance(1.0)
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_throttle_halves_rate_then_recovers_additively():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=8.0, capacity=4, min_rate=1.0, max_rate=10.0,
+                         increase_step=0.5, decrease_factor=0.5, clock=clock)
+    bucket.on_throttle()
+    assert bucket.rate == 4.0
+    # 降速时清空积攒的令牌，下一次请求要按新速率等待
+    assert bucket.tokens == 0.0
+    assert bucket.reserve() == pytest.approx(0.25)
+    bucket.on_throttle()
+    bucket.on_throttle()
+    bucket.on_throttle()
+    assert bucket.rate == 1.0
+    for _ in range(4):
+        bucket.on_success()
+    assert bucket.rate == 3.0
+    for _ in range(100):
+        bucket.on_success()
+    assert bucket.rate == 10.0
+    snapshot = bucket.snapshot()
+    assert snapshot['throttled'] == 4
+    assert snapshot['successes'] == 104
+
+
+def test_fetch_response_throttles_on_429_and_503_then_recovers():
+    url = 'https://www.qidian.com/chapter/1001/1'
+    limiter = HostRateLimiter(rate=8.0, capacity=100, increase_step=1.0)
+    policy = RecordingPolicy()
+    transport = ScriptedTransport([(429, {'Retry-After': '5'}), (503, {}), (500, {}), (200, {})])
+    engine = AsyncNovelDownloader(transport=transport, rate_limiter=limiter, retry_policy=policy)
+    response = asyncio.run(engine.fetch_response(url))
+    assert response.status == 200
+    # 429、503 各减半一次，500 只重试不降速，成功后加一
+    snapshot = limiter.snapshot()['qidian.com']
+    assert snapshot['rate'] == 3.0
+    assert snapshot['throttled'] == 2
+    assert snapshot['retries'] == 3
+    assert policy.backoffs == [(1, '5'), (2, None), (3, None)]
+
+
+def test_fetch_response_gives_up_after_max_retries():
+    url = 'https://www.jjwxc.net/onebook.php?novelid=2002&chapterid=1'
+    limiter = HostRateLimiter(rate=8.0, capacity=100, min_rate=1.0)
+    transport = ScriptedTransport([(503, {})] * 3)
+    engine = AsyncNovelDownloader(transport=transport, rate_limiter=limiter,
+                                  retry_policy=RecordingPolicy(max_retries=2))
+    with pytest.raises(RuntimeError):
+        asyncio.run(engine.fetch_response(url))
+    snapshot = limiter.snapshot()['jjwxc.net']
+    assert snapshot['rate'] == 1.0
+    assert snapshot['give_ups'] == 1
+
+
+def test_host_limiter_shares_bucket_per_site():
+    limiter = HostRateLimiter(bucket_options={'jjwxc.net': {'rate': 1.0}}, rate=5.0)
+    assert host_key('https://book.qidian.com/info/1') == 'qidian.com'
+    assert host_key('http://127.0.0.1:8000/x') == '127.0.0.1'
+    assert limiter.bucket('https://book.qidian.com/a') is limiter.bucket('https://www.qidian.com/b')
+    assert limiter.bucket('https://www.jjwxc.net/a').rate == 1.0
+    limiter.on_throttle('https://www.qidian.com/b')
+    assert limiter.snapshot()['qidian.com']['rate'] == 2.5
+
+
+def test_retry_after_delta_seconds():
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after('1.5') == 1.5
+    assert parse_retry_after('-3') == 0.0
+    assert parse_retry_after('') is None
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+
+
+def test_retry_after_http_date():
+    now = datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc).timestamp()
+    assert parse_retry_after('Wed, 01 May 2024 12:00:30 GMT', now) == 30.0
+    # 已经过去的时间不需要等待
+    assert parse_retry_after('Wed, 01 May 2024 11:59:00 GMT', now) == 0.0
+
+
+def test_backoff_honours_retry_after_as_floor_capped_by_max_delay():
+    now = datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc)
+    policy = RetryPolicy(base_delay=1.0, max_delay=30.0, rng=random.Random(1),
+                         clock=lambda: now.timestamp())
+    assert policy.backoff(1, '10') >= 10.0
+    retry_date = format_datetime(now.replace(second=20), usegmt=True)
+    assert 20.0 <= policy.backoff(1, retry_date) <= 30.0
+    assert policy.backoff(1, '3600') == 30.0
+
+
+def test_backoff_uses_full_jitter_within_exponential_bounds():
+    rng = RecordingRandom()
+    policy = RetryPolicy(base_delay=0.5, max_delay=3.0, rng=rng)
+    assert [policy.backoff(attempt) for attempt in range(1, 6)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+    assert rng.calls == [(0, 0.5), (0, 1.0), (0, 2.0), (0, 3.0), (0, 3.0)]
+
+    policy = RetryPolicy(base_delay=0.5, max_delay=3.0, rng=random.Random(7))
+    for attempt in range(1, 6):
+        delays = [policy.backoff(attempt) for _ in range(200)]
+        upper = min(3.0, 0.5 * 2 ** (attempt - 1))
+        assert all(0 <= delay <= upper for delay in delays)
+        # 全抖动：取值分布在整个区间而不是集中在上界
+        assert min(delays) < upper / 4 and max(delays) > upper * 3 / 4
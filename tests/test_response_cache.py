@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import nihao
+from mock_site import NOVEL_URLS
+from response_cache import ResponseCache, cache_key
+
+URL = 'https://book.qidian.com/info/1001'
+
+
+def page_files(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith('.page')) if os.path.isdir(cache_dir) else []
+
+
+def test_cache_key_drops_fragment():
+    assert cache_key(URL + '#Catalog') == URL
+
+
+def test_new_responses_stay_in_memory_until_kept(tmp_path):
+    cache_dir = str(tmp_path / 'pages')
+    cache = ResponseCache(cache_dir)
+    entry = cache.store(URL, 200, {'Content-Type': 'text/html', 'Set-Cookie': 'x'}, b'<html/>')
+    assert entry.headers == {'Content-Type': 'text/html'}
+    assert cache.get(URL + '#Catalog') is entry
+    assert page_files(cache_dir) == []
+    cache.keep(entry)
+    assert len(page_files(cache_dir)) == 1
+
+    # 新的缓存实例（下次启动）从磁盘载入
+    loaded = ResponseCache(cache_dir).get(URL)
+    assert loaded.content == b'<html/>'
+    assert loaded.fresh
+    assert loaded.saved
+
+
+def test_discard_removes_from_memory_and_disk(tmp_path):
+    cache_dir = str(tmp_path / 'pages')
+    cache = ResponseCache(cache_dir)
+    entry = cache.store(URL, 200, {}, b'verify')
+    cache.keep(entry)
+    cache.discard(entry)
+    assert cache.get(URL) is None
+    assert page_files(cache_dir) == []
+    # 已被替换的旧响应不会被 keep 写入磁盘
+    old = cache.store(URL, 200, {}, b'old')
+    cache.store(URL, 200, {}, b'new')
+    cache.keep(old)
+    assert page_files(cache_dir) == []
+
+
+@pytest.mark.parametrize('status, headers, stored', [
+    (200, {}, True),
+    (200, {'Cache-Control': 'no-store'}, False),
+    (404, {}, False),
+    (200, {'Cache-Control': 'max-age=0'}, False),
+    (200, {'Cache-Control': 'max-age=0', 'ETag': '"v1"'}, True),
+    (200, {'Cache-Control': 'no-cache', 'Last-Modified': 'Wed, 01 May 2024 12:00:00 GMT'}, True),
+    (200, {'Expires': '0'}, False),
+])
+def test_what_is_cached(status, headers, stored):
+    cache = ResponseCache(cache_dir=None)
+    entry = cache.store(URL, status, headers, b'body')
+    assert (cache.get(URL) is entry) == stored
+
+
+def test_ttl_from_headers():
+    cache = ResponseCache(cache_dir=None, default_ttl=300)
+    now = time.time()
+    assert cache.store(URL, 200, {}, b'').expires == pytest.approx(now + 300, abs=5)
+    assert cache.store(URL, 200, {'Cache-Control': 'public, max-age=60'}, b'').expires == pytest.approx(now + 60, abs=5)
+    expires = 'Wed, 01 May 2030 12:00:00 GMT'
+    assert cache.store(URL, 200, {'Expires': expires}, b'').expires == datetime(2030, 5, 1, 12, tzinfo=timezone.utc).timestamp()
+    # max-age 优先于 Expires
+    entry = cache.store(URL, 200, {'Cache-Control': 'max-age=10', 'Expires': expires}, b'')
+    assert entry.expires == pytest.approx(now + 10, abs=5)
+    stale = cache.store(URL, 200, {'Cache-Control': 'max-age=0', 'ETag': '"v1"'}, b'')
+    assert not stale.fresh
+    assert stale.validators() == {'If-None-Match': '"v1"'}
+
+
+def test_revalidated_keeps_body_and_parsed_result():
+    cache = ResponseCache(cache_dir=None)
+    entry = cache.store(URL, 200, {'Cache-Control': 'no-cache', 'ETag': '"v1"', 'Content-Type': 'text/html'}, b'body')
+    calls = []
+    assert entry.memoized('info', lambda: calls.append(1) or 'parsed') == 'parsed'
+    same = cache.revalidated(entry, {'Cache-Control': 'max-age=60', 'ETag': '"v2"', 'Content-Type': 'text/plain'})
+    assert same is entry
+    assert entry.fresh
+    assert entry.headers['ETag'] == '"v2"'
+    assert entry.headers['Content-Type'] == 'text/html'
+    assert entry.memoized('info', lambda: calls.append(1) or 'reparsed') == 'parsed'
+    assert calls == [1]
+
+
+def test_memory_is_lru_bounded():
+    cache = ResponseCache(cache_dir=None, max_entries=2)
+    first = cache.store('https://a.com/1', 200, {}, b'1')
+    cache.store('https://a.com/2', 200, {}, b'2')
+    assert cache.get('https://a.com/1') is first
+    cache.store('https://a.com/3', 200, {}, b'3')
+    assert cache.get('https://a.com/2') is None
+    assert cache.get('https://a.com/1') is first
+    assert cache.get('https://a.com/3') is not None
+
+
+def test_disk_is_trimmed_by_least_recent_use(tmp_path):
+    cache_dir = str(tmp_path / 'pages')
+    cache = ResponseCache(cache_dir, max_disk_bytes=3000)
+    for number in range(3):
+        cache.keep(cache.store(f'https://a.com/{number}', 200, {}, b'x' * 1000))
+        path = cache._path(f'https://a.com/{number}')
+        os.utime(path, (number, number))
+    assert len(page_files(cache_dir)) == 2
+    assert not os.path.exists(cache._path('https://a.com/0'))
+    total = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in page_files(cache_dir))
+    assert total <= 3000
+
+
+def test_corrupted_disk_entry_is_ignored(tmp_path):
+    cache_dir = str(tmp_path / 'pages')
+    cache = ResponseCache(cache_dir)
+    cache.keep(cache.store(URL, 200, {}, b'complete body'))
+    path = cache._path(URL)
+    os.truncate(path, os.path.getsize(path) - 3)
+    assert ResponseCache(cache_dir).get(URL) is None
+
+
+@pytest.mark.parametrize('engine', ['requests', 'async'])
+@pytest.mark.parametrize('book', ['qidian', 'jjwxc'])
+def test_each_page_is_fetched_once(make_downloader, tmp_path, engine, book):
+    """GUI 先取信息和目录、download_novel 再取一次：每个不同的页面只请求一次"""
+    downloader = make_downloader(engine)
+    url = NOVEL_URLS[book]
+    assert downloader.get_novel_info(url)['title'] == '基准测试之书'
+    assert len(downloader.get_chapter_list(url)) == 20
+    assert downloader.download_novel(url, str(tmp_path / 'book')) == [True] * 20
+    assert set(downloader.hits.values()) == {1}
+    pages = {hit_url for hit_url in downloader.hits if '/chapter/' not in hit_url and 'chapterid=' not in hit_url}
+    expected = {cache_key(url), cache_key(nihao.catalog_url(url))}
+    assert pages == expected
+    assert len(downloader.hits) == len(expected) + 20
+
+
+@pytest.mark.parametrize('engine', ['requests', 'async'])
+def test_info_and_catalog_are_parsed_off_the_event_loop(make_downloader, monkeypatch, engine):
+    threads = []
+    for name in ('parse_novel_info', 'parse_chapter_list'):
+        original = getattr(nihao, name)
+
+        def record(*args, original=original):
+            threads.append(threading.current_thread().name)
+            return original(*args)
+
+        monkeypatch.setattr(nihao, name, record)
+    downloader = make_downloader(engine)
+    assert downloader.get_novel_info(NOVEL_URLS['jjwxc']) is not None
+    assert downloader.get_chapter_list(NOVEL_URLS['jjwxc'])
+    assert len(threads) == 2
+    assert 'novel-download-loop' not in threads
@@ -0,0 +1,115 @@
+import pytest
+
+from 小说阅读器 import NovelSearcher, StorageManager
+
+
+@pytest.fixture
+def searcher(tmp_path):
+    searcher = NovelSearcher(str(tmp_path / 'novels.db'))
+    yield searcher
+    searcher.close()
+
+
+def titles(results):
+    return [(result['title'], result['chapter']) for result in results]
+
+
+def test_saved_chapters_are_indexed_immediately(searcher, tmp_path):
+    storage = StorageManager(str(tmp_path / 'storage'), searcher=searcher)
+    storage.save_chapter('天蚕土豆', '斗破苍穹', 1, '第一章 陨落的天才', '萧炎在乌坦城修炼斗气')
+    storage.save_chapter('天蚕土豆', '斗破苍穹', 2, '第二章 斗气大陆', '药老藏身戒指之中')
+    storage.close()
+    assert titles(searcher.search('修炼')) == [('斗破苍穹', '第一章 陨落的天才')]
+    # 书名和作者随每一章入库
+    assert searcher.count('斗破') == 2
+    assert searcher.count('天蚕') == 2
+
+
+@pytest.mark.parametrize('backend', ['files', 'packed', 'dedup'])
+def test_rewriting_a_chapter_replaces_its_index_entry(searcher, tmp_path, backend):
+    storage = StorageManager(str(tmp_path / 'storage'), backend=backend, searcher=searcher)
+    storage.save_chapter('作者', '书名', 1, '第一章', '旧的正文提到青莲地心火')
+    storage.save_chapter('作者', '书名', 1, '第一章', '新的正文改成陨落心炎')
+    assert searcher.count('青莲') == 0
+    assert titles(searcher.search('陨落')) == [('书名', '第一章')]
+    # 旧词条确实从索引中撤下，而不只是被过滤
+    assert searcher.conn.execute(
+        'SELECT count(*) FROM search_fts WHERE search_fts MATCH ?', (searcher.segmenter.match_query('青莲'),)
+    ).fetchone()[0] == 0
+    storage.close()
+
+
+def test_chapter_content_is_not_stored_in_the_index(searcher, tmp_path):
+    storage = StorageManager(str(tmp_path / 'storage'), backend='packed', searcher=searcher)
+    assert searcher.storage is storage
+    storage.save_chapter('天蚕土豆', '斗破苍穹', 1, '第一章 陨落的天才', '萧炎在乌坦城修炼斗气')
+    columns = [row[1] for row in searcher.conn.execute('PRAGMA table_info(search_docs)')]
+    assert 'content' not in columns
+    # 摘要按章节号从仓库读取正文
+    assert searcher.search('修炼')[0]['snippet'] == '萧炎在乌坦城【修炼】斗气'
+    storage.close()
+
+
+def test_chapters_missing_from_storage_are_dropped_without_unindexing(searcher):
+    """没有 storage 时读不到正文：文档删除后残留的词条不出现在检索结果和计数中"""
+    searcher.add_chapter('书名', '作者', '第一章', '第一章的正文内容')
+    assert searcher.search('正文')[0]['snippet'] == ''
+    assert searcher.remove_chapter('书名', '作者', '第一章') == 1
+    assert searcher.search('正文') == []
+    assert searcher.count('正文') == 0
+    searcher.add_chapter('书名', '作者', '第二章', '第二章的正文内容')
+    assert titles(searcher.search('正文')) == [('书名', '第二章')]
+
+
+def test_remove_chapters(searcher):
+    searcher.add_chapter('书名', '作者', '第一章', '第一章的正文内容')
+    searcher.add_chapter('书名', '作者', '第二章', '第二章的正文内容')
+    assert searcher.remove_chapters('书名', '作者', ['第一章', '不存在']) == 1
+    assert titles(searcher.search('正文')) == [('书名', '第二章')]
+
+
+def test_novels_table_insert_update_delete_are_synced(searcher):
+    conn = searcher.conn
+    with conn:
+        conn.execute("INSERT INTO novels (title, author, content) VALUES ('遮天', '辰东', '九龙拉棺穿越星空')")
+        conn.execute("INSERT INTO novels (title, author, content) VALUES ('完美世界', '辰东', '石村少年')")
+    assert titles(searcher.search('九龙')) == [('遮天', None)]
+    assert searcher.count('辰东') == 2
+
+    with conn:
+        conn.execute("UPDATE novels SET content = '荒古禁地的石碑' WHERE title = '遮天'")
+    assert searcher.count('九龙') == 0
+    assert titles(searcher.search('石碑')) == [('遮天', None)]
+
+    with conn:
+        conn.execute("DELETE FROM novels WHERE title = '完美世界'")
+    assert searcher.count('石村') == 0
+    assert searcher.count('辰东') == 1
+    # 变更日志处理完即清空
+    assert conn.execute('SELECT count(*) FROM search_changes').fetchone()[0] == 0
+
+
+def test_update_then_delete_before_sync(searcher):
+    """同步前先修改再删除：按最早记录的旧值撤下索引条目"""
+    conn = searcher.conn
+    with conn:
+        conn.execute("INSERT INTO novels (title, author, content) VALUES ('凡人修仙传', '忘语', '韩立入七玄门')")
+    assert searcher.count('韩立') == 1
+    with conn:
+        conn.execute("UPDATE novels SET content = '乱星海历练' WHERE title = '凡人修仙传'")
+        conn.execute("DELETE FROM novels WHERE title = '凡人修仙传'")
+    assert searcher.count('韩立') == 0
+    assert searcher.count('星海') == 0
+    assert searcher.count('忘语') == 0
+
+
+def test_index_survives_reopen(tmp_path):
+    db_path = str(tmp_path / 'novels.db')
+    searcher = NovelSearcher(db_path)
+    searcher.add_chapter('书名', '作者', '第一章', '重新打开后仍能检索')
+    searcher.close()
+    searcher = NovelSearcher(db_path)
+    try:
+        assert titles(searcher.search('检索')) == [('书名', '第一章')]
+    finally:
+        searcher.close()
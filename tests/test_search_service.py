@@ -0,0 +1,144 @@
+import threading
+import time
+
+import requests
+from requests.adapters import BaseAdapter
+
+from search_service import CachedSearch, QidianSpider, TTLCache, normalize_keyword
+
+SEARCH_PAGE = '''<html><body><ul>
+<li class="res-book-item" data-bid="1001"><h3><a href="//book.qidian.com/info/1001">斗破苍穹</a></h3>
+<p class="author"><a class="name">天蚕土豆</a></p></li>
+</ul></body></html>'''
+
+
+class SearchAdapter(BaseAdapter):
+    """替身搜索页：记录请求次数，gate 未放行前阻塞，offline 时抛出连接错误"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.offline = False
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if self.offline:
+            raise requests.ConnectionError('offline')
+        self.gate.wait(5)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = SEARCH_PAGE.encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class LocalIndex:
+    def search(self, keyword):
+        return [{'title': '本地之书', 'author': '本地作者', 'chapter': '第一章'}]
+
+
+def make_spider(fallback=None, cache_ttl=300):
+    spider = QidianSpider(fallback=fallback, cache_ttl=cache_ttl)
+    adapter = SearchAdapter()
+    spider.session.mount('https://', adapter)
+    return spider, adapter
+
+
+def test_normalize_keyword():
+    assert normalize_keyword('  ＤＯＵ   破\t') == 'dou 破'
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(max_entries=2, ttl=0.05)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.put('c', 3)
+    assert cache.get('a') is None
+    assert cache.get('c') == 3
+    time.sleep(0.06)
+    assert cache.get('c') is None
+
+
+def test_spider_parses_results():
+    spider, adapter = make_spider()
+    try:
+        results = spider.search_novel('斗破')
+    finally:
+        spider.close()
+    assert results == [{'id': '1001', 'title': '斗破苍穹', 'author': '天蚕土豆',
+                        'url': 'https://book.qidian.com/info/1001'}]
+
+
+def test_concurrent_searches_are_coalesced():
+    spider, adapter = make_spider()
+    adapter.gate.clear()
+    try:
+        futures = [spider.search_novel_async(keyword) for keyword in ('斗破', ' 斗破 ', '斗破')]
+        assert futures[0] is futures[1] is futures[2]
+        adapter.gate.set()
+        assert all(future.result(5) == futures[0].result() for future in futures)
+        assert adapter.calls == 1
+        # 结果进了缓存：再搜不发请求，返回的 Future 已完成
+        cached = spider.search_novel_async('斗破')
+        assert cached.done()
+        assert adapter.calls == 1
+    finally:
+        spider.close()
+
+
+def test_cached_results_expire():
+    spider, adapter = make_spider(cache_ttl=0.05)
+    try:
+        spider.search_novel('斗破')
+        spider.search_novel('斗破')
+        assert adapter.calls == 1
+        time.sleep(0.06)
+        spider.search_novel('斗破')
+        assert adapter.calls == 2
+    finally:
+        spider.close()
+
+
+def test_offline_search_falls_back_without_caching():
+    spider, adapter = make_spider(fallback=LocalIndex())
+    adapter.offline = True
+    try:
+        results = spider.search_novel('本地')
+        assert results[0]['offline'] and results[0]['title'] == '本地之书'
+        adapter.offline = False
+        assert spider.search_novel('本地')[0]['title'] == '斗破苍穹'
+    finally:
+        spider.close()
+
+
+def test_empty_keyword_does_not_search():
+    spider, adapter = make_spider()
+    try:
+        assert spider.search_novel('   ') == []
+        assert adapter.calls == 0
+    finally:
+        spider.close()
+
+
+def test_search_errors_propagate_without_fallback():
+    def failing(keyword):
+        raise OSError('down')
+
+    search = CachedSearch(failing)
+    try:
+        future = search.submit('x')
+        assert isinstance(future.exception(5), OSError)
+        # 失败的结果不进缓存，在途登记也已清除
+        assert len(search.cache) == 0
+        assert search.submit('x') is not future
+    finally:
+        search.close()
@@ -0,0 +1,14 @@
+import json
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_import_nihao_stays_lazy():
+    """无界面导入下载核心时不加载事件循环、aiohttp 和进程池"""
+    script = ('import json, sys\n'
+              'import nihao\n'
+              'print(json.dumps([name for name in ("asyncio", "aiohttp", "multiprocessing") if name in sys.modules]))')
+    proc = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(proc.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,229 @@
+import os
+
+import pytest
+
+from chapter_store import ChapterCodec, PackedChapterStore, zstandard
+from content_store import DedupChapterStore, dedup_stats, shared_objects_dir
+from mock_site import NOVEL_URLS, chapter_text
+from nihao import open_store
+
+
+def expected_text(number):
+    return '\n'.join(chapter_text(number))
+
+
+@pytest.mark.parametrize('storage', ['files', 'packed', 'dedup'])
+def test_download_into_each_backend(make_downloader, tmp_path, storage):
+    save_path = str(tmp_path / 'book')
+    downloader = make_downloader(max_workers=4)
+    assert downloader.download_novel(NOVEL_URLS['qidian'], save_path, storage=storage) == [True] * 20
+
+    store = open_store(save_path, storage)
+    try:
+        for number in range(1, 21):
+            if store is None:
+                with open(os.path.join(save_path, f'第{number}章 测试.txt'), encoding='utf-8') as f:
+                    content = f.read()
+            else:
+                assert store.get_title(number) == f'第{number}章 测试'
+                content = store.get(number)
+            assert content == expected_text(number)
+    finally:
+        if store is not None:
+            store.close()
+
+    # 再次下载时清单中的章节全部跳过
+    again = make_downloader()
+    assert again.download_novel(NOVEL_URLS['qidian'], save_path, storage=storage) == [True] * 20
+    assert not any('/chapter/' in url for url in again.hits)
+
+
+def test_packed_store_survives_reopen(tmp_path):
+    path = str(tmp_path / 'book')
+    with PackedChapterStore(path) as store:
+        store.append(1, '第一章', '正文一')
+        store.append(2, '第二章', '正文二')
+        store.append(1, '第一章', '改过的正文一')
+    with PackedChapterStore(path) as store:
+        assert len(store) == 2
+        assert store.get(1) == '改过的正文一'
+        assert store.get(2) == '正文二'
+        assert [chapter_no for chapter_no, _, _ in store.iter_chapters()] == [1, 2]
+
+
+def test_packed_store_drops_torn_tail_on_reopen(tmp_path):
+    """数据只写了一半、索引项残缺时，重新打开只保留完整的章节"""
+    path = str(tmp_path / 'book')
+    with PackedChapterStore(path) as store:
+        store.append(1, '第一章', '正文一')
+        store.append(2, '第二章', '正文二')
+    data_path = os.path.join(path, PackedChapterStore.DATA_FILE)
+    index_path = os.path.join(path, PackedChapterStore.INDEX_FILE)
+    os.truncate(data_path, os.path.getsize(data_path) - 3)
+    with open(index_path, 'ab') as f:
+        f.write(b'\x03\x00')
+    with PackedChapterStore(path) as store:
+        assert store.chapter_numbers() == [1]
+        assert store.get(2) is None
+        store.append(3, '第三章', '正文三')
+    with PackedChapterStore(path) as store:
+        assert store.chapter_numbers() == [1, 3]
+        assert store.get(3) == '正文三'
+
+
+def test_packed_store_detects_corrupted_record(tmp_path):
+    path = str(tmp_path / 'book')
+    with PackedChapterStore(path) as store:
+        store.append(1, '第一章', '正文一')
+    with open(os.path.join(path, PackedChapterStore.DATA_FILE), 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    with PackedChapterStore(path) as store:
+        with pytest.raises(ValueError):
+            store.get(1)
+        assert store.get_title(1) == '第一章'
+
+
+CODECS = ['zlib', pytest.param('zstd', marks=pytest.mark.skipif(zstandard is None, reason='需要 zstandard'))]
+
+
+BOILERPLATE = ['天才一秒记住本站地址，最快更新无错阅读。', '本章未完，点击下一页继续阅读。',
+               '求月票、推荐票，感谢各位书友的支持！', '（本章完）']
+
+
+def chapter_body(number):
+    """带站点套话的章节正文：套话在各章间重复，训练出的字典才有内容"""
+    return '\n'.join(BOILERPLATE[:2] + chapter_text(number) + BOILERPLATE[2:])
+
+
+def samples(count=40):
+    return [chapter_body(number).encode('utf-8') for number in range(1, count + 1)]
+
+
+@pytest.mark.parametrize('name', CODECS)
+def test_codec_round_trip_with_trained_dictionary(name):
+    dictionary = ChapterCodec.train(name, samples(), dict_size=16 * 1024)
+    assert dictionary
+    if name == 'zlib':
+        # zlib 只会用到预设字典的最后 32KB
+        assert len(dictionary) <= 32 * 1024
+    plain = ChapterCodec(name)
+    codec = ChapterCodec(name, dictionary)
+    body = chapter_body(99).encode('utf-8')
+    packed = codec.compress(body)
+    assert codec.decompress(packed) == body
+    assert plain.decompress(plain.compress(body)) == body
+    assert len(packed) < len(plain.compress(body))
+    # 解压需要同一个字典
+    with pytest.raises(Exception):
+        ChapterCodec(name).decompress(packed)
+
+
+@pytest.mark.parametrize('name', CODECS)
+def test_compressed_store_trains_dictionary_after_samples(tmp_path, name):
+    path = str(tmp_path / 'book')
+    with PackedChapterStore(path, compression=name, train_after=8) as store:
+        for number in range(1, 21):
+            store.append(number, f'第{number}章 测试', chapter_body(number))
+        stats = store.stats()
+    assert os.path.exists(os.path.join(path, PackedChapterStore.DICT_FILE))
+    assert stats['compression'] == name
+    assert stats['ratio'] > 1
+    with PackedChapterStore(path) as store:
+        assert store.codec.name == name
+        assert [store.get(number) for number in range(1, 21)] == [chapter_body(number) for number in range(1, 21)]
+        with pytest.raises(ValueError):
+            PackedChapterStore(path, compression='zlib' if name == 'zstd' else 'zstd')
+
+
+@pytest.mark.parametrize('name', CODECS)
+def test_samples_written_before_reopen_still_train_the_dictionary(tmp_path, name):
+    """字典训练前关闭仓库：重新打开后先前写入的章节仍计入样本"""
+    path = str(tmp_path / 'book')
+    dict_path = os.path.join(path, PackedChapterStore.DICT_FILE)
+    with PackedChapterStore(path, compression=name, train_after=8) as store:
+        for number in range(1, 6):
+            store.append(number, f'第{number}章 测试', chapter_body(number))
+    assert not os.path.exists(dict_path)
+    with PackedChapterStore(path, compression=name, train_after=8) as store:
+        for number in range(6, 9):
+            store.append(number, f'第{number}章 测试', chapter_body(number))
+        # 5 + 3 = 8 章样本，第 8 章写入时训练字典，第 9 章起压缩
+        assert os.path.exists(dict_path)
+        store.append(9, '第9章 测试', chapter_body(9))
+        assert store.stats()['stored_bytes'] < store.stats()['raw_bytes']
+    with PackedChapterStore(path) as store:
+        assert [store.get(number) for number in range(1, 10)] == [chapter_body(number) for number in range(1, 10)]
+
+
+def test_reopen_with_enough_samples_trains_immediately(tmp_path):
+    path = str(tmp_path / 'book')
+    with PackedChapterStore(path, compression='zlib', train_after=100) as store:
+        for number in range(1, 11):
+            store.append(number, f'第{number}章 测试', chapter_body(number))
+    with PackedChapterStore(path, train_after=10) as store:
+        assert os.path.exists(os.path.join(path, PackedChapterStore.DICT_FILE))
+        assert store.codec.dictionary
+
+
+def test_dedup_shares_identical_chapters_between_books(make_downloader, tmp_path):
+    # 同一本书下载到两个目录，共享仓库中每章只存一份
+    paths = [str(tmp_path / name) for name in ('first', 'second')]
+    for save_path in paths:
+        downloader = make_downloader()
+        assert downloader.download_novel(NOVEL_URLS['qidian'], save_path, storage='dedup') == [True] * 20
+
+    objects = shared_objects_dir(paths[0])
+    refs_paths = [os.path.join(path, DedupChapterStore.REFS_FILE) for path in paths]
+    before = [os.stat(path) for path in refs_paths]
+    stats = dedup_stats(refs_paths, objects)
+    assert stats['novels'] == 2
+    assert stats['chapters'] == 40
+    assert stats['objects'] == 20
+    assert stats['saved_bytes'] == stats['raw_bytes'] // 2
+    # 统计只读打开引用文件，不改写也不压缩
+    after = [os.stat(path) for path in refs_paths]
+    assert [(s.st_size, s.st_mtime_ns) for s in before] == [(s.st_size, s.st_mtime_ns) for s in after]
+
+
+def test_read_only_dedup_store_rejects_writes(tmp_path):
+    path = str(tmp_path / 'book')
+    objects = str(tmp_path / 'objects')
+    with DedupChapterStore(path, objects) as store:
+        store.append(1, '第一章', '正文')
+    with DedupChapterStore(path, objects, read_only=True) as store:
+        assert store.get(1) == '正文'
+        with pytest.raises(ValueError):
+            store.append(2, '第二章', '正文')
+
+
+def test_dedup_store_skips_unchanged_chapters(tmp_path):
+    path = str(tmp_path / 'book')
+    objects = str(tmp_path / 'objects')
+    refs_path = os.path.join(path, DedupChapterStore.REFS_FILE)
+    with DedupChapterStore(path, objects) as store:
+        assert store.append(1, '第一章', '正文') == len('正文'.encode('utf-8'))
+        size = os.path.getsize(refs_path)
+        # 正文和标题都没变：不写引用也不写正文
+        assert store.append(1, '第一章', '正文') == 0
+        assert os.path.getsize(refs_path) == size
+        # 其他章节的相同正文只追加引用
+        assert store.append(2, '第二章', '正文') == 0
+        assert os.path.getsize(refs_path) > size
+        assert store.append(1, '第一章', '改过的正文') > 0
+    with DedupChapterStore(path, objects, read_only=True) as store:
+        assert [store.get(number) for number in (1, 2)] == ['改过的正文', '正文']
+
+
+def test_dedup_store_ignores_torn_last_ref(tmp_path):
+    path = str(tmp_path / 'book')
+    objects = str(tmp_path / 'objects')
+    with DedupChapterStore(path, objects) as store:
+        store.append(1, '第一章', '正文一')
+    with open(os.path.join(path, DedupChapterStore.REFS_FILE), 'a', encoding='utf-8') as f:
+        f.write('{"index": 2, "title": "第二')
+    with DedupChapterStore(path, objects, read_only=True) as store:
+        assert len(store) == 1
+        assert store.get(1) == '正文一'
@@ -0,0 +1,83 @@
+import json
+import os
+import random
+import threading
+import time
+
+# 用户代理池缓存在磁盘上，进程启动时直接读取，不必每次加载 fake_useragent 的浏览器数据
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'novel_downloader', 'user_agents.json')
+CACHE_TTL = 7 * 24 * 3600
+POOL_SIZE = 200
+
+# 没有安装 fake_useragent 且没有缓存时使用
+FALLBACK_USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/124.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+    'Version/17.4 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'
+]
+
+_pool = None
+_lock = threading.Lock()
+
+
+def _load_cache(cache_path):
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - data.get('created', 0) > CACHE_TTL or not data.get('user_agents'):
+        return None
+    return data['user_agents']
+
+
+def _build_pool():
+    """用 fake_useragent 的浏览器数据生成桌面浏览器的用户代理池"""
+    try:
+        from fake_useragent import UserAgent
+    except ImportError:
+        return None
+    ua = UserAgent()
+    browsers = getattr(ua, 'data_browsers', None)
+    if browsers:
+        agents = [browser['useragent'] for browser in browsers if browser.get('type', 'desktop') == 'desktop']
+    else:
+        # 旧版本没有 data_browsers，只能逐个取随机值
+        agents = [ua.random for _ in range(POOL_SIZE)]
+    agents = list(dict.fromkeys(agents))[:POOL_SIZE]
+    return agents or None
+
+
+def _save_cache(cache_path, agents):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.time(), 'user_agents': agents}, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"保存用户代理缓存失败: {str(e)}")
+
+
+def user_agent_pool(cache_path=CACHE_PATH):
+    """进程内共享的用户代理池：优先读磁盘缓存，缓存不存在或过期时生成一次并写回"""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                agents = _load_cache(cache_path)
+                if agents is None:
+                    agents = _build_pool()
+                    if agents is not None:
+                        _save_cache(cache_path, agents)
+                _pool = agents or FALLBACK_USER_AGENTS
+    return _pool
+
+
+def random_user_agent():
+    return random.choice(user_agent_pool())
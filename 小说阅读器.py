@@ -1,75 +1,605 @@
-import os
-from pathlib import Path
-
-class StorageManager:
-    def __init__(self, base_dir='storage'):
-        self.base_dir = Path(base_dir)
-        self.base_dir.mkdir(exist_ok=True)
-    
-    def save_novel(self, author, title, content):
-        author_dir = self.base_dir / author
-        author_dir.mkdir(exist_ok=True)
-        
-        novel_path = author_dir / f"{title}.txt"
-        with open(novel_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-    
-    def get_novel_path(self, author, title):
-        return self.base_dir / author / f"{title}.txt"
-from dataclasses import dataclass
-from datetime import datetime
-
-@dataclass
-class NovelInfo:
-    title: str
-    author: str
-    chapter_count: int
-    word_count: int
-    update_time: datetime
-    file_path: str
-
-class NovelInfoManager:
-    def __init__(self, db_path='novels.db'):
-        self.db_path = db_path
-    
-    def add_novel(self, novel_info):
-        # 添加到数据库
-        pass
-    
-    def search_by_title(self, title):
-        # 按标题搜索
-        pass
-    
-    def search_by_author(self, author):
-        # 按作者搜索
-        pass
-import sqlite3
-
-class NovelSearcher:
-    def __init__(self, db_path='novels.db'):
-        self.db_path = db_path
-    
-    def search(self, keyword):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT * FROM novels 
-        WHERE title LIKE ? OR author LIKE ? OR content LIKE ?
-        """
-        cursor.execute(query, (f'%{keyword}%', f'%{keyword}%', f'%{keyword}%'))
-        return cursor.fetchall()
-import os
-
-class NovelCleaner:
-    def delete_novel(self, file_path):
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            return True
-        return False
-    
-    def delete_chapter(self, novel_path, chapter_title):
-        # 从小说文件中删除特定章节
-        pass
-
-from novel
\ No newline at end of file
+import os
+from pathlib import Path
+
+from chapter_store import PackedChapterStore
+from content_store import ContentStore, DedupChapterStore, SHARED_OBJECTS_DIR, body_hash, dedup_stats
+from paged_reader import PagedNovelReader
+
+
+class StorageManager:
+    """小说存储
+
+    save_novel 按 <base_dir>/<作者>/<书名>.txt 保存整本小说；按章保存时 backend 决定格式：
+    'files' 为 <base_dir>/<作者>/<书名>/<章节名>.txt，'packed' 为同一目录下的单文件仓库
+    （PackedChapterStore，两个文件存下整本书，可按章节号随机读取），'dedup' 在同一目录下
+    只保存正文哈希的引用（DedupChapterStore），正文存入各书共享的 <base_dir>/.chapter_objects，
+    相同的正文只保存一份。
+    compression 为 'zstd'/'zlib' 时 packed 仓库逐章压缩，读取时透明解压。
+    整本小说通过 open_reader 按页读取（PagedNovelReader），不必整本读入内存。
+    给出 searcher（NovelSearcher）时，每保存一章都立即更新该章的全文索引，检索结果的摘要
+    和改写章节时撤下旧索引所需的正文由 searcher 通过 load_chapter 从这里读取。
+    """
+
+    def __init__(self, base_dir='storage', backend='files', fsync='batch', compression=None, searcher=None):
+        if backend not in ('files', 'packed', 'dedup'):
+            raise ValueError(f'未知的存储方式: {backend}')
+        if compression is not None and backend != 'packed':
+            raise ValueError('压缩存储需要 packed 存储方式')
+        self.base_dir = Path(base_dir)
+        self.base_dir.mkdir(exist_ok=True)
+        self.backend = backend
+        self.fsync = fsync
+        self.compression = compression
+        self._stores = {}
+        self._readers = {}
+        self.objects = ContentStore(str(self.base_dir / SHARED_OBJECTS_DIR)) if backend == 'dedup' else None
+        self.searcher = searcher
+        if searcher is not None and searcher.storage is None:
+            searcher.storage = self
+    
+    def save_novel(self, author, title, content):
+        author_dir = self.base_dir / author
+        author_dir.mkdir(exist_ok=True)
+        
+        novel_path = author_dir / f"{title}.txt"
+        # 文件即将被改写，关闭映射着旧内容的阅读器
+        self.release_reader(novel_path)
+        with open(novel_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    
+    def get_novel_path(self, author, title):
+        return self.base_dir / author / f"{title}.txt"
+
+    def open_reader(self, author, title, page_bytes=4096, prefetch=1):
+        """打开（并缓存）整本小说的分页阅读器；分页索引缓存在小说文件旁，首次打开时建立"""
+        path = self.get_novel_path(author, title)
+        reader = self._readers.get(path)
+        if reader is None or reader.page_bytes != page_bytes:
+            if reader is not None:
+                reader.close()
+            reader = self._readers[path] = PagedNovelReader(path, page_bytes=page_bytes, prefetch=prefetch)
+        return reader
+
+    def release_reader(self, novel_path):
+        """关闭并丢弃某个小说文件的缓存阅读器（文件被改写或删除前调用），下次 open_reader 时重新打开"""
+        target = Path(novel_path).resolve()
+        for path in [path for path in self._readers if path.resolve() == target]:
+            self._readers.pop(path).close()
+
+    def get_chapter_dir(self, author, title):
+        return self.base_dir / author / title
+
+    def open_store(self, author, title):
+        """打开（并缓存）某本书的章节仓库（packed 为单文件仓库，dedup 为去重仓库）"""
+        path = self.get_chapter_dir(author, title)
+        store = self._stores.get(path)
+        if store is None:
+            if self.backend == 'dedup':
+                store = DedupChapterStore(str(path), self.objects)
+            else:
+                store = PackedChapterStore(str(path), fsync=self.fsync, compression=self.compression)
+            self._stores[path] = store
+        return store
+
+    def save_chapter(self, author, title, chapter_no, chapter_title, content):
+        if self.searcher is not None:
+            # 无内容索引撤下旧条目时要用旧正文，必须在覆盖之前撤下
+            self.searcher.remove_chapter(title, author, chapter_title)
+        if self.backend != 'files':
+            self.open_store(author, title).append(chapter_no, chapter_title, content)
+        else:
+            chapter_dir = self.get_chapter_dir(author, title)
+            chapter_dir.mkdir(parents=True, exist_ok=True)
+            with open(chapter_dir / f"{chapter_title}.txt", 'w', encoding='utf-8') as f:
+                f.write(content)
+        if self.searcher is not None:
+            self.searcher.add_chapter(title, author, chapter_title, content, chapter_no)
+
+    def load_chapter(self, author, title, chapter_no, chapter_title):
+        """读取一章正文供检索使用：files 方式按章节名、其他方式按章节号，读不到时返回 None"""
+        try:
+            if self.backend == 'files':
+                with open(self.get_chapter_dir(author, title) / f"{chapter_title}.txt", encoding='utf-8') as f:
+                    return f.read()
+            if chapter_no is None:
+                return None
+            return self.open_store(author, title).get(chapter_no)
+        except (OSError, ValueError) as e:
+            print(f"读取章节失败: {str(e)}")
+            return None
+
+    def read_chapter(self, author, title, chapter_no):
+        """按章节号读取（packed 或 dedup 方式，文件方式没有章节号到文件名的映射）"""
+        if self.backend == 'files':
+            raise ValueError('按章节号读取需要 packed 或 dedup 存储方式')
+        return self.open_store(author, title).get(chapter_no)
+
+    def stats(self, author, title):
+        """某本书的存储统计：章节数、原始/实际字节数和压缩比（packed 或 dedup 方式）
+
+        dedup 方式另有 unique_chapters（不同正文的章数）和 saved_bytes（去重节省的字节数）。
+        """
+        return self.open_store(author, title).stats()
+
+    def dedup_stats(self):
+        """整个存储目录的去重统计（dedup 方式）：各书引用的正文总字节数、共享仓库实际占用的字节数和节省的字节数"""
+        if self.backend != 'dedup':
+            raise ValueError('去重统计需要 dedup 存储方式')
+        for store in self._stores.values():
+            store.flush()
+        refs_paths = [str(path) for path in self.base_dir.glob(f'*/*/{DedupChapterStore.REFS_FILE}')]
+        return dedup_stats(refs_paths, self.objects)
+
+    def close(self):
+        for store in self._stores.values():
+            store.close()
+        self._stores.clear()
+        for reader in self._readers.values():
+            reader.close()
+        self._readers.clear()
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+
+@dataclass
+class NovelInfo:
+    title: str
+    author: str
+    chapter_count: int
+    word_count: int
+    update_time: datetime
+    file_path: str
+
+def prefix_upper_bound(prefix):
+    """以 prefix 开头的字符串的上界：比它们都大的最小字符串，不存在时返回 None
+
+    SQLite 按 UTF-8 字节比较 TEXT，与按码位比较的顺序相同。末字符加一时跳过代理区
+    （U+D800-U+DFFF 不能编码为 UTF-8）；末字符已是 U+10FFFF 时去掉它、向前一位进位。
+    """
+    chars = list(prefix)
+    while chars:
+        code = ord(chars.pop()) + 1
+        if code == 0xD800:
+            code = 0xE000
+        if code <= 0x10FFFF:
+            return ''.join(chars) + chr(code)
+    return None
+
+
+class NovelInfoManager:
+    """小说目录：保存 NovelInfo 记录的 SQLite 库
+
+    使用 WAL 模式和单个长连接；批量导入用 executemany 在一个事务内完成。
+    标题、作者都建了索引，精确查询和前缀查询（转换成范围条件）都能走索引。
+    """
+
+    _COLUMNS = 'title, author, chapter_count, word_count, update_time, file_path'
+
+    def __init__(self, db_path='novels.db'):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS novel_info (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                author TEXT NOT NULL,
+                chapter_count INTEGER,
+                word_count INTEGER,
+                update_time TEXT,
+                file_path TEXT,
+                UNIQUE (title, author)
+            )
+            """)
+            # UNIQUE (title, author) 自带的索引可用于按标题查询，作者单独建索引
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_novel_info_author ON novel_info (author)')
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _to_row(novel_info):
+        update_time = novel_info.update_time
+        if isinstance(update_time, datetime):
+            update_time = update_time.isoformat()
+        return (novel_info.title, novel_info.author, novel_info.chapter_count,
+                novel_info.word_count, update_time, novel_info.file_path)
+
+    @staticmethod
+    def _from_row(row):
+        title, author, chapter_count, word_count, update_time, file_path = row
+        if update_time:
+            update_time = datetime.fromisoformat(update_time)
+        return NovelInfo(title, author, chapter_count, word_count, update_time, file_path)
+
+    def add_novel(self, novel_info):
+        # 添加到数据库，同名同作者的记录会被更新
+        self.add_novels([novel_info])
+
+    def add_novels(self, novel_infos):
+        """批量写入（同一事务内 executemany），返回写入的条数"""
+        rows = [self._to_row(novel_info) for novel_info in novel_infos]
+        with self._lock, self.conn:
+            self.conn.executemany(f"""
+            INSERT INTO novel_info ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (title, author) DO UPDATE SET
+                chapter_count = excluded.chapter_count,
+                word_count = excluded.word_count,
+                update_time = excluded.update_time,
+                file_path = excluded.file_path
+            """, rows)
+        return len(rows)
+
+    def _lookup(self, column, value, prefix):
+        if prefix:
+            if not value:
+                return []
+            # 前缀查询改写成 [value, value的后继) 范围，才能使用索引（LIKE 'x%' 默认不走索引）
+            upper = prefix_upper_bound(value)
+            if upper is None:
+                where, params = f'{column} >= ?', (value,)
+            else:
+                where, params = f'{column} >= ? AND {column} < ?', (value, upper)
+        else:
+            where, params = f'{column} = ?', (value,)
+        with self._lock:
+            rows = self.conn.execute(
+                f'SELECT {self._COLUMNS} FROM novel_info WHERE {where} ORDER BY {column}', params
+            ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def search_by_title(self, title, prefix=False):
+        # 按标题搜索，prefix=True 时返回以 title 开头的小说
+        return self._lookup('title', title, prefix)
+
+    def search_by_author(self, author, prefix=False):
+        # 按作者搜索，prefix=True 时返回以 author 开头的作者的小说
+        return self._lookup('author', author, prefix)
+import re
+
+# 中日韩统一表意文字（含扩展A区和兼容区）
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TOKEN_RE = re.compile(f'([{_CJK}]+)|([^\\W{_CJK}]+)')
+
+
+class NgramSegmenter:
+    """中文按字二元切分的分词器
+
+    FTS5 自带的 unicode61 分词器会把一整段汉字当成一个词，这里先把汉字串切成
+    重叠的二元组（"斗破苍穹" -> 斗破 破苍 苍穹 穹），英文和数字保持整词。
+    查询时两个字以上的词转成二元组短语，单字用前缀匹配；汉字串末尾额外保留的
+    单字保证单字前缀能命中串尾的字。其他分词器（如 jieba）实现同样的两个方法即可替换。
+    """
+
+    def index_text(self, text):
+        """返回写入 FTS 表的文本（以空格分隔的词）"""
+        tokens = []
+        for cjk, word in _TOKEN_RE.findall(text or ''):
+            if word:
+                tokens.append(word)
+                continue
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            tokens.append(cjk[-1])
+        return ' '.join(tokens)
+
+    def match_query(self, keyword):
+        """把用户输入的关键词转成 FTS5 MATCH 表达式，没有可检索的词时返回 None"""
+        terms = []
+        for cjk, word in _TOKEN_RE.findall(keyword or ''):
+            if word:
+                terms.append('"%s"' % word.replace('"', '""'))
+            elif len(cjk) == 1:
+                terms.append(f'"{cjk}"*')
+            else:
+                terms.append('"%s"' % ' '.join(cjk[i:i + 2] for i in range(len(cjk) - 1)))
+        return ' AND '.join(terms) or None
+
+
+def make_snippet(text, keyword, width=30):
+    """截取关键词附近的一段正文，关键词用【】标出"""
+    if not text:
+        return ''
+    words = [keyword] + [cjk or word for cjk, word in _TOKEN_RE.findall(keyword or '')]
+    lowered = text.lower()
+    for word in words:
+        pos = lowered.find(word.lower()) if word else -1
+        if pos >= 0:
+            start = max(0, pos - width)
+            end = min(len(text), pos + len(word) + width)
+            return ('…' if start > 0 else '') + text[start:pos] + '【' + text[pos:pos + len(word)] + '】' \
+                + text[pos + len(word):end] + ('…' if end < len(text) else '')
+    return text[:width * 2] + ('…' if len(text) > width * 2 else '')
+
+
+class NovelSearcher:
+    """基于 SQLite FTS5 的全文检索
+
+    search_docs 保存被检索的文档：novels 表中的整本小说（只记录 rowid，正文仍在 novels 表）
+    或下载过程中逐章写入的章节（只记录书名、作者、章节名、章节号和正文哈希，正文仍在
+    storage，即 StorageManager 中）；search_fts 是无内容（content=''）的 FTS5 索引，
+    只存分词结果。章节写入时（StorageManager 给出 searcher 时由 save_chapter 调用）
+    通过 add_chapter 即时入库，检索结果的摘要和撤下旧索引用的正文按需从 storage 读取；novels 表上的触发器把插入、修改和删除记入 search_changes
+    （修改和删除连同旧值，无内容索引删除条目时要用到），每次检索前由 sync 按日志增量
+    更新索引，索引永远不需要整体重建。
+    """
+
+    def __init__(self, db_path='novels.db', segmenter=None, storage=None):
+        self.db_path = db_path
+        self.segmenter = segmenter or NgramSegmenter()
+        # 章节正文所在的 StorageManager；StorageManager(searcher=...) 会自动填上
+        self.storage = storage
+        # 所有调用共用一个连接，由锁串行化
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS novels (title TEXT, author TEXT, content TEXT)')
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS search_docs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                novel_rowid INTEGER,
+                title TEXT,
+                author TEXT,
+                chapter TEXT,
+                chapter_no INTEGER,
+                content_hash TEXT
+            )
+            """)
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_search_docs_chapter ON search_docs (title, author, chapter)')
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(title, author, content, content='')"
+            )
+            self.conn.execute('CREATE TABLE IF NOT EXISTS search_state (key TEXT PRIMARY KEY, value INTEGER)')
+            self._create_change_log()
+
+    def close(self):
+        self.conn.close()
+
+    def _create_change_log(self):
+        """建立 novels 表的变更日志和触发器；旧版按 rowid 补录的库把尚未补录的行记为插入"""
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS search_changes (
+            id INTEGER PRIMARY KEY,
+            op TEXT NOT NULL,
+            novel_rowid INTEGER NOT NULL,
+            title TEXT,
+            author TEXT,
+            content TEXT
+        )
+        """)
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'novels_search_insert'"
+        ).fetchone()
+        if exists:
+            return
+        self.conn.execute("""
+        CREATE TRIGGER novels_search_insert AFTER INSERT ON novels BEGIN
+            INSERT INTO search_changes (op, novel_rowid) VALUES ('insert', new.rowid);
+        END
+        """)
+        # 修改按“删除旧行 + 插入新行”记录
+        self.conn.execute("""
+        CREATE TRIGGER novels_search_update AFTER UPDATE ON novels BEGIN
+            INSERT INTO search_changes (op, novel_rowid, title, author, content)
+            VALUES ('delete', old.rowid, old.title, old.author, old.content);
+            INSERT INTO search_changes (op, novel_rowid) VALUES ('insert', new.rowid);
+        END
+        """)
+        self.conn.execute("""
+        CREATE TRIGGER novels_search_delete AFTER DELETE ON novels BEGIN
+            INSERT INTO search_changes (op, novel_rowid, title, author, content)
+            VALUES ('delete', old.rowid, old.title, old.author, old.content);
+        END
+        """)
+        row = self.conn.execute("SELECT value FROM search_state WHERE key = 'novels_rowid'").fetchone()
+        self.conn.execute(
+            "INSERT INTO search_changes (op, novel_rowid) SELECT 'insert', rowid FROM novels WHERE rowid > ? ORDER BY rowid",
+            (row[0] if row else 0,)
+        )
+        self.conn.execute("DELETE FROM search_state WHERE key = 'novels_rowid'")
+
+    def _index(self, doc_id, title, author, content):
+        seg = self.segmenter.index_text
+        self.conn.execute(
+            'INSERT INTO search_fts (rowid, title, author, content) VALUES (?, ?, ?, ?)',
+            (doc_id, seg(title), seg(author), seg(content))
+        )
+
+    def _unindex(self, doc_id, title, author, content):
+        # 无内容表删除时需要提供与写入时相同的分词结果
+        seg = self.segmenter.index_text
+        self.conn.execute(
+            "INSERT INTO search_fts (search_fts, rowid, title, author, content) VALUES ('delete', ?, ?, ?, ?)",
+            (doc_id, seg(title), seg(author), seg(content))
+        )
+
+    def sync(self):
+        """按变更日志把 novels 表的插入、修改和删除同步到索引，返回处理的变更数
+
+        先撤下被修改或删除的行原有的索引条目（每行取日志中最早的旧值，即建索引时的内容），
+        再为仍然存在、尚未建索引的行按当前内容建索引。
+        """
+        with self._lock, self.conn:
+            row = self.conn.execute('SELECT max(id), count(*) FROM search_changes').fetchone()
+            last_id, changes = row
+            if not changes:
+                return 0
+            removed = set()
+            for rowid, title, author, content in self.conn.execute(
+                "SELECT novel_rowid, title, author, content FROM search_changes WHERE op = 'delete' AND id <= ? ORDER BY id",
+                (last_id,)
+            ):
+                if rowid in removed:
+                    continue
+                removed.add(rowid)
+                doc = self.conn.execute('SELECT id FROM search_docs WHERE novel_rowid = ?', (rowid,)).fetchone()
+                if doc is not None:
+                    self._unindex(doc[0], title, author, content)
+                    self.conn.execute('DELETE FROM search_docs WHERE id = ?', (doc[0],))
+            for (rowid,) in self.conn.execute(
+                "SELECT DISTINCT novel_rowid FROM search_changes WHERE op = 'insert' AND id <= ? ORDER BY novel_rowid",
+                (last_id,)
+            ):
+                if self.conn.execute('SELECT 1 FROM search_docs WHERE novel_rowid = ?', (rowid,)).fetchone():
+                    continue
+                novel = self.conn.execute('SELECT title, author, content FROM novels WHERE rowid = ?', (rowid,)).fetchone()
+                if novel is None:
+                    continue
+                title, author, content = novel
+                cursor = self.conn.execute(
+                    'INSERT INTO search_docs (novel_rowid, title, author) VALUES (?, ?, ?)', (rowid, title, author)
+                )
+                self._index(cursor.lastrowid, title, author, content)
+            self.conn.execute('DELETE FROM search_changes WHERE id <= ?', (last_id,))
+        return changes
+
+    def add_chapter(self, title, author, chapter, content, chapter_no=None):
+        """章节写入后调用，立即把该章加入索引（同一章重复写入时替换旧的索引）
+
+        chapter_no 为章节在 packed/dedup 仓库中的章节号，之后按它从 storage 读取正文。
+        """
+        with self._lock, self.conn:
+            self._remove_chapter(title, author, chapter)
+            cursor = self.conn.execute(
+                'INSERT INTO search_docs (title, author, chapter, chapter_no, content_hash) VALUES (?, ?, ?, ?, ?)',
+                (title, author, chapter, chapter_no, body_hash(content.encode('utf-8')))
+            )
+            self._index(cursor.lastrowid, title, author, content)
+
+    def remove_chapter(self, title, author, chapter):
+        """从索引中删除某一章，返回删除的文档数"""
+        with self._lock, self.conn:
+            return self._remove_chapter(title, author, chapter)
+
+    def remove_chapters(self, title, author, chapters):
+        """在一个事务内从索引中删除同一本书的多章，返回删除的文档数"""
+        with self._lock, self.conn:
+            return sum(self._remove_chapter(title, author, chapter) for chapter in chapters)
+
+    def _remove_chapter(self, title, author, chapter):
+        rows = self.conn.execute(
+            'SELECT id, chapter_no, content_hash FROM search_docs WHERE title = ? AND author = ? AND chapter = ?',
+            (title, author, chapter)
+        ).fetchall()
+        for doc_id, chapter_no, content_hash in rows:
+            content = self._load_chapter(title, author, chapter_no, chapter)
+            # 读不到建索引时的正文就不撤下词条：孤立的词条不再对应 search_docs 中的文档，
+            # 检索和计数时都会被过滤掉（id 自增不复用，不会误连到新文档）
+            if content is not None and body_hash(content.encode('utf-8')) == content_hash:
+                self._unindex(doc_id, title, author, content)
+            self.conn.execute('DELETE FROM search_docs WHERE id = ?', (doc_id,))
+        return len(rows)
+
+    def _load_chapter(self, title, author, chapter_no, chapter):
+        if self.storage is None:
+            return None
+        return self.storage.load_chapter(author, title, chapter_no, chapter)
+
+    def search(self, keyword, limit=20, offset=0):
+        """按相关度检索标题、作者和正文，标题命中的权重最高
+
+        返回字典列表：title、author、chapter（整本小说为 None）、snippet、score（越小越相关）。
+        """
+        query = self.segmenter.match_query(keyword)
+        if query is None:
+            return []
+        self.sync()
+        with self._lock:
+            rows = self.conn.execute("""
+            SELECT d.title, d.author, d.chapter, d.chapter_no, n.content,
+                   bm25(search_fts, 10.0, 5.0, 1.0) AS score
+            FROM search_fts
+            JOIN search_docs d ON d.id = search_fts.rowid
+            LEFT JOIN novels n ON n.rowid = d.novel_rowid
+            WHERE search_fts MATCH ?
+            ORDER BY score
+            LIMIT ? OFFSET ?
+            """, (query, limit, offset)).fetchall()
+        results = []
+        for title, author, chapter, chapter_no, content, score in rows:
+            if chapter is not None:
+                # 章节正文不在库中，只为这一页结果读取
+                content = self._load_chapter(title, author, chapter_no, chapter)
+            results.append({
+                'title': title,
+                'author': author,
+                'chapter': chapter,
+                'snippet': make_snippet(content, keyword),
+                'score': score
+            })
+        return results
+
+    def count(self, keyword):
+        """命中的文档总数，用于分页"""
+        query = self.segmenter.match_query(keyword)
+        if query is None:
+            return 0
+        self.sync()
+        with self._lock:
+            return self.conn.execute(
+                'SELECT count(*) FROM search_fts JOIN search_docs d ON d.id = search_fts.rowid WHERE search_fts MATCH ?',
+                (query,)
+            ).fetchone()[0]
+import os
+
+class NovelCleaner:
+    """整本小说文件的清理：删除小说、删除其中的章节
+
+    删除章节基于 PagedNovelReader 的章节偏移索引，一批章节只需顺序拷贝一遍文件，
+    并在同一次操作中更新分页索引；给出 searcher（NovelSearcher）时同时删除这些章节的检索条目，
+    给出 storage（StorageManager）时在改写或删除文件前关闭它缓存的该书阅读器。
+    """
+
+    def __init__(self, searcher=None, storage=None):
+        self.searcher = searcher
+        self.storage = storage
+
+    def delete_novel(self, file_path):
+        if os.path.exists(file_path):
+            if self.storage is not None:
+                self.storage.release_reader(file_path)
+            os.remove(file_path)
+            # 分页索引随小说一起删除
+            index_path = str(file_path) + PagedNovelReader.INDEX_SUFFIX
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            return True
+        return False
+    
+    def delete_chapter(self, novel_path, chapter_title):
+        # 从小说文件中删除特定章节
+        return self.delete_chapters(novel_path, [chapter_title])
+
+    def delete_chapters(self, novel_path, chapters, title=None, author=None):
+        """从小说文件中批量删除章节，返回删除的章节标题列表
+
+        chapters 中的字符串为章节标题（与标题行完全相同，或为去掉“第x章”后的部分，
+        同名的章节都会删除），整数为章节在分页索引中的位置（可用来只删除重复章节中的一个）。
+        检索条目按书名、作者和章节标题删除，书名和作者默认取自 <作者>/<书名>.txt 路径。
+        """
+        if not os.path.exists(novel_path):
+            return []
+        titles = {chapter for chapter in chapters if isinstance(chapter, str)}
+        numbers = {chapter for chapter in chapters if isinstance(chapter, int)}
+        if self.storage is not None:
+            # 缓存的阅读器还映射着旧文件和旧的分页索引
+            self.storage.release_reader(novel_path)
+        with PagedNovelReader(novel_path) as reader:
+            chapter_nos = [
+                chapter_no for chapter_no, (heading, first_page) in enumerate(reader.chapters)
+                if chapter_no in numbers or heading in titles or heading.split(maxsplit=1)[-1] in titles
+            ]
+            removed = [reader.chapters[chapter_no][0] for chapter_no in chapter_nos]
+            reader.remove_chapters(chapter_nos)
+        if self.searcher is not None and removed:
+            path = Path(novel_path)
+            title = title or path.stem
+            author = author or path.parent.name
+            # 检索条目中的章节名可能是完整标题行，也可能只是标题部分
+            names = set(removed) | {heading.split(maxsplit=1)[-1] for heading in removed}
+            self.searcher.remove_chapters(title, author, names)
+        return removed